@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for FED3 Viz.
+
+@author: https://github.com/earnestt1234
+"""
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Performance regression check: runs a fixed workload (load a synthetic
+experiment, draw every plot type, make the summary table) and compares each
+stage against a stored baseline, exiting with status 1 when a stage has
+become slower (or allocates more) than the tolerance allows.
+
+For each stage are recorded:
+
+- seconds: the best wall time of --repeat runs (after an untimed one;
+  cached binned data is cleared before each)
+- rss_mb: how far the resident memory of the process rose during the
+  stage (see perf.current_rss())
+- alloc_mb: the peak of Python allocations during the stage (measured by
+  tracemalloc, in a separate run so tracing does not affect the times)
+
+Baselines depend on the machine; save one before upgrading, then check:
+
+    python benchmarks/regression.py --save
+    python benchmarks/regression.py
+
+Per-stage tolerances can be added to the "tolerances" of the baseline file,
+e.g. {"fed_summary": 0.1}.
+
+@author: https://github.com/earnestt1234
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import warnings
+
+appdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if appdir not in sys.path:
+    sys.path.insert(0, appdir)
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+from benchmarks.suite import DEFAULT_ARGUMENTS, data_functions, draw
+from benchmarks.synthetic import synthetic_experiment
+from load.load import FED3_File
+from perf.perf import current_rss
+from plots import plots
+
+WORKLOAD = {'devices': 6, 'rows': 10000, 'modes': ['FR1', 'FR3', 'PR'], 'seed': 0}
+
+default_baseline = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'baseline.json')
+
+class PeakRSS():
+    """Context manager sampling the resident memory in a thread, to find how
+    far it rose above its starting value (self.growth, in bytes)."""
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.growth = None
+
+    def __enter__(self):
+        self.start = current_rss()
+        self.peak = self.start
+        self.done = threading.Event()
+        if self.start is not None:
+            self.thread = threading.Thread(target=self.sample, daemon=True)
+            self.thread.start()
+        return self
+
+    def sample(self):
+        while not self.done.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __exit__(self, *exc):
+        self.done.set()
+        if self.start is not None:
+            self.thread.join()
+            self.peak = max(self.peak, current_rss())
+            self.growth = self.peak - self.start
+
+def clear_caches(feds):
+    """Drop the binned data FED3_Files cache (see FED3_File.get_pyramid()),
+    so every run of a stage does the same work as the first plot."""
+    for fed in feds:
+        fed.__dict__.pop('pyramid', None)
+
+def workload_stages(paths, feds):
+    """
+    The stages of the workload, as (name, function) pairs; "load" fills
+    feds, which the other stages use.
+    """
+    def load():
+        feds[:] = [FED3_File(path) for path in paths]
+        for i, fed in enumerate(feds):
+            fed.group = ['A' if i % 2 == 0 else 'B']
+    stages = [('load', load)]
+    for name, func, first in data_functions(plots):
+        def stage(func=func, first=first):
+            arguments = dict(DEFAULT_ARGUMENTS)
+            arguments[first] = feds[0] if first == 'FED' else feds
+            draw(func(**arguments))
+        stages.append(('plots.' + name, stage))
+    stages.append(('fed_summary', lambda: plots.fed_summary(feds)))
+    return stages
+
+def run_workload(folder, workload=WORKLOAD, repeat=3, pattern=None):
+    """
+    Measures every stage of the workload.
+
+    Parameters
+    ----------
+    folder : str
+        Folder for the generated files
+    workload : dict, optional
+        devices, rows, modes and seed of the synthetic experiment. The
+        default is WORKLOAD.
+    repeat : int, optional
+        Timed runs of each stage (the best is kept). The default is 3.
+    pattern : str, optional
+        Regular expression; only matching stages are measured ("load" is
+        always run). The default is None (all).
+
+    Returns
+    -------
+    dict
+        {stage: {"seconds", "rss_mb", "alloc_mb"}} or {stage: {"error"}}
+    """
+    paths = synthetic_experiment(folder, workload['devices'], workload['rows'],
+                                 workload['modes'], seed=workload['seed'])
+    feds = []
+    results = {}
+    for name, func in workload_stages(paths, feds):
+        if name != 'load' and pattern and not re.search(pattern, name):
+            continue
+        times, growths = [], []
+        try:
+            #untimed first run, for one-off costs (lazy imports, font caches)
+            func()
+            for i in range(repeat):
+                clear_caches(feds)
+                with PeakRSS() as rss:
+                    start = time.perf_counter()
+                    func()
+                    times.append(time.perf_counter() - start)
+                growths.append(rss.growth)
+            clear_caches(feds)
+            tracemalloc.start()
+            func()
+            alloc = tracemalloc.get_traced_memory()[1]
+        except Exception as e:
+            results[name] = {'error': type(e).__name__ + ': ' + str(e)[:80]}
+            continue
+        finally:
+            tracemalloc.stop()
+        growth = None if None in growths else max(growths)
+        best = min(times)
+        results[name] = {'seconds': best,
+                         'rss_mb': None if growth is None else growth / 2**20,
+                         'alloc_mb': alloc / 2**20}
+    return results
+
+def environment():
+    return {'python': platform.python_version(), 'pandas': pd.__version__,
+            'numpy': np.__version__, 'matplotlib': matplotlib.__version__,
+            'machine': platform.platform()}
+
+def compare(baseline, results, tolerance=0.25, memory_tolerance=0.5,
+            min_seconds=0.02, min_mb=1):
+    """
+    Compares results with a baseline.
+
+    Parameters
+    ----------
+    baseline : dict
+        A saved baseline ("results", and optionally "tolerances" by stage)
+    results : dict
+        Output of run_workload()
+    tolerance : float, optional
+        Allowed fractional slow down. The default is 0.25.
+    memory_tolerance : float, optional
+        Allowed fractional increase of allocations. The default is 0.5.
+    min_seconds, min_mb : float, optional
+        Differences below these are never regressions (timer and
+        allocator noise). The defaults are 0.02 and 1.
+
+    Returns
+    -------
+    list
+        (stage, message, is_regression) for each compared stage
+    """
+    output = []
+    tolerances = baseline.get('tolerances', {})
+    for stage, new in results.items():
+        old = baseline['results'].get(stage)
+        if old is None:
+            output.append((stage, 'not in baseline', False))
+            continue
+        if 'error' in new:
+            output.append((stage, 'error: ' + new['error'], 'error' not in old))
+            continue
+        if 'error' in old:
+            output.append((stage, 'fixed (error in baseline)', False))
+            continue
+        allowed = tolerances.get(stage, tolerance)
+        change = new['seconds'] / old['seconds'] - 1 if old['seconds'] else 0
+        slower = (change > allowed and
+                  new['seconds'] - old['seconds'] > min_seconds)
+        alloc = new['alloc_mb'] / old['alloc_mb'] - 1 if old['alloc_mb'] else 0
+        bigger = (alloc > memory_tolerance and
+                  new['alloc_mb'] - old['alloc_mb'] > min_mb)
+        message = '{:.3f}s -> {:.3f}s ({:+.0%}), alloc {:.1f} -> {:.1f} MB ({:+.0%})'.format(
+                  old['seconds'], new['seconds'], change, old['alloc_mb'],
+                  new['alloc_mb'], alloc)
+        if slower:
+            message += '  SLOWER'
+        if bigger:
+            message += '  MORE MEMORY'
+        output.append((stage, message, slower or bigger))
+    return output
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--baseline', default=default_baseline,
+                        help='baseline file (default benchmarks/baseline.json)')
+    parser.add_argument('--save', action='store_true',
+                        help='save the results as the baseline instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed fractional slow down of a stage')
+    parser.add_argument('--memory-tolerance', type=float, default=0.5,
+                        help='allowed fractional increase of allocations')
+    parser.add_argument('--min-seconds', type=float, default=0.02,
+                        help='smallest slow down counted as a regression')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timed runs of each stage (the best is kept)')
+    parser.add_argument('--only', help='regular expression of stages to run')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+    warnings.simplefilter('ignore')
+    baseline = None
+    if not args.save:
+        if not os.path.exists(args.baseline):
+            print('No baseline at ' + args.baseline + ' (make one with --save)')
+            return 2
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['workload'] != WORKLOAD:
+            print('The baseline was made with a different workload; save a new one')
+            return 2
+        if baseline.get('repeat') != args.repeat:
+            print('Note: the baseline kept the best of {} runs'.format(baseline.get('repeat')))
+        if baseline['environment'] != environment():
+            print('Note: the baseline was made with ' + json.dumps(baseline['environment']))
+    folder = tempfile.mkdtemp(prefix='fed3_regression_')
+    try:
+        results = run_workload(folder, WORKLOAD, args.repeat, args.only)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({'workload': WORKLOAD, 'environment': environment(),
+                       'repeat': args.repeat, 'tolerances': {},
+                       'results': results}, f, indent=2)
+        for stage, result in results.items():
+            print('{:<40}{}'.format(stage, result.get('error') or
+                                    '{:.3f}s, alloc {:.1f} MB'.format(
+                                    result['seconds'], result['alloc_mb'])))
+        print('Saved baseline to ' + args.baseline)
+        return 0
+    comparison = compare(baseline, results, args.tolerance, args.memory_tolerance,
+                         args.min_seconds)
+    for stage, message, regression in comparison:
+        print('{:<40}{}'.format(stage, message))
+    regressions = [stage for stage, message, regression in comparison if regression]
+    if regressions:
+        print('\n{} regression(s): {}'.format(len(regressions), ', '.join(regressions)))
+        return 1
+    print('\nNo regressions')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
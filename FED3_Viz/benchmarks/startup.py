@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Measures the cold start time of FED3 Viz.  Each stage is timed in a fresh
+Python process (so nothing is already imported), repeated a few times, and
+the heavy optional modules loaded by each stage are reported.
+
+Run from the FED3_Viz folder:
+
+    python benchmarks/startup.py --repeat 5
+
+@author: https://github.com/earnestt1234
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+appdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+heavy_modules = ['seaborn', 'scipy.stats', 'fed_inspect.fed_inspect',
+                 'tkcalendar', 'emoji', 'matplotlib.pyplot']
+
+stages = {'core modules' : ('from load.load import FED3_File\n'
+                            'from plots import plots\n'
+                            'from getdata import getdata\n'),
+          'gui module'   : 'import fed3viz\n',
+          'gui window'   : ('import fed3viz\n'
+                            'root = fed3viz.FED3_Viz()\n'
+                            'root.update()\n'
+                            'root.destroy()\n'),}
+
+template = """
+import json, sys, time
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds':elapsed,
+                  'loaded':[m for m in {heavy} if m in sys.modules]}}))
+"""
+
+def time_stage(code, repeat=5):
+    """
+    Time a snippet of code in fresh interpreters.
+
+    Parameters
+    ----------
+    code : str
+        Python code to run, from the FED3_Viz folder
+    repeat : int, optional
+        Number of fresh processes to time. The default is 5.
+
+    Returns
+    -------
+    dict
+        "times" (seconds for each run) and "loaded" (heavy modules imported
+        by the code), or "error" if the code could not run here
+    """
+    script = template.format(code=code, heavy=heavy_modules)
+    times = []
+    for i in range(repeat):
+        result = subprocess.run([sys.executable, '-c', script], cwd=appdir,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()
+            return {'error': error[-1] if error else 'failed'}
+        output = json.loads(result.stdout.strip().splitlines()[-1])
+        times.append(output['seconds'])
+    return {'times':times, 'loaded':output['loaded']}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='fresh processes per stage')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+    results = {}
+    for name, code in stages.items():
+        result = time_stage(code, args.repeat)
+        results[name] = result
+        if 'error' in result:
+            print('{0:<14} skipped ({1})'.format(name, result['error']))
+            continue
+        times = result['times']
+        print('{0:<14} median {1:.3f}s  min {2:.3f}s  heavy imports: {3}'.format(
+              name, statistics.median(times), min(times),
+              ', '.join(result['loaded']) or 'none'))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return results
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Times FED3 Viz on synthetic experiments of increasing size and reports how
+each stage scales.  Two sweeps are run:
+
+- rows: recordings of 2 FED3s (groups "A" and "B", FR1 and PR) with more
+  and more events each (--rows, up to 10,000,000)
+- devices: more and more FED3s (--devices, up to 1,000) with --device-rows
+  events each, cycling FR1, FR3 and PR
+
+At each point the stages timed are: loading the files as FED3_Files
+(.CSV, and .xlsx up to --xlsx-max rows), fed_concat() of one device
+recorded in 4 segments, every getdata.* and plots.* function (plots are
+also drawn, as the GUI does) and fed_summary().  For each stage the
+times are listed along with the fitted exponent k of time ~ size^k
+(1 is linear).
+
+Run from the FED3_Viz folder:
+
+    python benchmarks/suite.py --rows 1000 10000 100000 --devices 1 10 100
+    python benchmarks/suite.py --only "load|plots.pellet" --plot scaling.png
+
+@author: https://github.com/earnestt1234
+"""
+import argparse
+import inspect
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+appdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if appdir not in sys.path:
+    sys.path.insert(0, appdir)
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from benchmarks.synthetic import synthetic_experiment
+from fedquery.fedquery import EXAMPLE_QUERY
+from getdata import getdata
+from load.load import FED3_File, fed_concat
+from plots import plots
+
+#the GUI defaults (settings/DEFAULT.csv), as passed to plotting functions
+DEFAULT_ARGUMENTS = dict(shade_dark=True, lights_on=7, lights_off=19,
+                         groups=['A', 'B'], pellet_values='Cumulative',
+                         pellet_bins='1H', pellet_color='C0',
+                         pellet_align=False, average_error='SEM',
+                         average_bins='1H', average_method='shared date & time',
+                         average_align_start=7, average_align_days=3,
+                         dependent='pellets', circ_value='pellets',
+                         circ_error='SEM', circ_show_indvl=False, resolution=10,
+                         kde=True, logx=True, norm_meals=True,
+                         meal_pellet_minimum=1, meal_duration=1,
+                         motor_turns_thresh=10, retrieval_threshold=None,
+                         poketime_cutoff=None, poke_style='Cumulative',
+                         poke_bins='1H', poke_show_correct=True,
+                         poke_show_error=True, poke_show_left=False,
+                         poke_show_right=False, bias_style='correct (%)',
+                         dynamic_color=True, break_style='pellets',
+                         break_hours=1, break_mins=0, break_error='SEM',
+                         break_show_indvl=False, sql=EXAMPLE_QUERY)
+
+def data_functions(module):
+    """The plotting functions of a module: those taking a FED3_File ("FED")
+    or a list of them ("FEDs") first, and any settings (**kwargs)."""
+    output = []
+    for name, func in inspect.getmembers(module, inspect.isfunction):
+        if func.__module__ != module.__name__ or name == 'fed_summary':
+            continue
+        params = list(inspect.signature(func).parameters.values())
+        if (params and params[0].name in ['FED', 'FEDs'] and
+            params[-1].kind == inspect.Parameter.VAR_KEYWORD):
+            output.append((name, func, params[0].name))
+    return output
+
+def time_call(func, repeat=1):
+    """
+    Times a function (the best of several calls).
+
+    Returns
+    -------
+    float or str
+        Seconds, or the error raised by the function
+    """
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            return type(e).__name__ + ': ' + str(e)[:80]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def draw(result):
+    """Renders plots like the GUI; other outputs are returned untouched."""
+    if isinstance(result, Figure):
+        FigureCanvasAgg(result).draw()
+    return result
+
+def run_point(folder, devices, rows, modes, repeat=1, xlsx_max=100000,
+              pattern=None, seed=0):
+    """
+    Generates one synthetic experiment and times every stage on it.
+
+    Parameters
+    ----------
+    folder : str
+        Folder for the generated files
+    devices : int
+        Number of FED3s
+    rows : int
+        Events logged by each FED3
+    modes : sequence
+        Modes cycled over the devices (see synthetic_experiment())
+    repeat : int, optional
+        Calls of each stage (the best is kept). The default is 1.
+    xlsx_max : int, optional
+        Largest files to also time as .xlsx. The default is 100000.
+    pattern : str, optional
+        Regular expression; only stages with matching names are timed.
+        The default is None (all).
+    seed : int, optional
+        Seed for the data. The default is 0.
+
+    Returns
+    -------
+    dict
+        Seconds (or an error message) by stage name
+    """
+    def wanted(name):
+        return pattern is None or re.search(pattern, name)
+
+    times = {}
+    paths = synthetic_experiment(os.path.join(folder, 'csv'), devices, rows,
+                                 modes, seed=seed)
+    feds = []
+    def load_csv():
+        feds[:] = [FED3_File(path) for path in paths]
+    times['load .CSV'] = time_call(load_csv, repeat)
+    if not feds:
+        return times
+    for i, fed in enumerate(feds):
+        fed.group = ['A' if i % 2 == 0 else 'B']
+    if wanted('load .xlsx') and rows <= xlsx_max:
+        xlsx = synthetic_experiment(os.path.join(folder, 'xlsx'), devices, rows,
+                                    modes, extension='.xlsx', seed=seed)
+        times['load .xlsx'] = time_call(lambda: [FED3_File(path) for path in xlsx],
+                                        repeat)
+    if wanted('fed_concat'):
+        segments = synthetic_experiment(os.path.join(folder, 'segments'), 1, rows,
+                                        modes, segments=4, seed=seed)
+        parts = [FED3_File(path) for path in segments]
+        times['fed_concat'] = time_call(lambda: fed_concat(parts), repeat)
+    for module in [getdata, plots]:
+        prefix = module.__name__.split('.')[-1] + '.'
+        for name, func, first in data_functions(module):
+            if not wanted(prefix + name):
+                continue
+            arguments = dict(DEFAULT_ARGUMENTS)
+            arguments['groups'] = sorted(set(g for fed in feds for g in fed.group))
+            arguments[first] = feds[0] if first == 'FED' else feds
+            call = lambda: draw(func(**arguments))
+            times[prefix + name] = time_call(call, repeat)
+    if wanted('fed_summary'):
+        times['fed_summary'] = time_call(lambda: plots.fed_summary(feds), repeat)
+    return times
+
+def scaling_exponent(sizes, times):
+    """Slope of log(time) against log(size), or None if not measurable."""
+    points = [(s, t) for s, t in zip(sizes, times)
+              if isinstance(t, float) and t > 0]
+    if len(points) < 2 or len(set(s for s, t in points)) < 2:
+        return None
+    x, y = np.log([p[0] for p in points]), np.log([p[1] for p in points])
+    return np.polyfit(x, y, 1)[0]
+
+def report(sweep, sizes, results):
+    """Prints the times of each stage over a sweep, with its exponent."""
+    stages = []
+    for point in results:
+        stages += [stage for stage in point if stage not in stages]
+    header = '{:<40}'.format(sweep) + ''.join('{:>11}'.format(s) for s in sizes)
+    print(header + '{:>8}'.format('k'))
+    print('-' * (len(header) + 8))
+    for stage in stages:
+        line = '{:<40}'.format(stage)
+        times = [point.get(stage) for point in results]
+        for t in times:
+            if isinstance(t, float):
+                line += '{:>10.3f}s'.format(t)
+            else:
+                line += '{:>11}'.format('-' if t is None else 'error')
+        k = scaling_exponent(sizes, times)
+        line += '{:>8}'.format('' if k is None else '{:.2f}'.format(k))
+        print(line)
+    print()
+
+def plot_scaling(sweeps, path, top=10):
+    """Saves log-log scaling curves of the slowest stages of each sweep."""
+    fig = Figure(figsize=(6 * len(sweeps), 4.5), dpi=150)
+    for i, (sweep, sizes, results) in enumerate(sweeps):
+        ax = fig.add_subplot(1, len(sweeps), i + 1)
+        last = results[-1] if results else {}
+        slowest = sorted([s for s in last if isinstance(last[s], float)],
+                         key=lambda s: last[s], reverse=True)[:top]
+        for stage in slowest:
+            times = [point.get(stage) for point in results]
+            x = [s for s, t in zip(sizes, times) if isinstance(t, float)]
+            y = [t for t in times if isinstance(t, float)]
+            ax.plot(x, y, marker='o', label=stage)
+        ax.set_xscale('log')
+        ax.set_yscale('log')
+        ax.set_xlabel(sweep)
+        ax.set_ylabel('Seconds')
+        ax.legend(fontsize=6)
+    fig.tight_layout()
+    FigureCanvasAgg(fig).print_figure(path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, nargs='*', default=[1000, 10000, 100000],
+                        help='events per FED3 for the rows sweep')
+    parser.add_argument('--devices', type=int, nargs='*', default=[1, 10, 100],
+                        help='number of FED3s for the devices sweep')
+    parser.add_argument('--device-rows', type=int, default=1000,
+                        help='events per FED3 for the devices sweep')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='calls of each stage (the best is kept)')
+    parser.add_argument('--xlsx-max', type=int, default=100000,
+                        help='largest files to also load as .xlsx')
+    parser.add_argument('--only', help='regular expression of stages to time')
+    parser.add_argument('--data', help='keep the generated files in this folder')
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--plot', help='also save scaling curves to this image')
+    args = parser.parse_args(argv)
+    warnings.simplefilter('ignore')
+    folder = args.data or tempfile.mkdtemp(prefix='fed3_bench_')
+    sweeps = [('rows', args.rows, 2, ['FR1', 'PR']),
+              ('devices', args.devices, args.device_rows, ['FR1', 'FR3', 'PR'])]
+    output = {}
+    finished = []
+    try:
+        for sweep, sizes, fixed, modes in sweeps:
+            results = []
+            for size in sizes:
+                devices, rows = (fixed, size) if sweep == 'rows' else (size, fixed)
+                point = os.path.join(folder, '{}_{}'.format(sweep, size))
+                print('{}: {} device(s) x {} rows'.format(sweep, devices, rows),
+                      file=sys.stderr)
+                results.append(run_point(point, devices, rows, modes, args.repeat,
+                                         args.xlsx_max, args.only))
+            if sizes:
+                report(sweep, sizes, results)
+                finished.append((sweep, sizes, results))
+            output[sweep] = {'sizes':sizes, 'results':results}
+    finally:
+        if not args.data:
+            shutil.rmtree(folder, ignore_errors=True)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(output, f, indent=2)
+    if args.plot and finished:
+        plot_scaling(finished, args.plot)
+    return output
+
+if __name__ == '__main__':
+    main()
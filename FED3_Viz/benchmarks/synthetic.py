@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Generates realistic synthetic FED3 logs, for benchmarking FED3 Viz on
+recordings much larger (or far more numerous) than the example data.
+
+Pokes arrive in bouts, more often during the dark phase; every active poke
+counts toward the fixed or progressive ratio, and completing it dispenses a
+pellet (logged with its retrieval time, interpellet interval and motor
+turns).  Logs can mimic current FED3 library files ("new": FR, Poke_Time,
+InterPelletInterval... columns) or older ones ("old": the columns of the
+example data), and can be split into consecutive segments (each restarting
+its counters, as when a FED is reset) to be joined with fed_concat().
+
+    from benchmarks.synthetic import synthetic_experiment
+    paths = synthetic_experiment('bench_data', devices=10, rows=100000)
+
+@author: https://github.com/earnestt1234
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+TIME_COLUMN = 'MM:DD:YYYY hh:mm:ss'
+
+NEW_COLUMNS = [TIME_COLUMN, 'Library_Version', 'Session_type', 'Device_Number',
+               'Battery_Voltage', 'Motor_Turns', 'FR', 'Event', 'Active_Poke',
+               'Left_Poke_Count', 'Right_Poke_Count', 'Pellet_Count',
+               'Block_Pellet_Count', 'Retrieval_Time', 'InterPelletInterval',
+               'Poke_Time']
+
+OLD_COLUMNS = [TIME_COLUMN, 'Device_Number', 'Battery_Voltage', 'Motor_Turns',
+               'Session_Type', 'Event', 'Active_Poke', 'Left_Poke_Count',
+               'Right_Poke_Count', 'Pellet_Count', 'Retrieval_Time']
+
+#Excel's row limit (including the header)
+XLSX_MAX_ROWS = 1048575
+
+def pr_ratios(count):
+    """The first count ratios of the FED3 progressive ratio schedule
+    (round(5 * e^(0.2 * n)) - 5, i.e. 1, 2, 4, 6, 9, 12...)."""
+    n = np.arange(1, count + 1)
+    return np.maximum(np.round(5 * np.exp(0.2 * n)) - 5, 1).astype(np.int64)
+
+def synthetic_fed(rows=1000, mode='FR1', device=0, start='2020-01-01 12:00:00',
+                  version='new', active_poke='Left', lights_on=7, lights_off=19,
+                  seed=None):
+    """
+    Generates the log of one FED3 recording.
+
+    Parameters
+    ----------
+    rows : int, optional
+        Number of logged events (pokes and pellets). The default is 1000.
+    mode : str, optional
+        "FR<n>" (e.g. "FR1", "FR5") or "PR". The default is 'FR1'.
+    device : int, optional
+        Device number. The default is 0.
+    start : datetime-like, optional
+        Time of the first event. The default is '2020-01-01 12:00:00'.
+    version : str, optional
+        "new" (current FED3 library columns) or "old" (columns of older
+        files). The default is 'new'.
+    active_poke : str, optional
+        "Left" or "Right". The default is 'Left'.
+    lights_on, lights_off : int, optional
+        Hours (0-23) of the light cycle; animals poke more in the dark.
+        The defaults are 7 and 19.
+    seed : int, optional
+        Seed for the random number generator. The default is None.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The log, with the columns of a FED3 file (times in the first column)
+    """
+    rng = np.random.default_rng(seed)
+    if mode.upper().startswith('PR'):
+        progressive = True
+        ratio = None
+    else:
+        progressive = False
+        ratio = int(mode[2:]) if mode[2:].isdigit() else 1
+    p_active = 0.8
+
+    #pokes, and which of them complete the ratio (dispensing a pellet)
+    per_poke = 1 + (0 if progressive else p_active / ratio)
+    n_pokes = int(rows / per_poke) + 64
+    while True:
+        active = rng.random(n_pokes) < p_active
+        completed = np.cumsum(active)
+        if progressive:
+            thresholds = np.cumsum(pr_ratios(64))
+            thresholds = thresholds[thresholds <= max(completed[-1], 1)]
+            pellet_after = active & np.isin(completed, thresholds)
+            current = pr_ratios(len(thresholds) + 1)[np.searchsorted(thresholds, completed)]
+        else:
+            pellet_after = active & (completed % ratio == 0)
+            current = np.full(n_pokes, ratio)
+        if n_pokes + pellet_after.sum() >= rows:
+            break
+        n_pokes *= 2
+
+    #interleave pellet rows after the pokes which earned them, then trim
+    counts = 1 + pellet_after
+    first_row = np.cumsum(counts) - counts
+    total = first_row[-1] + counts[-1]
+    is_pellet = np.zeros(total, dtype=bool)
+    is_pellet[first_row[pellet_after] + 1] = True
+    poke_of_row = np.cumsum(~is_pellet) - 1
+    is_pellet, poke_of_row = is_pellet[:rows], poke_of_row[:rows]
+    poke_active = active[poke_of_row]
+    left_side = poke_active == (active_poke == 'Left')
+    is_left = ~is_pellet & left_side
+    is_right = ~is_pellet & ~left_side
+
+    #times: bouts of quick pokes separated by pauses, longer in the light
+    gaps = np.where(rng.random(rows) < 0.85,
+                    rng.exponential(4, rows),
+                    rng.exponential(600, rows))
+    gaps[is_pellet] = rng.uniform(1, 3, is_pellet.sum())
+    gaps[0] = 0
+    start = pd.Timestamp(start)
+    hours = (start + pd.to_timedelta(np.cumsum(gaps), unit='s')).hour
+    if lights_off > lights_on:
+        light = (hours >= lights_on) & (hours < lights_off)
+    else:
+        light = (hours >= lights_on) | (hours < lights_off)
+    gaps = np.where(light & ~is_pellet, gaps * 3, gaps)
+    seconds = np.cumsum(gaps)
+    times = start + pd.to_timedelta(np.floor(seconds), unit='s')
+
+    pellet_count = np.cumsum(is_pellet)
+    retrieval = np.full(rows, np.nan)
+    retrieval[is_pellet] = np.round(rng.lognormal(1, 0.8, is_pellet.sum()), 1)
+    motor_turns = np.zeros(rows, dtype=np.int64)
+    motor_turns[is_pellet] = rng.geometric(0.4, is_pellet.sum())
+    voltage = np.round(4.2 - 0.6 * seconds / max(seconds[-1], 1)
+                       + rng.normal(0, 0.01, rows), 2)
+    df = pd.DataFrame({TIME_COLUMN: times,
+                       'Device_Number': device,
+                       'Battery_Voltage': voltage,
+                       'Motor_Turns': motor_turns,
+                       'Event': np.where(is_pellet, 'Pellet', 'Poke'),
+                       'Active_Poke': active_poke,
+                       'Left_Poke_Count': np.cumsum(is_left),
+                       'Right_Poke_Count': np.cumsum(is_right),
+                       'Pellet_Count': pellet_count})
+    if version == 'old':
+        df['Session_Type'] = (mode.upper() if progressive else
+                              mode.upper() + '_Light_tracking')
+        df['Retrieval_Time'] = retrieval
+        return df[OLD_COLUMNS]
+
+    pellet_times = seconds[is_pellet]
+    ipi = np.full(rows, np.nan)
+    ipi[is_pellet] = np.round(np.diff(pellet_times, prepend=pellet_times[:1]))
+    poke_time = np.full(rows, np.nan)
+    poke_time[~is_pellet] = np.round(rng.gamma(2, 0.1, (~is_pellet).sum()), 2)
+    retrieval = retrieval.astype(object)
+    timed_out = is_pellet & (rng.random(rows) < 0.01)
+    retrieval[timed_out] = 'Timed_out'
+    df['Library_Version'] = '1.1.25'
+    df['Session_type'] = 'PR' if progressive else mode.upper()
+    df['FR'] = current[poke_of_row]
+    df['Block_Pellet_Count'] = pellet_count
+    df['Retrieval_Time'] = retrieval
+    df['InterPelletInterval'] = ipi
+    df['Poke_Time'] = poke_time
+    return df[NEW_COLUMNS]
+
+def synthetic_segments(rows=1000, segments=2, gap='10min', **kwargs):
+    """
+    Generates one recording split into consecutive segments, each
+    restarting the counters of the FED (see load.fed_concat()).
+
+    Parameters
+    ----------
+    rows : int, optional
+        Total number of events. The default is 1000.
+    segments : int, optional
+        Number of segments. The default is 2.
+    gap : str, optional
+        Pause between segments (a pandas timedelta string). The default
+        is '10min'.
+    **kwargs :
+        Passed to synthetic_fed()
+
+    Returns
+    -------
+    list
+        DataFrames of each segment
+    """
+    start = pd.Timestamp(kwargs.pop('start', '2020-01-01 12:00:00'))
+    seed = kwargs.pop('seed', None)
+    sizes = np.diff(np.linspace(0, rows, segments + 1).astype(int))
+    output = []
+    for i, size in enumerate(sizes):
+        df = synthetic_fed(max(size, 1), start=start,
+                           seed=None if seed is None else seed + i, **kwargs)
+        output.append(df)
+        start = df[TIME_COLUMN].iloc[-1] + pd.Timedelta(gap)
+    return output
+
+def fed_filename(device, start, number=0, extension='.CSV'):
+    """The name the FED3 gives a log, e.g. FED001_010120_00.CSV"""
+    return 'FED{:03d}_{}_{:02d}{}'.format(device, pd.Timestamp(start).strftime('%m%d%y'),
+                                          number, extension)
+
+def write_fed(df, path):
+    """
+    Writes a generated log as .csv or .xlsx (chosen by the extension of
+    path; .csv may be compressed, e.g. .CSV.gz).
+
+    Raises
+    ------
+    ValueError
+        For .xlsx logs longer than Excel allows
+    """
+    if path.lower().endswith('.xlsx'):
+        if len(df) > XLSX_MAX_ROWS:
+            raise ValueError('Too many rows for .xlsx: ' + str(len(df)))
+        df.to_excel(path, index=False)
+    else:
+        df.to_csv(path, index=False, date_format='%m/%d/%Y %H:%M:%S')
+
+def synthetic_experiment(folder, devices=1, rows=1000, modes=('FR1',),
+                         extension='.CSV', segments=1, version='new',
+                         start='2020-01-01 12:00:00', stagger='5min', seed=0):
+    """
+    Writes the logs of an experiment with many FED3s to a folder.
+
+    Parameters
+    ----------
+    folder : str
+        Output folder (created if needed)
+    devices : int, optional
+        Number of FED3s (device numbers 0 to devices - 1). The default is 1.
+    rows : int, optional
+        Events logged by each FED3. The default is 1000.
+    modes : sequence, optional
+        Modes ("FR<n>" or "PR") cycled over the devices. The default is
+        ('FR1',).
+    extension : str, optional
+        '.CSV', '.xlsx', or a compressed CSV (e.g. '.CSV.gz'). The default
+        is '.CSV'.
+    segments : int, optional
+        Files (consecutive segments) written for each device. The default
+        is 1.
+    version : str, optional
+        "new" or "old" columns (see synthetic_fed()). The default is 'new'.
+    start : datetime-like, optional
+        Start of the first recording. The default is '2020-01-01 12:00:00'.
+    stagger : str, optional
+        Delay between the starts of consecutive devices. The default is
+        '5min'.
+    seed : int, optional
+        Seed for the random number generator. The default is 0.
+
+    Returns
+    -------
+    list
+        Paths of the written files, by device and segment
+    """
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for device in range(devices):
+        device_start = pd.Timestamp(start) + device * pd.Timedelta(stagger)
+        parts = synthetic_segments(rows, segments, mode=modes[device % len(modes)],
+                                   device=device, start=device_start,
+                                   version=version, seed=seed + device * segments)
+        for number, df in enumerate(parts):
+            path = os.path.join(folder, fed_filename(device, df[TIME_COLUMN].iloc[0],
+                                                     number, extension))
+            write_fed(df, path)
+            paths.append(path)
+    return paths
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk store of the processed data of a whole experiment.
+
+@author: https://github.com/earnestt1234
+"""
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk store of the processed data of a whole experiment (many FED3 files),
+as one dataset partitioned by device and day:
+
+    <store>/store.json
+    <store>/events/device=<device>/day=<YYYY-MM-DD>/<fingerprint>.parquet
+
+store.json holds the attributes (including group labels), devices, days and
+times of each file.  Queries by group and date range only read the
+partitions which can match, and only the columns asked for.  Partitions
+are Parquet files, so the store requires pyarrow; nothing in a store is
+unpickled, so any folder can safely be opened as one.
+
+@author: https://github.com/earnestt1234
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import re
+
+import pandas as pd
+
+from load.load import FED3_File, row_aggregates
+
+PARQUET = importlib.util.find_spec('pyarrow') is not None
+
+ATTRIBUTES = ['directory', 'basename', 'filename', 'extension', 'fingerprint',
+              'foreign_columns', 'missing_columns', 'mode', 'group']
+
+def partition_name(value):
+    """Make a value safe to use in a partition folder name."""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return re.sub(r'[^\w.-]', '_', str(value))
+
+def fed_device(fed):
+    """The device number of a FED3_File (or its filename, if unknown)."""
+    if 'Device_Number' in fed.data.columns:
+        value = fed.data['Device_Number'].iloc[0]
+        if not pd.isna(value):
+            return partition_name(value)
+    return partition_name(fed.filename)
+
+class ExperimentStore():
+    """Partitioned on-disk dataset of many FED3_Files"""
+    def __init__(self, root):
+        """
+        Opens (or creates) an experiment store.
+
+        Parameters
+        ----------
+        root : str
+            Folder of the store
+
+        Raises
+        ------
+        ImportError
+            When pyarrow is not installed
+        ValueError
+            When the store was written in another format (older stores
+            could hold pickles, which are not read)
+        """
+        if not PARQUET:
+            raise ImportError('Experiment stores require pyarrow')
+        self.root = root
+        self.meta_path = os.path.join(root, 'store.json')
+        self.format = 'parquet'
+        self.files = {}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            if meta.get('format') != self.format:
+                raise ValueError('Unsupported experiment store format: ' +
+                                 str(meta.get('format')))
+            self.files = meta['files']
+
+    def save(self):
+        """Writes store.json (replacing it only once fully written)."""
+        os.makedirs(self.root, exist_ok=True)
+        temp = self.meta_path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump({'format':self.format, 'files':self.files}, f, indent=1)
+        os.replace(temp, self.meta_path)
+
+    #---WRITING
+    def add(self, feds, callback=None):
+        """
+        Adds FED3_Files to the store (replacing any stored copy of them,
+        identified by their fingerprint).
+
+        Parameters
+        ----------
+        feds : list
+            FED3_File objects
+        callback : callable, optional
+            Called with each FED3_File after it is written.
+        """
+        for fed in feds:
+            if fed.fingerprint in self.files:
+                self.remove([fed.fingerprint], save=False)
+            device = fed_device(fed)
+            days = []
+            for day, part in fed.data.groupby(fed.data.index.normalize()):
+                days.append(str(day.date()))
+                path = self.partition_path(device, days[-1], fed.fingerprint)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self.write_frame(part, path)
+            self.files[fed.fingerprint] = {
+                'attributes': {name:getattr(fed, name) for name in ATTRIBUTES},
+                'device': device,
+                'days': days,
+                'columns': list(fed.data.columns),
+                'index_name': fed.data.index.name,
+                'start_time': str(fed.start_time),
+                'end_time': str(fed.end_time),
+                'events': fed.events,}
+            if callback:
+                callback(fed)
+        self.save()
+
+    def update_groups(self, feds):
+        """Stores the current group labels of FED3_Files in the store."""
+        for fed in feds:
+            if fed.fingerprint in self.files:
+                self.files[fed.fingerprint]['attributes']['group'] = list(fed.group)
+        self.save()
+
+    def remove(self, fingerprints, save=True):
+        """Deletes files (by fingerprint) and their partitions."""
+        for fingerprint in fingerprints:
+            info = self.files.pop(fingerprint, None)
+            if info is None:
+                continue
+            for day in info['days']:
+                path = self.partition_path(info['device'], day, fingerprint)
+                if os.path.exists(path):
+                    os.remove(path)
+                folder = os.path.dirname(path)
+                while folder != self.root and not os.listdir(folder):
+                    os.rmdir(folder)
+                    folder = os.path.dirname(folder)
+        if save:
+            self.save()
+
+    def write_frame(self, df, path):
+        df = df.copy()
+        for column in df.columns:
+            if isinstance(df[column].dtype, pd.SparseDtype):
+                df[column] = df[column].sparse.to_dense()
+            elif (df[column].dtype == object and
+                  pd.api.types.infer_dtype(df[column]).startswith('mixed')):
+                df[column] = df[column].astype(str)
+        df.to_parquet(path)
+
+    #---READING
+    def partition_path(self, device, day, fingerprint):
+        return os.path.join(self.root, 'events', 'device=' + device,
+                            'day=' + day, fingerprint + '.parquet')
+
+    def read_frame(self, path, columns=None):
+        return pd.read_parquet(path, columns=columns)
+
+    def select(self, groups=None, start=None, end=None):
+        """
+        Finds the stored files matching a query, using only store.json.
+
+        Parameters
+        ----------
+        groups : list, optional
+            Only files in any of these groups. The default is None.
+        start, end : datetime-like, optional
+            Only files recording within these times. The default is None.
+
+        Returns
+        -------
+        list
+            Fingerprints of the matching files, by start time
+        """
+        matches = []
+        for fingerprint, info in self.files.items():
+            if groups is not None and not set(groups) & set(info['attributes']['group']):
+                continue
+            if start is not None and pd.Timestamp(info['end_time']) < pd.Timestamp(start):
+                continue
+            if end is not None and pd.Timestamp(info['start_time']) > pd.Timestamp(end):
+                continue
+            matches.append(fingerprint)
+        return sorted(matches, key=lambda fp: self.files[fp]['start_time'])
+
+    def read(self, fingerprint, columns=None, start=None, end=None):
+        """
+        Reads the data of one stored file, only opening the partitions of
+        days within start and end.
+
+        Returns
+        -------
+        pandas.DataFrame
+        """
+        info = self.files[fingerprint]
+        first = None if start is None else str(pd.Timestamp(start).date())
+        last = None if end is None else str(pd.Timestamp(end).date())
+        if columns is not None:
+            columns = [c for c in columns if c in info['columns']]
+        parts = [self.read_frame(self.partition_path(info['device'], day, fingerprint),
+                                 columns)
+                 for day in info['days'] if (first is None or day >= first) and
+                                            (last is None or day <= last)]
+        if not parts:
+            return pd.DataFrame(columns=columns or info['columns'],
+                                index=pd.DatetimeIndex([], name=info['index_name']))
+        df = pd.concat(parts)
+        df.index.name = info['index_name']
+        if start is not None or end is not None:
+            s = pd.Timestamp(start) if start is not None else df.index.min()
+            e = pd.Timestamp(end) if end is not None else df.index.max()
+            df = df[(df.index >= s) & (df.index <= e)]
+        return df
+
+    def feds(self, groups=None, start=None, end=None):
+        """
+        Loads stored files as FED3_Files (with their group labels), which
+        can be passed to any plots or getdata function.  A file cut short
+        by start or end keeps its derived columns (Elapsed_Time, etc.) and
+        start time from the whole recording, and gets its own fingerprint.
+
+        Parameters
+        ----------
+        groups : list, optional
+            Only files in any of these groups. The default is None.
+        start, end : datetime-like, optional
+            Only data within these times. The default is None.
+
+        Returns
+        -------
+        list
+            FED3_File objects
+        """
+        output = []
+        for fingerprint in self.select(groups, start, end):
+            data = self.read(fingerprint, start=start, end=end)
+            if data.empty:
+                continue
+            info = self.files[fingerprint]
+            attributes = dict(info['attributes'])
+            attributes['group'] = list(attributes['group'])
+            start_time = None
+            if len(data.index) < info['events']:
+                start_time = info['start_time']
+                window = '{} {} {}'.format(fingerprint, data.index[0], data.index[-1])
+                attributes['fingerprint'] = hashlib.blake2b(window.encode(),
+                                                            digest_size=8).hexdigest()
+            output.append(FED3_File.from_processed(data, attributes, start_time))
+        return output
+
+    def scan(self, columns=None, groups=None, start=None, end=None):
+        """
+        Reads the data of all matching files into one DataFrame, with
+        "Fingerprint", "File" (basename) and "Device" columns added.
+
+        Parameters
+        ----------
+        columns : list, optional
+            Only read these columns. The default is None (all).
+        groups : list, optional
+            Only files in any of these groups. The default is None.
+        start, end : datetime-like, optional
+            Only data within these times. The default is None.
+
+        Returns
+        -------
+        pandas.DataFrame
+        """
+        parts = []
+        for fingerprint in self.select(groups, start, end):
+            df = self.read(fingerprint, columns, start, end)
+            info = self.files[fingerprint]
+            df = df.assign(Fingerprint=fingerprint,
+                           File=info['attributes']['basename'], Device=info['device'])
+            parts.append(df)
+        if not parts:
+            return pd.DataFrame(columns=(columns or []) + ['Fingerprint', 'File', 'Device'],
+                                index=pd.DatetimeIndex([]))
+        return pd.concat(parts)
+
+    def aggregate(self, freq, groups=None, start=None, end=None):
+        """
+        Bins every matching file by time in one pass over the dataset,
+        summing the aggregates of load.row_aggregates() (pellets, pokes,
+        correct & errors, IPI and retrieval sums & counts).
+
+        Parameters
+        ----------
+        freq : str
+            Bin size (a pandas offset alias)
+        groups : list, optional
+            Only files in any of these groups. The default is None.
+        start, end : datetime-like, optional
+            Only data within these times. The default is None.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Aggregates indexed by file fingerprint (files from different
+            folders can share a name; see ExperimentStore.files for their
+            attributes) and bin
+        """
+        columns = ['Binary_Pellets', 'Binary_Left_Pokes', 'Binary_Right_Pokes',
+                   'Correct_Poke', 'Interpellet_Intervals', 'Retrieval_Time']
+        frame = self.scan(columns, groups, start, end)
+        rows = row_aggregates(frame)
+        rows['Fingerprint'] = frame['Fingerprint'].values
+        return rows.groupby(['Fingerprint', pd.Grouper(freq=freq)]).sum()
@@ -10,8 +10,8 @@ import matplotlib.cbook
 warnings.filterwarnings("ignore",category=matplotlib.cbook.mplDeprecation)
 
 import datetime as dt
-import emoji
-import matplotlib.pyplot as plt
+import multiprocessing
+import numpy as np
 import os
 import pandas as pd
 import pickle
@@ -20,18 +20,25 @@ import subprocess
 import sys
 import tkinter as tk
 import tkinter.filedialog
+import tkinter.messagebox
 import webbrowser
 
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from matplotlib.backends.backend_tkagg import (
     FigureCanvasTkAgg, NavigationToolbar2Tk)
+from matplotlib.figure import Figure
 from tkinter import ttk
-from tkcalendar import DateEntry
 
 from _version import __version__, __date__
-from fed_inspect import fed_inspect
 from getdata import getdata
-from load.load import FED3_File, fed_concat, FedCannotConcat
+from experimentstore.experimentstore import ExperimentStore
+from fedquery.fedquery import FedDatabase, SCHEMA_HELP, EXAMPLE_QUERY
+from folderindex.folderindex import FolderIndex
+from load.load import (FED3_File, fed_concat, FedCannotConcat,
+                       fed_intervals, overlapping_pairs, busiest_window,
+                       sniff_header, expand_archives, split_archive_path)
+from perf import perf
 from plots import plots
 
 class FED_Plot():
@@ -80,22 +87,58 @@ class FED3_Viz(tk.Tk):
             self.iconbitmap('img/fedviz_logo.ico')
         self.r_click = '<Button-3>'
         self.LOADED_FEDS = []
+        self.FED_TO_IID = {} #FED3_File -> row of the file view
+        self.IID_TO_FED = {}
+        self.FEDS_BY_HASH = {} #content fingerprint -> FED3_File
+        self.FEDS_BY_PATH = {} #directory -> FED3_File
+        self.folder_index = None #opened on first folder load
+        self.folder_index_path = 'settings/FOLDER_INDEX.db'
+        self.parsed_cache_dir = 'settings/PARSED_CACHE' #parsed files, by fingerprint
+        self.FED_ROWS = {} #row values currently shown, by iid
+        self.FED_MEMORY = {} #bytes used by each FED's data, by iid
+        self.fed_iid_counter = 0
+        self.fed_sort_keys = {'Name'       : lambda x:x.basename,
+                              'Mode'       : lambda x:x.mode,
+                              'Start Time' : lambda x:x.start_time,
+                              'End Time'   : lambda x:x.end_time,
+                              '# Events'   : lambda x:x.events,
+                              'Duration'   : lambda x:x.duration,
+                              'Groups'     : lambda x:len(x.group),
+                              'Memory'     : lambda x:self.FED_MEMORY[self.FED_TO_IID[x]],
+                              ''           : lambda x:len(x.missing_columns)}
         self.PLOTS = OrderedDict()
         self.GROUPS = []
         self.failed_date_feds = []
         self.on_display_func = None
         self.loading = False
         self.plotting = False
+        perf.instrument() #time stages once the Performance window is opened
+        self.perf_window = None
+        self.PLOT_POOL = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1))
+        self.PLOT_QUEUE = deque()
+        self.plot_jobs_total = 0
+        self.plot_jobs_done = 0
+        self.plot_polling = False
+        self.canvas_sizes = {} #canvas size for each window geometry, see resize_plot
+        self.image_shown = None #plot shown as an image, not drawn on the axes
+        self.CANVAS_CACHE = OrderedDict() #rendered canvases, see cache_canvas
+        self.canvas_cache_bytes = 0
+        self.canvas_cache_budget = 256 * 1024**2
+        self.canvas_cache_target = None
         self.mac_color = '#E2E2E2'
         self.colors =  ['blue','red','green','yellow','purple','orange',
                         'black',]
         self.NEW_WINDOW_FIGS = [] #created before the main figure/ax to new window resizing bug!
         for i in range(5):
-            fig, ax = plt.subplots(dpi=150)
+            fig = Figure(dpi=150)
+            ax = fig.add_subplot()
             self.NEW_WINDOW_FIGS.append(New_Window_Figure(toplevel=None,fig=fig,ax=ax,
                                                          frame=None,canvas=None,
                                                          toolbar=None,in_use=False))
-        self.FIGURE, self.AX = plt.subplots(figsize=(5,3.5), dpi=150) #fig/axes used in plot tab
+        #fig/axes used in plot tab (Figures rather than pyplot, which isn't
+        #needed by the GUI or its worker processes)
+        self.FIGURE = Figure(figsize=(5,3.5), dpi=150)
+        self.AX = self.FIGURE.add_subplot()
         self.CB = None
         self.POLAR = False
         times = []
@@ -169,7 +212,7 @@ class FED3_Viz(tk.Tk):
                                           font=italic)
         #spreadsheets
         treeview_columns = ['','Name','Mode','# Events','Start Time',
-                            'End Time','Duration','Groups']
+                            'End Time','Duration','Groups','Memory']
         self.files_spreadsheet = ttk.Treeview(self.home_sheets,
                                               columns=treeview_columns)
         self.files_spreadsheet.column('', width=25, stretch=False)
@@ -180,6 +223,7 @@ class FED3_Viz(tk.Tk):
         self.files_spreadsheet.column('End Time', width=125)
         self.files_spreadsheet.column('Duration', width=100)
         self.files_spreadsheet.column('Groups', width=150)
+        self.files_spreadsheet.column('Memory', width=125)
         for i,val in enumerate(treeview_columns):
             self.files_spreadsheet.heading(i, text=val)
         self.files_spreadsheet['show'] = 'headings'
@@ -444,10 +488,18 @@ class FED3_Viz(tk.Tk):
         self.plot_cover.grid(row=0,column=0, sticky='nsew')
         self.plot_cover.grid_remove()
         self.canvas = FigureCanvasTkAgg(self.FIGURE, master=self.plot_frame)
+        self.canvas.mpl_connect('draw_event', self.cache_canvas)
+        self.canvas.mpl_connect('resize_event', self.draw_shown_image)
         self.canvas.draw_idle()
         self.canvas.get_tk_widget().pack(side=tkinter.BOTTOM, fill=tkinter.BOTH, expand=1)
         self.nav_toolbar = NavigationToolbar2Tk(self.canvas, self.plot_frame)
         self.nav_toolbar.update()
+        #clicks and keys on the plot or toolbar first draw a plot shown as
+        #an image (these run before matplotlib's own bindings)
+        for widget in [self.canvas.get_tk_widget()] + self.nav_toolbar.winfo_children():
+            widget.bindtags(('ShownImage',) + widget.bindtags())
+        self.bind_class('ShownImage', '<ButtonPress>', self.draw_shown_image)
+        self.bind_class('ShownImage', '<KeyPress>', self.draw_shown_image)
         self.canvas._tkcanvas.pack(side=tkinter.TOP, fill=tkinter.BOTH, expand=1)
         self.plot_listbox = tk.Listbox(self.plot_tab, selectmode=tk.EXTENDED,
                                        activestyle=tk.NONE,)
@@ -474,6 +526,18 @@ class FED3_Viz(tk.Tk):
         self.plot_data = tk.Button(self.plot_buttons, text='Save Plot Data',
                                    command=self.save_plot_data,
                                    state=tk.DISABLED)
+        self.plot_perf = tk.Button(self.plot_buttons, text='Performance',
+                                   command=self.performance_window)
+        self.button_abort_plot = tk.Button(self.plot_buttons, text='Abort Plotting',
+                                           command=self.escape,
+                                           state=tk.DISABLED)
+        self.plot_progressbar = ttk.Progressbar(self.plot_buttons, orient='horizontal',
+                                                mode='determinate', length=100)
+        self.plot_progresstextvar = tk.StringVar()
+        self.plot_progresstextvar.set('')
+        self.plot_progresstext = tk.Label(self.plot_buttons, wraplength=150,
+                                          justify=tk.LEFT,
+                                          textvariable=self.plot_progresstextvar)
     #---PLACE WIDGETS FOR PLOTS TAB
         self.plot_buttons.grid(row=0,column=0,sticky='nsew')
         self.plot_listbox.grid(row=0,column=1,sticky='nsew')
@@ -484,8 +548,237 @@ class FED3_Viz(tk.Tk):
         self.plot_save.grid(row=2,column=0,sticky='ew')
         self.plot_inspect.grid(row=3,column=0,sticky='ew')
         self.plot_data.grid(row=4, column=0,sticky='ew')
-        self.plot_delete.grid(row=5,column=0,sticky='ew', pady=(20,0))
+        self.plot_perf.grid(row=5, column=0,sticky='ew')
+        self.plot_delete.grid(row=6,column=0,sticky='ew', pady=(20,0))
+        self.button_abort_plot.grid(row=7,column=0,sticky='ew', pady=(20,0))
+        self.plot_progressbar.grid(row=8,column=0,sticky='ew',pady=(5,0))
+        self.plot_progresstext.grid(row=9,column=0,sticky='nw')
+        self.plot_progressbar.grid_remove()
+        self.plot_progresstext.grid_remove()
+
+    #---SETTINGS VARIABLES
+    #the settings and about tabs are only built when first opened (see
+    #handle_tab_change), but their values are kept here from the start
+        self.settings_built = False
+        self.about_built = False
+        #   general
+        self.date_filter_val = tk.BooleanVar()
+        self.date_filter_val.set(False)
+        self.date_filter_s_hour_val = tk.StringVar()
+        self.date_filter_s_hour_val.set('noon')
+        self.date_filter_e_hour_val = tk.StringVar()
+        self.date_filter_e_hour_val.set('noon')
+        self.nightshade_checkbox_val= tk.BooleanVar()
+        self.nightshade_checkbox_val.set(True)
+        self.nightshade_lightson_val = tk.StringVar()
+        self.nightshade_lightson_val.set('7 am')
+        self.nightshade_lightsoff_val = tk.StringVar()
+        self.nightshade_lightsoff_val.set('7 pm')
+        self.allgroups_val = tk.BooleanVar()
+        self.allgroups_val.set(True)
+        self.abs_groups_val = tk.BooleanVar()
+        self.abs_groups_val.set(True)
+        self.loadduplicates_checkbox_val = tk.BooleanVar()
+        self.loadduplicates_checkbox_val.set(True)
+        self.overwrite_checkbox_val = tk.BooleanVar()
+        self.overwrite_checkbox_val.set(False)
+        self.weirdfed_warning_val = tk.BooleanVar()
+        self.weirdfed_warning_val.set(True)
+        self.img_format_menu_val = tk.StringVar()
+        self.img_format_menu_val.set('.png')
+        #   average
+        self.average_error_menu_val = tk.StringVar()
+        self.average_error_menu_val.set('SEM')
+        self.average_bin_menu_val = tk.StringVar()
+        self.average_bin_menu_val.set('1 hour')
+        self.average_method_menu_val = tk.StringVar()
+        self.average_method_menu_val.set('shared date & time')
+        self.average_alignstart_menu_val = tk.StringVar()
+        self.average_alignstart_menu_val.set('7 am')
+        self.average_aligndays_menu_val = tk.StringVar()
+        self.average_aligndays_menu_val.set(3)
+        #   pellet plot
+        self.pelletplottype_menu_val = tk.StringVar()
+        self.pelletplottype_menu_val.set('Cumulative')
+        self.pelletplotcumu_menu_val = tk.StringVar()
+        self.pelletplotcumu_menu_val.set('1 hour')
+        self.pelletplotcolor_menu_val = tk.StringVar()
+        self.pelletplotcolor_menu_val.set('blue')
+        self.pelletplotalign_checkbox_val = tk.BooleanVar()
+        self.pelletplotalign_checkbox_val.set(False)
+        #   day/night
+        self.daynight_values_val = tk.StringVar()
+        self.daynight_values_val.set('pellets')
+        self.daynight_error_menu_val = tk.StringVar()
+        self.daynight_error_menu_val.set('SEM')
+        self.daynight_show_indvl_val = tk.BooleanVar()
+        self.daynight_show_indvl_val.set(False)
+        self.spiny_resolution_menu_val = tk.StringVar()
+        self.spiny_resolution_menu_val.set(10)
+        #   ipi
+        self.ipi_kde_val = tk.BooleanVar()
+        self.ipi_kde_val.set(True)
+        self.ipi_log_val = tk.BooleanVar()
+        self.ipi_log_val.set(True)
+        #   meals
+        self.norm_meal_val = tk.BooleanVar()
+        self.norm_meal_val.set(True)
+        self.mealdelay_box_val = tk.StringVar()
+        self.mealdelay_box_val.set(1)
+        self.meal_pelletmin_box_val = tk.StringVar()
+        self.meal_pelletmin_box_val.set(1)
+        #   retrieval
+        self.retrieval_threshold_menu_val = tk.StringVar()
+        self.retrieval_threshold_menu_val.set('None')
+        #   poke time
+        self.poketime_cutoff_menu_val = tk.StringVar()
+        self.poketime_cutoff_menu_val.set('None')
+        #   progressive ratio
+        self.pr_style_menu_val = tk.StringVar()
+        self.pr_style_menu_val.set('pellets')
+        self.pr_hours_menu_val = tk.StringVar()
+        self.pr_hours_menu_val.set(1)
+        self.pr_mins_menu_val = tk.StringVar()
+        self.pr_mins_menu_val.set(0)
+        self.pr_error_menu_val = tk.StringVar()
+        self.pr_error_menu_val.set('SEM')
+        self.pr_show_indvl_val = tk.BooleanVar()
+        self.pr_show_indvl_val.set(False)
+        #   poke
+        self.poke_style_menu_val = tk.StringVar()
+        self.poke_style_menu_val.set('Cumulative')
+        self.poke_bins_menu_val = tk.StringVar()
+        self.poke_bins_menu_val.set('1 hour')
+        self.poke_correct_val = tk.BooleanVar()
+        self.poke_correct_val.set(True)
+        self.poke_error_val = tk.BooleanVar()
+        self.poke_error_val.set(True)
+        self.poke_left_val = tk.BooleanVar()
+        self.poke_left_val.set(False)
+        self.poke_right_val = tk.BooleanVar()
+        self.poke_right_val.set(False)
+        self.poke_dynamiccolor_val = tk.BooleanVar()
+        self.poke_dynamiccolor_val.set(True)
+        self.poke_biasstyle_menu_val = tk.StringVar()
+        self.poke_biasstyle_menu_val.set('correct (%)')
+        #   load/save
+        self.settings_lastused_val = tk.BooleanVar()
+        self.settings_lastused_val.set(False)
+        #   dates (held here, shown by DateEntry widgets once built)
+        self.date_filter_s_date = dt.date.today()
+        self.date_filter_e_date = dt.date.today()
+        self.tabcontrol.bind('<<NotebookTabChanged>>', self.handle_tab_change)
+
+    #---LOAD SETTINGS ON START
+    #try to load default settings when the application starts:
+        default=True
+        last_used = 'settings/LAST_USED.csv'
+        if os.path.isfile(last_used):
+            try:
+                settings_df = pd.read_csv(last_used,index_col=0)
+                if settings_df.loc['load_last_used','Values'] == 'True':
+                    del settings_df
+                    self.load_settings(dialog=False,settings_file=[last_used])
+                    default=False
+            except:
+                print("Found 'LAST_USED.CSV' settings file, but couldn't load!")
+
+        if default:
+            default_file = 'settings/DEFAULT.csv'
+            if os.path.isfile(default_file):
+                try:
+                    self.load_settings(dialog=False,settings_file=[default_file])
+                    now = dt.datetime.today().date()
+                    self.set_date_filter_days(now, now)
+                except:
+                    print("Found 'DEFAULT.CSV' settings file, but couldn't load!")
+
+    #---OS CONFIG
+        self.w_offset = 400
+        self.h_offset = 60
+        if platform.system() == 'Darwin':
+            self.plot_treeview.column('#0', width=250)
+            self.plot_listbox.config(width=30)
+            self.w_offset = 350
+            self.h_offset = 100
+            self.r_click = '<Button-2>'
+            for widget in [self.home_tab, self.plot_tab]:
+                self.config_color_mac(widget)
+
+    #---RIGHT CLICK MENUS
+        #file_view_single
+        self.files_spreadsheet.bind(self.r_click, self.r_raise_menu)
+        self.r_menu_file_empty = tkinter.Menu(self, tearoff=0,)
+        self.r_menu_file_empty.add_command(label='Load files',
+                                            command=lambda:self.load_FEDs(skip_duplicates=self.loadduplicates_checkbox_val.get()))
+        self.r_menu_file_empty.add_command(label='Load folder',
+                                            command=lambda:self.load_FEDs(skip_duplicates=self.loadduplicates_checkbox_val.get(),
+                                                                          from_folder=True))
+        self.r_menu_file_empty.add_command(label='Load folder (within date filter)',
+                                            command=lambda:self.load_FEDs(skip_duplicates=self.loadduplicates_checkbox_val.get(),
+                                                                          from_folder=True,
+                                                                          date_range=True))
+        self.r_menu_file_empty.add_command(label='Load experiment store',
+                                            command=self.load_store)
+        self.r_menu_file_empty.add_command(label='Load experiment store (within date filter)',
+                                            command=lambda:self.load_store(date_range=True))
+        self.r_menu_file_empty.add_separator()
+        self.r_menu_file_empty.add_command(label='Query loaded data (SQL)',
+                                            command=self.query_window)
+
+        self.r_menu_file_single = tkinter.Menu(self, tearoff=0,)
+        self.r_menu_file_single.add_command(label='Open file location',command= self.r_open_location,)
+        self.r_menu_file_single.add_command(label='Open file externally', command=self.r_open_externally)
+        self.r_menu_file_single.add_separator()
+        self.r_menu_file_single.add_command(label='Create Group', command=self.create_group)
+        self.r_menu_file_single.add_command(label='Edit Group', command=self.edit_group)
+        self.r_menu_file_single.add_separator()
+        self.r_menu_file_single.add_command(label='Set date filter', command=self.r_set_datefilter_fromfiles)
+        self.r_menu_file_single.add_separator()
+        self.r_menu_file_single.add_command(label='Add to experiment store', command=self.add_to_store)
+        self.r_menu_file_single.add_command(label='Query loaded data (SQL)', command=self.query_window)
+        self.r_menu_file_single.add_separator()
+        self.r_menu_file_single.add_command(label='Delete', command=self.delete_FEDs)
+
+        self.r_menu_file_multi = tkinter.Menu(self, tearoff=0,)
+        self.r_menu_file_multi.add_command(label='Create Group', command=self.create_group)
+        self.r_menu_file_multi.add_command(label='Edit Group', command=self.edit_group)
+        self.r_menu_file_multi.add_separator()
+        self.r_menu_file_multi.add_command(label='Concatenate', command=self.concat_feds)
+        self.r_menu_file_multi.add_separator()
+        self.r_menu_file_multi.add_command(label='Set date filter', command=self.r_set_datefilter_fromfiles)
+        self.r_menu_file_multi.add_command(label='Set date filter (shared window)',
+                                           command=lambda: self.r_set_datefilter_fromfiles(shared=True))
+        self.r_menu_file_multi.add_separator()
+        self.r_menu_file_multi.add_command(label='Add to experiment store', command=self.add_to_store)
+        self.r_menu_file_multi.add_command(label='Query loaded data (SQL)', command=self.query_window)
+        self.r_menu_file_multi.add_separator()
+        self.r_menu_file_multi.add_command(label='Delete', command=self.delete_FEDs)
 
+        self.plot_listbox.bind(self.r_click, self.r_raise_menu)
+        self.r_menu_plot_single = tkinter.Menu(self, tearoff=0,)
+        self.r_menu_plot_single.add_command(label='Load settings used in this graph',command= self.r_load_plot_settings,)
+        self.r_menu_plot_single.add_command(label='Select files used in this graph',command= self.r_select_from_plot,)
+        self.r_menu_plot_single.add_separator()
+        self.r_menu_plot_single.add_command(label='Rename',command= self.rename_plot,)
+        self.r_menu_plot_single.add_command(label='New window',command= self.new_window_plot,)
+        self.r_menu_plot_single.add_command(label='Plot code',command= self.show_plot_code,)
+        self.r_menu_plot_single.add_command(label='Save figure',command= self.save_plots,)
+        self.r_menu_plot_single.add_command(label='Save data',command= self.save_plot_data,)
+        self.r_menu_plot_single.add_separator()
+        self.r_menu_plot_single.add_command(label='Delete',command= self.delete_plot,)
+
+        self.r_menu_plot_multi = tkinter.Menu(self, tearoff=0,)
+        self.r_menu_plot_multi.add_command(label='Plot Code',command= self.show_plot_code,)
+        self.r_menu_plot_multi.add_command(label='Save Figure',command= self.save_plots,)
+        self.r_menu_plot_multi.add_command(label='Save Data',command= self.save_plot_data,)
+        self.r_menu_plot_multi.add_separator()
+        self.r_menu_plot_multi.add_command(label='Delete',command= self.delete_plot,)
+
+    def build_settings_tab(self):
+        from tkcalendar import DateEntry
+        self.settings_built = True
+        times = list(self.times_to_int)
     #---INIT WIDGETS FOR SETTINGS TAB
         #organization frames
         self.settings_tab.grid_rowconfigure(0,weight=1)
@@ -639,8 +932,6 @@ class FED3_Viz(tk.Tk):
 
         #dropdowns/checkboxes
         #   general
-        self.date_filter_val = tk.BooleanVar()
-        self.date_filter_val.set(False)
         self.date_filter_box = ttk.Checkbutton(self.general_settings_frame,
                                                text='Globally filter dates',
                                                var=self.date_filter_val,
@@ -649,96 +940,84 @@ class FED3_Viz(tk.Tk):
                                             width=10)
         self.date_filter_e_days = DateEntry(self.general_settings_frame,
                                             width=10)
+        self.date_filter_s_days.set_date(self.date_filter_s_date)
+        self.date_filter_e_days.set_date(self.date_filter_e_date)
         self.date_filter_s_days.configure(state=tk.DISABLED)
         self.date_filter_e_days.configure(state=tk.DISABLED)
         self.date_filter_s_hour = ttk.Combobox(self.general_settings_frame,
+                                               textvariable=self.date_filter_s_hour_val,
                                                values=times, width=10,
                                                state=tk.DISABLED)
         self.date_filter_e_hour = ttk.Combobox(self.general_settings_frame,
+                                               textvariable=self.date_filter_e_hour_val,
                                                values=times, width=10,
                                                state=tk.DISABLED)
-        self.date_filter_s_hour.set('noon')
-        self.date_filter_e_hour.set('noon')
-        self.nightshade_checkbox_val= tk.BooleanVar()
-        self.nightshade_checkbox_val.set(True)
         self.nightshade_checkbox = ttk.Checkbutton(self.general_settings_frame,
                                                   text='Shade dark periods (lights on/off)',
                                                   var=self.nightshade_checkbox_val,)
         self.nightshade_lightson = ttk.Combobox(self.general_settings_frame,
+                                                textvariable=self.nightshade_lightson_val,
                                                 values=times, width=10)
         self.nightshade_lightsoff = ttk.Combobox(self.general_settings_frame,
+                                                 textvariable=self.nightshade_lightsoff_val,
                                                  values=times, width=10)
-        self.nightshade_lightson.set('7 am')
-        self.nightshade_lightsoff.set('7 pm')
-        self.allgroups_val = tk.BooleanVar()
-        self.allgroups_val.set(True)
         self.allgroups = ttk.Checkbutton(self.general_settings_frame,
                                         text='For plots using groups, include all loaded groups\nrather than those selected',
                                         var=self.allgroups_val,
                                         command=self.update_buttons_home)
-        self.abs_groups_val = tk.BooleanVar()
-        self.abs_groups_val.set(True)
         self.abs_groups_box = ttk.Checkbutton(self.general_settings_frame,
                                               text='When loading groups, check for the absolute path (rather than file name)',
                                               var=self.abs_groups_val)
-        self.loadduplicates_checkbox_val = tk.BooleanVar()
-        self.loadduplicates_checkbox_val.set(True)
         self.loadduplicates_checkbox = ttk.Checkbutton(self.general_settings_frame,
                                                       text='Don\'t load a file if a matching filename is already loaded',
                                                       var=self.loadduplicates_checkbox_val)
-        self.overwrite_checkbox_val = tk.BooleanVar()
-        self.overwrite_checkbox_val.set(False)
         self.overwrite_checkbox = ttk.Checkbutton(self.general_settings_frame,
                                                  text='Overwrite plots & plot data with same name when saving',
                                                  var=self.overwrite_checkbox_val)
-        self.weirdfed_warning_val = tk.BooleanVar()
-        self.weirdfed_warning_val.set(True)
         self.weirdfed_warning = ttk.Checkbutton(self.general_settings_frame,
                                                text='Show missing column warning when loading',
                                                var=self.weirdfed_warning_val)
         self.img_format_menu = ttk.Combobox(self.general_settings_frame,
+                                            textvariable=self.img_format_menu_val,
                                             values=['.png', '.jpg', '.svg', '.pdf', '.tif'])
-        self.img_format_menu.set('.png')
 
         #   average
         self.average_error_menu = ttk.Combobox(self.average_settings_frame,
+                                               textvariable=self.average_error_menu_val,
                                                values=['SEM','STD','raw data','None'],
                                                width=10)
-        self.average_error_menu.set('SEM')
 
         self.average_bin_menu = ttk.Combobox(self.average_settings_frame,
+                                             textvariable=self.average_bin_menu_val,
                                              values=self.freq_bins,
                                              width=10)
-        self.average_bin_menu.set('1 hour')
         self.average_method_menu = ttk.Combobox(self.average_settings_frame,
+                                                textvariable=self.average_method_menu_val,
                                                 values=['shared date & time','shared time', 'elapsed time'],)
-        self.average_method_menu.set('shared date & time')
         self.average_method_menu.bind('<<ComboboxSelected>>', self.check_average_align)
         self.average_alignstart_menu = ttk.Combobox(self.average_settings_frame,
+                                                    textvariable=self.average_alignstart_menu_val,
                                                     values=times,
                                                     width=10,
                                                     state=tk.DISABLED)
-        self.average_alignstart_menu.set('7 am')
         self.average_aligndays_menu = ttk.Combobox(self.average_settings_frame,
+                                                  textvariable=self.average_aligndays_menu_val,
                                                   values=list(range(1,8)),
                                                   width=10,
                                                   state=tk.DISABLED)
-        self.average_aligndays_menu.set(3)
         #   pellet plot
         self.pelletplottype_menu = ttk.Combobox(self.pellet_settings_frame,
+                                                textvariable=self.pelletplottype_menu_val,
                                                 values=['Cumulative',
                                                         'Frequency'])
-        self.pelletplottype_menu.set('Cumulative')
         self.pelletplottype_menu.bind('<<ComboboxSelected>>',self.check_pellet_type)
         self.pelletplotcumu_menu = ttk.Combobox(self.pellet_settings_frame,
+                                                textvariable=self.pelletplotcumu_menu_val,
                                                 values=self.freq_bins,
                                                 state=tk.DISABLED)
-        self.pelletplotcumu_menu.set('1 hour')
         self.pelletplotcolor_menu = ttk.Combobox(self.pellet_settings_frame,
+                                                 textvariable=self.pelletplotcolor_menu_val,
                                                  values=self.colors)
-        self.pelletplotcolor_menu.set('blue')
-        self.pelletplotalign_checkbox_val = tk.BooleanVar()
-        self.pelletplotalign_checkbox_val.set(False)
         self.pelletplotalign_checkbox = ttk.Checkbutton(self.pellet_settings_frame,
                                                        text='Align multi pellet plots to the same start time',
                                                        var=self.pelletplotalign_checkbox_val)
@@ -747,126 +1026,104 @@ class FED3_Viz(tk.Tk):
         dn_options = ['pellets','retrieval time','interpellet intervals',
                       'correct pokes','errors','correct pokes (%)','errors (%)']
         self.daynight_values = ttk.Combobox(self.daynight_settings_frame,
+                                            textvariable=self.daynight_values_val,
                                             values=dn_options)
-        self.daynight_values.set('pellets')
         self.daynight_error_menu = ttk.Combobox(self.daynight_settings_frame,
+                                                textvariable=self.daynight_error_menu_val,
                                                 values=['SEM','STD','None'])
-        self.daynight_error_menu.set('SEM')
-        self.daynight_show_indvl_val = tk.BooleanVar()
-        self.daynight_show_indvl_val.set(False)
         self.daynight_show_indvl = ttk.Checkbutton(self.daynight_settings_frame,
                                                   text='Show individual FED data points',
                                                   var=self.daynight_show_indvl_val)
         self.spiny_resolution_menu = ttk.Combobox(self.daynight_settings_frame,
+                                                  textvariable=self.spiny_resolution_menu_val,
                                                   values=[1, 2, 3, 4, 5, 6, 10, 12, 15, 20, 30, 60])
-        self.spiny_resolution_menu.set(10)
 
         #   ipi
-        self.ipi_kde_val = tk.BooleanVar()
-        self.ipi_kde_val.set(True)
         self.ipi_kde_checkbox = ttk.Checkbutton(self.ipi_settings_frame,
                                                 text='Use kernel density estimation',
                                                 var=self.ipi_kde_val)
-        self.ipi_log_val = tk.BooleanVar()
-        self.ipi_log_val.set(True)
         self.ipi_log_checkbox = ttk.Checkbutton(self.ipi_settings_frame,
                                                 text='Plot on a logarithmic axis',
                                                 var=self.ipi_log_val)
         #   meals
-        self.norm_meal_val = tk.BooleanVar()
-        self.norm_meal_val.set(True)
         self.norm_meal_box = ttk.Checkbutton(self.meal_settings_frame,
                                              var=self.norm_meal_val,
                                              text='Normalize meal histogram counts')
         self.mealdelay_box = ttk.Combobox(self.meal_settings_frame,
+                                          textvariable=self.mealdelay_box_val,
                                           values=[1,2,3,4,5,10,15,30,60],
                                           width=10)
-        self.mealdelay_box.set(1)
         self.meal_pelletmin_box = ttk.Combobox(self.meal_settings_frame,
+                                        textvariable=self.meal_pelletmin_box_val,
                                         values=list(range(1,11)),
                                         width=10)
-        self.meal_pelletmin_box.set(1)
 
         #   retrieval
         self.retrieval_threshold_menu = ttk.Combobox(self.retrieval_settings_frame,
+                                                     textvariable=self.retrieval_threshold_menu_val,
                                                      values=['None',5,10,15,30,
                                                              60,120,300,600],
                                                      width=10)
-        self.retrieval_threshold_menu.set('None')
 
         #   poke time
         self.poketime_cutoff_menu = ttk.Combobox(self.poketime_settings_frame,
+                                                 textvariable=self.poketime_cutoff_menu_val,
                                                  values=['None',1,2,3,4,5,10,20,30],
                                                  width=10)
-        self.poketime_cutoff_menu.set('None')
 
         #   progressive ratio
         self.pr_style_menu = ttk.Combobox(self.pr_settings_frame,
+                                          textvariable=self.pr_style_menu_val,
                                           values=['pellets','pokes'],
                                           width=10)
-        self.pr_style_menu.set('pellets')
         self.pr_hours_menu = ttk.Combobox(self.pr_settings_frame,
+                                          textvariable=self.pr_hours_menu_val,
                                           values=list(range(4)),
                                           width=5)
-        self.pr_hours_menu.set(1)
         self.pr_mins_menu = ttk.Combobox(self.pr_settings_frame,
+                                         textvariable=self.pr_mins_menu_val,
                                          values=[0,15,30,45],
                                          width=5)
-        self.pr_mins_menu.set(0)
         self.pr_error_menu = ttk.Combobox(self.pr_settings_frame,
+                                          textvariable=self.pr_error_menu_val,
                                           values=['SEM','STD','None'],
                                           width=10)
-        self.pr_error_menu.set('SEM')
 
-        self.pr_show_indvl_val = tk.BooleanVar()
-        self.pr_show_indvl_val.set(False)
         self.pr_show_indvl_box = ttk.Checkbutton(self.pr_settings_frame,
                                                  text='Show individual values',
                                                  var=self.pr_show_indvl_val)
 
         #   poke
         self.poke_style_menu = ttk.Combobox(self.poke_settings_frame,
+                                            textvariable=self.poke_style_menu_val,
                                             values=['Cumulative','Frequency',])
-        self.poke_style_menu.set('Cumulative')
         self.poke_bins_menu = ttk.Combobox(self.poke_settings_frame,
+                                           textvariable=self.poke_bins_menu_val,
                                            values=self.freq_bins,
                                            width=10)
-        self.poke_bins_menu.set('1 hour')
-        self.poke_correct_val = tk.BooleanVar()
-        self.poke_correct_val.set(True)
         self.poke_correct_box = ttk.Checkbutton(self.poke_settings_frame,
                                                 text='Show correct pokes',
                                                 var=self.poke_correct_val,
                                                 command=self.update_buttons_home)
-        self.poke_error_val = tk.BooleanVar()
-        self.poke_error_val.set(True)
         self.poke_error_box = ttk.Checkbutton(self.poke_settings_frame,
                                               text='Show incorrect pokes',
                                               var=self.poke_error_val,
                                               command=self.update_buttons_home)
-        self.poke_left_val = tk.BooleanVar()
-        self.poke_left_val.set(False)
         self.poke_left_box = ttk.Checkbutton(self.poke_settings_frame,
                                              text='Show left pokes',
                                              var=self.poke_left_val,
                                              command=self.update_buttons_home)
-        self.poke_right_val = tk.BooleanVar()
-        self.poke_right_val.set(False)
         self.poke_right_box = ttk.Checkbutton(self.poke_settings_frame,
                                              text='Show right pokes',
                                              var=self.poke_right_val,
                                              command=self.update_buttons_home)
-        self.poke_dynamiccolor_val = tk.BooleanVar()
-        self.poke_dynamiccolor_val.set(True)
         self.poke_dynamiccolor_box = ttk.Checkbutton(self.poke_settings_frame,
                                                      text='Use dynamic color for single bias plots',
                                                      var=self.poke_dynamiccolor_val)
         self.poke_biasstyle_menu = ttk.Combobox(self.poke_settings_frame,
+                                                textvariable=self.poke_biasstyle_menu_val,
                                                 values=['correct (%)','left (%)'],)
-        self.poke_biasstyle_menu.set('correct (%)')
         #   load/save
-        self.settings_lastused_val = tk.BooleanVar()
-        self.settings_lastused_val.set(False)
         self.settings_lastused = ttk.Checkbutton(self.load_settings_frame,
                                                 text='Load last used settings when opening',
                                                 var=self.settings_lastused_val)
@@ -976,7 +1233,14 @@ class FED3_Viz(tk.Tk):
         self.settings_load_button.grid(row=1,column=2,sticky='w',ipadx=20,padx=(0,10))
         self.settings_save_button.grid(row=1,column=3,sticky='nw',ipadx=20)
         self.settings_lastused.grid(row=2,column=0,sticky='w',padx=(20,0))
+        self.check_date_filter()
+        self.check_average_align()
+        self.check_pellet_type()
+        if platform.system() == 'Darwin':
+            self.config_color_mac(self.settings_tab)
 
+    def build_about_tab(self):
+        self.about_built = True
     #---INIT WIDGETS FOR ABOUT TAB
         self.graphic_frame = tk.Frame(self.about_tab)
         self.information_frame = tk.Frame(self.about_tab)
@@ -1072,130 +1336,30 @@ class FED3_Viz(tk.Tk):
         self.googlegr1.grid(row=6,column=0,sticky='w')
         self.googlegr2.grid(row=6,column=1,sticky='w')
         # self.caveat.grid(row=1, column=0, pady=40, columnspan=2)
-
-    #---LOAD SETTINGS ON START
-    #try to load default settings when the application starts:
-        default=True
-        last_used = 'settings/LAST_USED.csv'
-        if os.path.isfile(last_used):
-            try:
-                settings_df = pd.read_csv(last_used,index_col=0)
-                if settings_df.loc['load_last_used','Values'] == 'True':
-                    del settings_df
-                    self.load_settings(dialog=False,settings_file=[last_used])
-                    default=False
-            except:
-                print("Found 'LAST_USED.CSV' settings file, but couldn't load!")
-
-        if default:
-            default_file = 'settings/DEFAULT.csv'
-            if os.path.isfile(default_file):
-                try:
-                    self.load_settings(dialog=False,settings_file=[default_file])
-                    now = dt.datetime.today().date()
-                    if str(self.date_filter_s_days.cget('state')) == 'disabled':
-                        self.date_filter_s_days.configure(state=tk.NORMAL)
-                        self.date_filter_s_days.set_date(now)
-                        self.date_filter_s_days.configure(state=tk.DISABLED)
-                    else:
-                        self.date_filter_s_days.set_date(now)
-                    if str(self.date_filter_e_days.cget('state')) == 'disabled':
-                        self.date_filter_e_days.configure(state=tk.NORMAL)
-                        self.date_filter_e_days.set_date(now)
-                        self.date_filter_e_days.configure(state=tk.DISABLED)
-                    else:
-                        self.date_filter_e_days.set_date(now)
-                except:
-                    print("Found 'DEFAULT.CSV' settings file, but couldn't load!")
-
-    #---OS CONFIG
-        self.w_offset = 400
-        self.h_offset = 60
-        def config_color_mac(widget):
-            if type(widget) in [tk.Button, tk.Frame, tk.Label,]:
-                widget.configure(bg=self.mac_color)
-            if type(widget) == tk.Button:
-                widget.configure(highlightbackground=self.mac_color)
-            if widget.grid_slaves():
-                for i in widget.grid_slaves():
-                    config_color_mac(i)
-
         if platform.system() == 'Darwin':
-            self.plot_treeview.column('#0', width=250)
-            self.plot_listbox.config(width=30)
-            self.w_offset = 350
-            self.h_offset = 100
-            self.r_click = '<Button-2>'
-            for widget in [self.home_tab, self.plot_tab,
-                            self.settings_tab, self.about_tab]:
-                config_color_mac(widget)
-
-    #---RIGHT CLICK MENUS
-        #file_view_single
-        self.files_spreadsheet.bind(self.r_click, self.r_raise_menu)
-        self.r_menu_file_empty = tkinter.Menu(self, tearoff=0,)
-        self.r_menu_file_empty.add_command(label='Load files',
-                                            command=lambda:self.load_FEDs(skip_duplicates=self.loadduplicates_checkbox_val.get()))
-        self.r_menu_file_empty.add_command(label='Load folder',
-                                            command=lambda:self.load_FEDs(skip_duplicates=self.loadduplicates_checkbox_val.get(),
-                                                                          from_folder=True))
-
-        self.r_menu_file_single = tkinter.Menu(self, tearoff=0,)
-        self.r_menu_file_single.add_command(label='Open file location',command= self.r_open_location,)
-        self.r_menu_file_single.add_command(label='Open file externally', command=self.r_open_externally)
-        self.r_menu_file_single.add_separator()
-        self.r_menu_file_single.add_command(label='Create Group', command=self.create_group)
-        self.r_menu_file_single.add_command(label='Edit Group', command=self.edit_group)
-        self.r_menu_file_single.add_separator()
-        self.r_menu_file_single.add_command(label='Set date filter', command=self.r_set_datefilter_fromfiles)
-        self.r_menu_file_single.add_separator()
-        self.r_menu_file_single.add_command(label='Delete', command=self.delete_FEDs)
-
-        self.r_menu_file_multi = tkinter.Menu(self, tearoff=0,)
-        self.r_menu_file_multi.add_command(label='Create Group', command=self.create_group)
-        self.r_menu_file_multi.add_command(label='Edit Group', command=self.edit_group)
-        self.r_menu_file_multi.add_separator()
-        self.r_menu_file_multi.add_command(label='Concatenate', command=self.concat_feds)
-        self.r_menu_file_multi.add_separator()
-        self.r_menu_file_multi.add_command(label='Set date filter', command=self.r_set_datefilter_fromfiles)
-        self.r_menu_file_multi.add_separator()
-        self.r_menu_file_multi.add_command(label='Delete', command=self.delete_FEDs)
-
-        self.plot_listbox.bind(self.r_click, self.r_raise_menu)
-        self.r_menu_plot_single = tkinter.Menu(self, tearoff=0,)
-        self.r_menu_plot_single.add_command(label='Load settings used in this graph',command= self.r_load_plot_settings,)
-        self.r_menu_plot_single.add_command(label='Select files used in this graph',command= self.r_select_from_plot,)
-        self.r_menu_plot_single.add_separator()
-        self.r_menu_plot_single.add_command(label='Rename',command= self.rename_plot,)
-        self.r_menu_plot_single.add_command(label='New window',command= self.new_window_plot,)
-        self.r_menu_plot_single.add_command(label='Plot code',command= self.show_plot_code,)
-        self.r_menu_plot_single.add_command(label='Save figure',command= self.save_plots,)
-        self.r_menu_plot_single.add_command(label='Save data',command= self.save_plot_data,)
-        self.r_menu_plot_single.add_separator()
-        self.r_menu_plot_single.add_command(label='Delete',command= self.delete_plot,)
-
-        self.r_menu_plot_multi = tkinter.Menu(self, tearoff=0,)
-        self.r_menu_plot_multi.add_command(label='Plot Code',command= self.show_plot_code,)
-        self.r_menu_plot_multi.add_command(label='Save Figure',command= self.save_plots,)
-        self.r_menu_plot_multi.add_command(label='Save Data',command= self.save_plot_data,)
-        self.r_menu_plot_multi.add_separator()
-        self.r_menu_plot_multi.add_command(label='Delete',command= self.delete_plot,)
+            self.config_color_mac(self.about_tab)
 
     #---HOME TAB BUTTON FUNCTIONS
-    def load_FEDs(self, overwrite=True, skip_duplicates=True, from_folder=False, file_paths=None):
+    def load_FEDs(self, overwrite=True, skip_duplicates=True, from_folder=False,
+                  file_paths=None, date_range=False):
         if file_paths:
             files = file_paths
         else:
             if from_folder:
                 folder = tk.filedialog.askdirectory(title='Select folder to search for FEDs')
-                files = self.walk_filenames(folder)
+                if date_range:
+                    date_range = self.get_date_filter_dates()
+                files = self.walk_filenames(folder, date_range) if folder else []
             else:
                 file_types = [('All', '*.*'),
                               ('Comma-Separated Values', '*.csv'),
-                              ('Excel', '*.xls, *.xslx'),]
+                              ('Excel', '*.xls, *.xslx'),
+                              ('Compressed', '*.gz *.bz2 *.xz *.zst'),
+                              ('Zip archive', '*.zip'),]
                 files = tk.filedialog.askopenfilenames(title='Select FED3 Data',
                                                        filetypes=file_types)
-        loaded_filenames = [fed.basename for fed in self.LOADED_FEDS]
+                #members of zip archives are loaded as separate files
+                files = expand_archives(files)
         pass_FEDs = []
         failed_FEDs = []
         weird_FEDs = []
@@ -1208,20 +1372,33 @@ class FED3_Viz(tk.Tk):
             self.progresstext.grid(row=0,column=1,sticky='nsw')
             if overwrite:
                 self.LOADED_FEDS = []
+                loaded_hashes = set()
+            else:
+                loaded_hashes = set(self.FEDS_BY_HASH)
             for i,file in enumerate(files):
                 file_name = os.path.basename(file)
                 if self.loading:
-                    if skip_duplicates:
-                        if file_name not in loaded_filenames:
-                            try:
-                                pass_FEDs.append(FED3_File(file))
-                            except:
-                                failed_FEDs.append(file_name)
+                    #reading the header is enough to reject non-FED files
+                    try:
+                        rejected = sniff_header(file) == 'reject'
+                    except ImportError as e: #e.g. .zst files without zstandard
+                        rejected = True
+                        file_name += ' (' + str(e) + ')'
+                    if rejected:
+                        failed_FEDs.append(file_name)
                     else:
+                        #the file is read once; duplicates are found by the
+                        #fingerprint taken while reading (and are cheap to
+                        #load, from the parsed-file cache)
                         try:
-                            pass_FEDs.append(FED3_File(file))
+                            fed = FED3_File(file, cache_dir=self.parsed_cache_dir)
                         except:
                             failed_FEDs.append(file_name)
+                            fed = None
+                        if fed is not None and not (skip_duplicates and
+                                                    fed.fingerprint in loaded_hashes):
+                            pass_FEDs.append(fed)
+                            loaded_hashes.add(fed.fingerprint)
                     self.progresstextvar.set(os.path.basename(file)[:50] + '...')
                     self.progressbar.step(1/len(files)*100)
                     self.update()
@@ -1242,31 +1419,77 @@ class FED3_Viz(tk.Tk):
         self.loading=False
 
     def concat_feds(self):
-        selected = self.files_spreadsheet.selection()
-        to_concat = [self.LOADED_FEDS[int(i)] for i in selected]
+        to_concat = self.get_selected_feds()
         if to_concat:
             try:
                 new = fed_concat(to_concat)
-                savepath = tk.filedialog.asksaveasfilename(title='Select where to save new file',
-                                                           defaultextension='.csv',
-                                                           filetypes = [('Comma-Separated Values', '*.csv')])
-                if savepath:
-                    new.to_csv(savepath)
-                    new_FED = FED3_File(savepath)
-                    self.LOADED_FEDS.append(new_FED)
-                    for fed in to_concat:
-                        self.LOADED_FEDS.remove(fed)
-                    self.update_file_view()
-                    self.update_group_view()
-                    self.update_buttons_home()
             except FedCannotConcat:
-                self.raise_fed_concat_error()
+                self.raise_fed_concat_error(to_concat)
+                return
+            #the new file is built in memory; saving it is optional
+            save = tk.messagebox.askyesnocancel('Concatenate',
+                                                'Save the concatenated file to disk?\n'
+                                                '(Choose "No" to only keep it loaded)')
+            if save is None:
                 return
+            if save:
+                savepath = tk.filedialog.asksaveasfilename(title='Select where to save new file',
+                                                           defaultextension='.csv.gz',
+                                                           filetypes = [('Compressed CSV', '*.csv.gz'),
+                                                                        ('Comma-Separated Values', '*.csv')])
+                if not savepath:
+                    return
+                new.to_csv(savepath) #compressed if saved as .csv.gz
+                new_FED = FED3_File.from_dataframe(new, savepath)
+            else:
+                #only in memory: no directory, named after the first file
+                first = min(to_concat, key=lambda x: x.start_time)
+                new_FED = FED3_File.from_dataframe(new, name=first.filename + '_concat')
+            self.LOADED_FEDS.append(new_FED)
+            for fed in to_concat:
+                self.LOADED_FEDS.remove(fed)
+            self.update_file_view()
+            self.update_group_view()
+            self.update_buttons_home()
+
+    def add_to_store(self):
+        feds = self.get_selected_feds()
+        if not feds:
+            return
+        folder = tk.filedialog.askdirectory(title='Select experiment store folder')
+        if not folder:
+            return
+        try:
+            store = ExperimentStore(folder)
+        except (ImportError, ValueError) as e:
+            tk.messagebox.showerror('Experiment store', str(e))
+            return
+        #files already stored only need their groups updated
+        stored = [fed for fed in feds if fed.fingerprint in store.files]
+        store.update_groups(stored)
+        store.add([fed for fed in feds if fed.fingerprint not in store.files])
+
+    def load_store(self, date_range=False):
+        folder = tk.filedialog.askdirectory(title='Select experiment store folder')
+        if not folder:
+            return
+        try:
+            store = ExperimentStore(folder)
+        except (ImportError, ValueError) as e:
+            tk.messagebox.showerror('Experiment store', str(e))
+            return
+        start, end = self.get_date_filter_dates() if date_range else (None, None)
+        new = [fed for fed in store.feds(start=start, end=end)
+               if fed.fingerprint not in self.FEDS_BY_HASH]
+        self.LOADED_FEDS += new
+        self.update_file_view()
+        self.update_group_view()
+        self.update_buttons_home()
 
     def delete_FEDs(self):
-        to_delete = [int(i) for i in self.files_spreadsheet.selection()]
-        for index in sorted(to_delete, reverse=True):
-            del(self.LOADED_FEDS[index])
+        to_delete = set(self.files_spreadsheet.selection())
+        self.LOADED_FEDS = [fed for fed in self.LOADED_FEDS
+                            if self.FED_TO_IID.get(fed) not in to_delete]
         self.update_file_view()
         self.update_group_view()
         self.update_buttons_home(None)
@@ -1311,7 +1534,7 @@ class FED3_Viz(tk.Tk):
             self.update_buttons_home()
 
     def edit_group(self):
-        selected = [int(i) for i in self.files_spreadsheet.selection()]
+        selected = self.files_spreadsheet.selection()
         self.edit_window = tk.Toplevel(self)
         self.edit_window.grab_set()
         if not platform.system() == 'Darwin':
@@ -1338,8 +1561,9 @@ class FED3_Viz(tk.Tk):
         self.edit_listbox.bind('<<ListboxSelect>>', self.check_addremove)
 
     def save_groups(self):
+        #files only in memory (concatenated but not saved) have no path
         group_dict = {fed.directory : fed.group for fed in self.LOADED_FEDS
-                      if fed.group}
+                      if fed.group and fed.directory is not None}
         savepath = tk.filedialog.asksaveasfilename(title='Select where to save group labels',
                                                        defaultextension='.csv',
                                                        filetypes = [('Comma-Separated Values', '*.csv')],
@@ -1357,6 +1581,8 @@ class FED3_Viz(tk.Tk):
         if settings_file:
             df = pd.read_csv(settings_file[0],index_col=0,dtype=str)
             for fed in self.LOADED_FEDS:
+                if fed.directory is None:
+                    continue
                 if self.abs_groups_val.get():
                     lookfor = fed.directory
                 else:
@@ -1401,6 +1627,8 @@ class FED3_Viz(tk.Tk):
         if session_file:
             unjarred = pickle.load(open(session_file[0],'rb'))
             self.LOADED_FEDS = unjarred['feds']
+            for fed in self.LOADED_FEDS: #sessions saved before compacting
+                fed.compact_data()
             self.update_file_view()
             self.update_group_view()
             self.update_all_buttons()
@@ -1466,23 +1694,104 @@ class FED3_Viz(tk.Tk):
             if self.is_plottable(text):
                 if self.plotting:
                     if text in self.plot_nodes_func:
-                        self.clear_axes()
                         plotting_function = self.plot_nodes_func[text]
-                        self.format_polar_axes(text)
                         if plotting_function == self.avg_plot_TK:
                             plotting_function(text)
                         else:
                             plotting_function()
-            self.update()
         if self.failed_date_feds:
             self.raise_date_filter_error()
+        self.start_plot_queue()
+
+    def start_plot_queue(self):
+        if self.PLOT_QUEUE and not self.plot_polling:
+            self.plot_polling = True
+            self.plot_progressbar.grid()
+            self.plot_progresstext.grid()
+            self.button_abort_plot.configure(state=tk.NORMAL)
+            self.check_plot_queue()
+        elif not self.PLOT_QUEUE:
+            self.plotting = False
+
+    def queue_plot(self, basename, plotfunc, datafunc, arguments, x, y):
+        #the plot data are computed, and the plot rendered offscreen, by a
+        #worker thread; the Tk thread only copies the finished image onto
+        #the canvas once it is ready, see check_plot_queue
+        size = self.predict_canvas_size(FED_Plot(basename, plotfunc, arguments,
+                                                 x=x, y=y))
+        future = self.PLOT_POOL.submit(self.build_queued_plot, plotfunc,
+                                       datafunc, arguments, size, self.FIGURE.dpi)
+        self.PLOT_QUEUE.append(dict(basename=basename, plotfunc=plotfunc,
+                                    datafunc=datafunc, arguments=arguments,
+                                    x=x, y=y, future=future))
+        self.plot_jobs_total += 1
+
+    @staticmethod
+    def build_queued_plot(plotfunc, datafunc, arguments, size, dpi):
+        #runs in a worker thread: the GUI axes are left alone
+        offscreen = {k:v for k,v in arguments.items() if k != 'ax'}
+        plotdata = datafunc(**offscreen)
+        if plotdata is None: #no plot, e.g. no overlap for averaging on date & time
+            return None, None
+        image = plots.render_plot(plotfunc, offscreen, *size, dpi=dpi)
+        return plotdata, image
+
+    def check_plot_queue(self):
+        if not self.plotting:
+            for job in self.PLOT_QUEUE:
+                job['future'].cancel()
+            self.PLOT_QUEUE.clear()
+        if self.PLOT_QUEUE and self.PLOT_QUEUE[0]['future'].done():
+            job = self.PLOT_QUEUE.popleft()
+            self.plot_jobs_done += 1
+            self.plot_progresstextvar.set('Plotting {0}/{1}: {2}'.format(
+                self.plot_jobs_done, self.plot_jobs_total, job['basename'][:50]))
+            self.plot_progressbar['value'] = (self.plot_jobs_done /
+                                              self.plot_jobs_total * 100)
+            try:
+                self.draw_queued_plot(job)
+            except Exception:
+                self.report_callback_exception(*sys.exc_info())
+            self.after(1, self.check_plot_queue)
+        elif self.PLOT_QUEUE:
+            self.after(50, self.check_plot_queue)
+        else:
+            self.plotting = False
+            self.plot_polling = False
+            self.plot_jobs_total = 0
+            self.plot_jobs_done = 0
+            self.plot_progressbar.grid_remove()
+            self.plot_progresstext.grid_remove()
+            self.button_abort_plot.configure(state=tk.DISABLED)
+
+    def draw_queued_plot(self, job):
+        plotdata, image = job['future'].result()
+        if image is None: #no plot, e.g. no overlap for averaging on date & time
+            self.raise_average_warning()
+            return
+        plotfunc = job['plotfunc']
+        fig_name = self.create_plot_name(job['basename'])
+        new_plot = FED_Plot(figname=fig_name, plotfunc=plotfunc,
+                            plotdata=plotdata, arguments=job['arguments'],
+                            x=job['x'], y=job['y'])
+        self.resize_plot(new_plot)
+        self.PLOTS[fig_name] = new_plot
+        if self.show_image(fig_name, image):
+            self.cache_image(self.canvas_cache_key(new_plot), image)
+            self.display_plot(new_plot, drawn=False)
+            return
+        #the canvas was not the predicted size: draw here instead
+        #(resizing can swap in a new (polar or cartesian) axes)
+        job['arguments']['ax'] = self.AX
+        output = plotfunc(**job['arguments'])
+        if plotfunc == plots.heatmap_chronogram:
+            self.CB = output
+        self.display_plot(new_plot)
 
     def pellet_plot_single_TK(self):
-        to_plot = [int(i) for i in self.files_spreadsheet.selection()]
-        FEDs_to_plot = [self.LOADED_FEDS[i] for i in to_plot]
+        FEDs_to_plot = self.get_selected_feds()
         for obj in FEDs_to_plot:
             if self.plotting == True:
-                self.clear_axes()
                 arg_dict = self.get_current_settings_as_args()
                 arg_dict['FED'] = obj
                 arg_dict['ax'] = self.AX
@@ -1499,22 +1808,15 @@ class FED3_Viz(tk.Tk):
                                 'Frequency' : 'Frequency pellet plot for ' + obj.filename}
                 plotdata_choices = {'Cumulative': getdata.pellet_plot_single,
                                     'Frequency' : getdata.pellet_freq_single}
-                plotfunc = func_choices[self.pelletplottype_menu.get()]
-                basename = name_choices[self.pelletplottype_menu.get()]
-                plotdata = plotdata_choices[self.pelletplottype_menu.get()](**arg_dict)
-                fig_name = self.create_plot_name(basename)
-                new_plot = FED_Plot(figname=fig_name, plotfunc=plotfunc,
-                                    plotdata=plotdata, arguments=arg_dict,
-                                    x=7,y=3.5)
-                self.PLOTS[fig_name] = new_plot
-                self.resize_plot(new_plot)
-                plotfunc(**arg_dict)
-                self.display_plot(new_plot)
+                plotfunc = func_choices[self.pelletplottype_menu_val.get()]
+                basename = name_choices[self.pelletplottype_menu_val.get()]
+                datafunc = plotdata_choices[self.pelletplottype_menu_val.get()]
+                self.queue_plot(basename, plotfunc, datafunc, arg_dict,
+                                x=7, y=3.5)
 
     def pellet_plot_multi_TK(self):
         arg_dict = self.get_current_settings_as_args()
-        to_plot = [int(i) for i in self.files_spreadsheet.selection()]
-        FEDs_to_plot = [self.LOADED_FEDS[i] for i in to_plot]
+        FEDs_to_plot = self.get_selected_feds()
         if self.date_filter_val.get():
             s,e = self.get_date_filter_dates()
             arg_dict['date_filter'] = (s,e)
@@ -1526,7 +1828,6 @@ class FED3_Viz(tk.Tk):
             return
         arg_dict['FEDs'] = FEDs_to_plot
         arg_dict['ax'] = self.AX
-        fig_name = self.create_plot_name('Multi-FED Pellet Plot')
         multi_plot_choices = {('Cumulative',True) :plots.pellet_plot_multi_aligned,
                               ('Cumulative',False):plots.pellet_plot_multi_unaligned,
                                ('Frequency',True)  :plots.pellet_freq_multi_aligned,
@@ -1535,16 +1836,10 @@ class FED3_Viz(tk.Tk):
                               ('Cumulative',False):getdata.pellet_plot_multi_unaligned,
                                ('Frequency',True)  :getdata.pellet_freq_multi_aligned,
                                ('Frequency',False) :getdata.pellet_freq_multi_unaligned}
-        choice = (self.pelletplottype_menu.get(),self.pelletplotalign_checkbox_val.get())
+        choice = (self.pelletplottype_menu_val.get(),self.pelletplotalign_checkbox_val.get())
         plotfunc = multi_plot_choices[choice]
-        plotdata = plotdata_choices[choice](**arg_dict)
-        new_plot = FED_Plot(figname=fig_name, plotfunc=plotfunc,
-                            arguments=arg_dict, plotdata=plotdata,
-                            x=7,y=3.5)
-        self.PLOTS[fig_name] = new_plot
-        self.resize_plot(new_plot)
-        plotfunc(**arg_dict)
-        self.display_plot(new_plot)
+        self.queue_plot('Multi-FED Pellet Plot', plotfunc,
+                        plotdata_choices[choice], arg_dict, x=7, y=3.5)
 
     def avg_plot_TK(self, plot_name):
         args_dict = self.get_current_settings_as_args()
@@ -1578,34 +1873,23 @@ class FED3_Viz(tk.Tk):
                    'Average Poke Bias Plot (Left %)':'poke bias (left %)',
                    'Average Retrieval Time Plot':'retrieval time'}
         args_dict['dependent'] = choices[plot_name]
-        method = self.average_method_menu.get()
+        method = self.average_method_menu_val.get()
         if method == 'shared time':
             plotfunc=plots.average_plot_ontime
-            plotdata=getdata.average_plot_ontime(**args_dict)
+            datafunc=getdata.average_plot_ontime
         elif method == 'shared date & time':
             plotfunc=plots.average_plot_ondatetime
-            plotdata=getdata.average_plot_ondatetime(**args_dict)
+            datafunc=getdata.average_plot_ondatetime
         elif method == 'elapsed time':
             plotfunc=plots.average_plot_onstart
-            plotdata=getdata.average_plot_onstart(**args_dict)
-        fig = plotfunc(**args_dict)
-        if fig == 'NO_OVERLAP ERROR':
-            self.raise_average_warning()
-            return
-        fig_name = self.create_plot_name('Average Plot of ' + args_dict['dependent'].capitalize())
-        new_plot = FED_Plot(figname=fig_name, plotfunc=plotfunc,
-                            plotdata=plotdata,arguments=args_dict,
-                            x=7,y=3.5)
-        self.PLOTS[fig_name] = new_plot
-        self.resize_plot(new_plot)
-        plotfunc(**args_dict)
-        self.display_plot(new_plot)
+            datafunc=getdata.average_plot_onstart
+        basename = 'Average Plot of ' + args_dict['dependent'].capitalize()
+        self.queue_plot(basename, plotfunc, datafunc, args_dict, x=7, y=3.5)
 
     def interpellet_plot_TK(self):
         arg_dict = self.get_current_settings_as_args()
         arg_dict['ax'] = self.AX
-        to_plot = [int(i) for i in self.files_spreadsheet.selection()]
-        FEDs_to_plot = [self.LOADED_FEDS[i] for i in to_plot]
+        FEDs_to_plot = self.get_selected_feds()
         arg_dict['FEDs'] = FEDs_to_plot
         if self.date_filter_val.get():
             s,e = self.get_date_filter_dates()
@@ -1617,15 +1901,8 @@ class FED3_Viz(tk.Tk):
         if self.failed_date_feds:
             return
         basename = 'Inter-pellet Interval Plot'
-        fig_name = self.create_plot_name(basename)
-        plotdata = getdata.interpellet_interval_plot(**arg_dict)
-        new_plot = FED_Plot(figname=fig_name,plotfunc=plots.interpellet_interval_plot,
-                            plotdata=plotdata,arguments=arg_dict,
-                            x=4, y=5,)
-        self.PLOTS[fig_name] = new_plot
-        self.resize_plot(new_plot)
-        plots.interpellet_interval_plot(**arg_dict)
-        self.display_plot(new_plot)
+        self.queue_plot(basename, plots.interpellet_interval_plot,
+                        getdata.interpellet_interval_plot, arg_dict, x=4, y=5)
 
     def group_ipi_TK(self):
         args_dict = self.get_current_settings_as_args()
@@ -1652,21 +1929,13 @@ class FED3_Viz(tk.Tk):
         if self.failed_date_feds:
             return
         args_dict['ax'] = self.AX
-        plotdata = getdata.group_interpellet_interval_plot(**args_dict)
-        fig_name = self.create_plot_name('Group Interpellet Interval Plot')
-        new_plot = FED_Plot(figname=fig_name, plotfunc=plots.group_interpellet_interval_plot,
-                            arguments=args_dict, plotdata=plotdata,
-                            x=4, y=5)
-        self.PLOTS[fig_name] = new_plot
-        self.resize_plot(new_plot)
-        plots.group_interpellet_interval_plot(**args_dict)
-        self.display_plot(new_plot)
+        self.queue_plot('Group Interpellet Interval Plot', plots.group_interpellet_interval_plot,
+                        getdata.group_interpellet_interval_plot, args_dict, x=4, y=5)
 
     def meal_histo_TK(self):
         arg_dict = self.get_current_settings_as_args()
         arg_dict['ax'] = self.AX
-        to_plot = [int(i) for i in self.files_spreadsheet.selection()]
-        FEDs_to_plot = [self.LOADED_FEDS[i] for i in to_plot]
+        FEDs_to_plot = self.get_selected_feds()
         if self.date_filter_val.get():
             s,e = self.get_date_filter_dates()
             arg_dict['date_filter'] = (s,e)
@@ -1678,15 +1947,8 @@ class FED3_Viz(tk.Tk):
             return
         arg_dict['FEDs'] = FEDs_to_plot
         basename = 'Meal Size Histogram'
-        fig_name = self.create_plot_name(basename)
-        plotdata = getdata.meal_size_histogram(**arg_dict)
-        new_plot = FED_Plot(figname=fig_name,plotfunc=plots.meal_size_histogram,
-                            plotdata=plotdata,arguments=arg_dict,
-                            x=7, y=3.5,)
-        self.PLOTS[fig_name] = new_plot
-        self.resize_plot(new_plot)
-        plots.meal_size_histogram(**arg_dict)
-        self.display_plot(new_plot)
+        self.queue_plot(basename, plots.meal_size_histogram,
+                        getdata.meal_size_histogram, arg_dict, x=7, y=3.5)
 
     def group_meal_histo_TK(self):
         args_dict = self.get_current_settings_as_args()
@@ -1713,15 +1975,8 @@ class FED3_Viz(tk.Tk):
         if self.failed_date_feds:
             return
         args_dict['ax'] = self.AX
-        plotdata = getdata.grouped_meal_size_histogram(**args_dict)
-        fig_name = self.create_plot_name('Group Meal Histogram Plot')
-        new_plot = FED_Plot(figname=fig_name, plotfunc=plots.grouped_meal_size_histogram,
-                            arguments=args_dict, plotdata=plotdata,
-                            x=7, y=3.5)
-        self.PLOTS[fig_name] = new_plot
-        self.resize_plot(new_plot)
-        plots.grouped_meal_size_histogram(**args_dict)
-        self.display_plot(new_plot)
+        self.queue_plot('Group Meal Histogram Plot', plots.grouped_meal_size_histogram,
+                        getdata.grouped_meal_size_histogram, args_dict, x=7, y=3.5)
 
     def daynight_plot_TK(self):
         args_dict = self.get_current_settings_as_args()
@@ -1748,16 +2003,9 @@ class FED3_Viz(tk.Tk):
         if self.failed_date_feds:
             return
         args_dict['ax'] = self.AX
-        plotdata = getdata.daynight_plot(**args_dict)
         value = args_dict['circ_value'].capitalize()
-        fig_name = self.create_plot_name(value + ' Day Night Plot')
-        new_plot = FED_Plot(figname=fig_name, plotfunc=plots.daynight_plot,
-                            arguments=args_dict, plotdata=plotdata,
-                            x=5,y=5)
-        self.PLOTS[fig_name] = new_plot
-        self.resize_plot(new_plot)
-        plots.daynight_plot(**args_dict)
-        self.display_plot(new_plot)
+        self.queue_plot(value + ' Day Night Plot', plots.daynight_plot,
+                        getdata.daynight_plot, args_dict, x=5, y=5)
 
     def chronogram_line_TK(self):
         args_dict = self.get_current_settings_as_args()
@@ -1784,16 +2032,9 @@ class FED3_Viz(tk.Tk):
         if self.failed_date_feds:
             return
         args_dict['ax'] = self.AX
-        plotdata = getdata.line_chronogram(**args_dict)
         value = args_dict['circ_value'].capitalize()
-        fig_name = self.create_plot_name(value + ' Chronogram (Line)')
-        new_plot = FED_Plot(figname=fig_name, plotfunc=plots.line_chronogram,
-                            arguments=args_dict, plotdata=plotdata,
-                            x=7, y=3.5)
-        self.PLOTS[fig_name] = new_plot
-        self.resize_plot(new_plot)
-        plots.line_chronogram(**args_dict)
-        self.display_plot(new_plot)
+        self.queue_plot(value + ' Chronogram (Line)', plots.line_chronogram,
+                        getdata.line_chronogram, args_dict, x=7, y=3.5)
 
     def chronogram_circle_TK(self):
         args_dict = self.get_current_settings_as_args()
@@ -1820,21 +2061,13 @@ class FED3_Viz(tk.Tk):
         if self.failed_date_feds:
             return
         args_dict['ax'] = self.AX
-        plotdata = getdata.circle_chronogram(**args_dict)
         value = args_dict['circ_value'].capitalize()
-        fig_name = self.create_plot_name(value + ' Chronogram (Circle)')
-        new_plot = FED_Plot(figname=fig_name, plotfunc=plots.circle_chronogram,
-                            arguments=args_dict, plotdata=plotdata,
-                            x=7, y=3.5)
-        self.PLOTS[fig_name] = new_plot
-        self.resize_plot(new_plot)
-        plots.circle_chronogram(**args_dict)
-        self.display_plot(new_plot)
+        self.queue_plot(value + ' Chronogram (Circle)', plots.circle_chronogram,
+                        getdata.circle_chronogram, args_dict, x=7, y=3.5)
 
     def chronogram_spiny_TK(self):
         arg_dict = self.get_current_settings_as_args()
-        to_plot = [int(i) for i in self.files_spreadsheet.selection()]
-        FEDs_to_plot = [self.LOADED_FEDS[i] for i in to_plot]
+        FEDs_to_plot = self.get_selected_feds()
         arg_dict['FEDs'] = FEDs_to_plot
         if self.date_filter_val.get():
             s,e = self.get_date_filter_dates()
@@ -1848,20 +2081,12 @@ class FED3_Viz(tk.Tk):
         arg_dict['ax'] = self.AX
         arg_dict['return_cb'] = True
         value = arg_dict['circ_value'].capitalize()
-        fig_name = self.create_plot_name(value + ' Chronogram (Heatmap)')
-        plotdata = getdata.spiny_chronogram(**arg_dict)
-        new_plot = FED_Plot(figname=fig_name, plotfunc=plots.spiny_chronogram,
-                            arguments=arg_dict, plotdata=plotdata,
-                            x=7, y=3.5)
-        self.PLOTS[fig_name] = new_plot
-        self.resize_plot(new_plot)
-        plots.spiny_chronogram(**arg_dict)
-        self.display_plot(new_plot)
+        self.queue_plot(value + ' Chronogram (Heatmap)', plots.spiny_chronogram,
+                        getdata.spiny_chronogram, arg_dict, x=7, y=3.5)
 
     def chronogram_heatmap_TK(self):
         arg_dict = self.get_current_settings_as_args()
-        to_plot = [int(i) for i in self.files_spreadsheet.selection()]
-        FEDs_to_plot = [self.LOADED_FEDS[i] for i in to_plot]
+        FEDs_to_plot = self.get_selected_feds()
         arg_dict['FEDs'] = FEDs_to_plot
         if self.date_filter_val.get():
             s,e = self.get_date_filter_dates()
@@ -1875,21 +2100,13 @@ class FED3_Viz(tk.Tk):
         arg_dict['ax'] = self.AX
         arg_dict['return_cb'] = True
         value = arg_dict['circ_value'].capitalize()
-        fig_name = self.create_plot_name(value + ' Chronogram (Heatmap)')
-        plotdata = getdata.heatmap_chronogram(**arg_dict)
-        new_plot = FED_Plot(figname=fig_name, plotfunc=plots.heatmap_chronogram,
-                            arguments=arg_dict, plotdata=plotdata,
-                            x=7, y=3.5)
-        self.PLOTS[fig_name] = new_plot
-        self.resize_plot(new_plot)
-        self.CB = plots.heatmap_chronogram(**arg_dict)
-        self.display_plot(new_plot)
+        self.queue_plot(value + ' Chronogram (Heatmap)', plots.heatmap_chronogram,
+                        getdata.heatmap_chronogram, arg_dict, x=7, y=3.5)
 
     def dn_ipi_TK(self):
         arg_dict = self.get_current_settings_as_args()
         arg_dict['ax'] = self.AX
-        to_plot = [int(i) for i in self.files_spreadsheet.selection()]
-        FEDs_to_plot = [self.LOADED_FEDS[i] for i in to_plot]
+        FEDs_to_plot = self.get_selected_feds()
         arg_dict['FEDs'] = FEDs_to_plot
         if self.date_filter_val.get():
             s,e = self.get_date_filter_dates()
@@ -1901,22 +2118,13 @@ class FED3_Viz(tk.Tk):
         if self.failed_date_feds:
             return
         basename = 'Day Night Interpellet Interval Plot'
-        fig_name = self.create_plot_name(basename)
-        plotdata = getdata.day_night_ipi_plot(**arg_dict)
-        new_plot = FED_Plot(figname=fig_name,plotfunc=plots.day_night_ipi_plot,
-                            plotdata=plotdata,arguments=arg_dict,
-                            x=4, y=5)
-        self.PLOTS[fig_name] = new_plot
-        self.resize_plot(new_plot)
-        plots.day_night_ipi_plot(**arg_dict)
-        self.display_plot(new_plot)
+        self.queue_plot(basename, plots.day_night_ipi_plot,
+                        getdata.day_night_ipi_plot, arg_dict, x=4, y=5)
 
     def poke_plot_single_TK(self):
-        to_plot = [int(i) for i in self.files_spreadsheet.selection()]
-        FEDs_to_plot = [self.LOADED_FEDS[i] for i in to_plot]
+        FEDs_to_plot = self.get_selected_feds()
         for obj in FEDs_to_plot:
             if self.plotting == True:
-                self.clear_axes()
                 arg_dict = self.get_current_settings_as_args()
                 arg_dict['FED'] = obj
                 if self.date_filter_val.get():
@@ -1927,22 +2135,13 @@ class FED3_Viz(tk.Tk):
                     else:
                         arg_dict['date_filter'] = (s,e)
                 arg_dict['ax'] = self.AX
-                fig_name = self.create_plot_name('Poke plot for ' + obj.filename)
-                plotdata=getdata.poke_plot(**arg_dict)
-                new_plot = FED_Plot(figname=fig_name, plotfunc=plots.poke_plot,
-                                    plotdata=plotdata, arguments=arg_dict,
-                                    x=7,y=3.5)
-                self.PLOTS[fig_name] = new_plot
-                self.resize_plot(new_plot)
-                plots.poke_plot(**arg_dict)
-                self.display_plot(new_plot)
+                self.queue_plot('Poke plot for ' + obj.filename, plots.poke_plot,
+                                getdata.poke_plot, arg_dict, x=7, y=3.5)
 
     def poke_bias_single_TK(self):
-        to_plot = [int(i) for i in self.files_spreadsheet.selection()]
-        FEDs_to_plot = [self.LOADED_FEDS[i] for i in to_plot]
+        FEDs_to_plot = self.get_selected_feds()
         for obj in FEDs_to_plot:
             if self.plotting == True:
-                self.clear_axes()
                 arg_dict = self.get_current_settings_as_args()
                 arg_dict['FED'] = obj
                 if self.date_filter_val.get():
@@ -1953,23 +2152,13 @@ class FED3_Viz(tk.Tk):
                     else:
                         arg_dict['date_filter'] = (s,e)
                 arg_dict['ax'] = self.AX
-                fig_name = self.create_plot_name('Poke bias plot for ' + obj.filename)
-                plotdata=getdata.poke_bias(**arg_dict)
-                new_plot = FED_Plot(figname=fig_name, plotfunc=plots.poke_bias,
-                                    plotdata=plotdata,
-                                    arguments=arg_dict,
-                                    x=7,y=3.5)
-                self.PLOTS[fig_name] = new_plot
-                self.resize_plot(new_plot)
-                plots.poke_bias(**arg_dict)
-                self.display_plot(new_plot)
+                self.queue_plot('Poke bias plot for ' + obj.filename, plots.poke_bias,
+                                getdata.poke_bias, arg_dict, x=7, y=3.5)
 
     def poketime_plot_TK(self):
-        to_plot = [int(i) for i in self.files_spreadsheet.selection()]
-        FEDs_to_plot = [self.LOADED_FEDS[i] for i in to_plot]
+        FEDs_to_plot = self.get_selected_feds()
         for obj in FEDs_to_plot:
             if self.plotting == True:
-                self.clear_axes()
                 arg_dict = self.get_current_settings_as_args()
                 arg_dict['FED'] = obj
                 if self.date_filter_val.get():
@@ -1980,21 +2169,12 @@ class FED3_Viz(tk.Tk):
                     else:
                         arg_dict['date_filter'] = (s,e)
                 arg_dict['ax'] = self.AX
-                fig_name = self.create_plot_name('Poke time plot for ' + obj.filename)
-                plotdata=getdata.poketime_plot(**arg_dict)
-                new_plot = FED_Plot(figname=fig_name, plotfunc=plots.poketime_plot,
-                                    plotdata=plotdata,
-                                    arguments=arg_dict,
-                                    x=7,y=3.5)
-                self.PLOTS[fig_name] = new_plot
-                self.resize_plot(new_plot)
-                plots.poketime_plot(**arg_dict)
-                self.display_plot(new_plot)
+                self.queue_plot('Poke time plot for ' + obj.filename, plots.poketime_plot,
+                                getdata.poketime_plot, arg_dict, x=7, y=3.5)
 
     def breakpoint_plot(self):
         arg_dict = self.get_current_settings_as_args()
-        to_plot = [int(i) for i in self.files_spreadsheet.selection()]
-        FEDs_to_plot = [self.LOADED_FEDS[i] for i in to_plot]
+        FEDs_to_plot = self.get_selected_feds()
         arg_dict['FEDs'] = FEDs_to_plot
         if self.date_filter_val.get():
             s,e = self.get_date_filter_dates()
@@ -2006,16 +2186,9 @@ class FED3_Viz(tk.Tk):
         if self.failed_date_feds:
             return
         arg_dict['ax'] = self.AX
-        fig_name = self.create_plot_name('Breakpoint Plot')
-        plotdata = getdata.pr_plot(**arg_dict)
         fig_len = min([max([len(FEDs_to_plot), 4]), 8])
-        new_plot = FED_Plot(figname=fig_name, plotfunc=plots.pr_plot,
-                            arguments=arg_dict, plotdata=plotdata,
-                            x=fig_len, y=5)
-        self.PLOTS[fig_name] = new_plot
-        self.resize_plot(new_plot)
-        plots.pr_plot(**arg_dict)
-        self.display_plot(new_plot)
+        self.queue_plot('Breakpoint Plot', plots.pr_plot,
+                        getdata.pr_plot, arg_dict, x=fig_len, y=5)
 
     def group_breakpoint_plot(self):
         args_dict = self.get_current_settings_as_args()
@@ -2042,22 +2215,13 @@ class FED3_Viz(tk.Tk):
         if self.failed_date_feds:
             return
         args_dict['ax'] = self.AX
-        plotdata = getdata.group_pr_plot(**args_dict)
-        fig_name = self.create_plot_name('Group Breakpoint Plot')
-        new_plot = FED_Plot(figname=fig_name, plotfunc=plots.group_pr_plot,
-                            arguments=args_dict, plotdata=plotdata,
-                            x=3.5,y=5)
-        self.PLOTS[fig_name] = new_plot
-        self.resize_plot(new_plot)
-        plots.group_pr_plot(**args_dict)
-        self.display_plot(new_plot)
+        self.queue_plot('Group Breakpoint Plot', plots.group_pr_plot,
+                        getdata.group_pr_plot, args_dict, x=3.5, y=5)
 
     def retrieval_plot_TK(self):
-        to_plot = [int(i) for i in self.files_spreadsheet.selection()]
-        FEDs_to_plot = [self.LOADED_FEDS[i] for i in to_plot]
+        FEDs_to_plot = self.get_selected_feds()
         for obj in FEDs_to_plot:
             if self.plotting == True:
-                self.clear_axes()
                 arg_dict = self.get_current_settings_as_args()
                 arg_dict['FED'] = obj
                 arg_dict['ax'] = self.AX
@@ -2068,20 +2232,12 @@ class FED3_Viz(tk.Tk):
                         continue
                     else:
                         arg_dict['date_filter'] = (s,e)
-                plotdata = getdata.retrieval_time_single(**arg_dict)
-                fig_name = self.create_plot_name('Retrieval Time Plot for ' + obj.filename)
-                new_plot = FED_Plot(figname=fig_name, plotfunc=plots.retrieval_time_single,
-                                    plotdata=plotdata, arguments=arg_dict,
-                                    x=7,y=3.5)
-                self.PLOTS[fig_name] = new_plot
-                self.resize_plot(new_plot)
-                plots.retrieval_time_single(**arg_dict)
-                self.display_plot(new_plot)
+                self.queue_plot('Retrieval Time Plot for ' + obj.filename, plots.retrieval_time_single,
+                                getdata.retrieval_time_single, arg_dict, x=7, y=3.5)
 
     def retrieval_plot_multi_TK(self):
         arg_dict = self.get_current_settings_as_args()
-        to_plot = [int(i) for i in self.files_spreadsheet.selection()]
-        FEDs_to_plot = [self.LOADED_FEDS[i] for i in to_plot]
+        FEDs_to_plot = self.get_selected_feds()
         if self.date_filter_val.get():
             s,e = self.get_date_filter_dates()
             arg_dict['date_filter'] = (s,e)
@@ -2093,23 +2249,14 @@ class FED3_Viz(tk.Tk):
             return
         arg_dict['FEDs'] = FEDs_to_plot
         arg_dict['ax'] = self.AX
-        fig_name = self.create_plot_name('Multi Retrieval Time Plot')
         plotfunc = plots.retrieval_time_multi
-        plotdata = getdata.retrieval_time_multi(**arg_dict)
-        new_plot = FED_Plot(figname=fig_name, plotfunc=plotfunc,
-                            arguments=arg_dict, plotdata=plotdata,
-                            x=7, y=3.5)
-        self.PLOTS[fig_name] = new_plot
-        self.resize_plot(new_plot)
-        plotfunc(**arg_dict)
-        self.display_plot(new_plot)
+        self.queue_plot('Multi Retrieval Time Plot', plotfunc,
+                        getdata.retrieval_time_multi, arg_dict, x=7, y=3.5)
 
     def battery_life_TK(self):
-        to_plot = [int(i) for i in self.files_spreadsheet.selection()]
-        FEDs_to_plot = [self.LOADED_FEDS[i] for i in to_plot]
+        FEDs_to_plot = self.get_selected_feds()
         for obj in FEDs_to_plot:
             if self.plotting == True:
-                self.clear_axes()
                 arg_dict = self.get_current_settings_as_args()
                 arg_dict['FED'] = obj
                 if self.date_filter_val.get():
@@ -2121,22 +2268,13 @@ class FED3_Viz(tk.Tk):
                         arg_dict['date_filter'] = (s,e)
                 arg_dict['ax'] = self.AX
                 plotfunc = plots.battery_plot
-                fig_name = self.create_plot_name('Battery Life for ' + obj.filename)
-                plotdata = getdata.battery_plot(**arg_dict)
-                new_plot = FED_Plot(figname=fig_name, plotfunc=plotfunc,
-                                    plotdata=plotdata, arguments=arg_dict,
-                                    x=7, y=3.5)
-                self.PLOTS[fig_name] = new_plot
-                self.resize_plot(new_plot)
-                plotfunc(**arg_dict)
-                self.display_plot(new_plot)
+                self.queue_plot('Battery Life for ' + obj.filename, plotfunc,
+                                getdata.battery_plot, arg_dict, x=7, y=3.5)
 
     def motor_turns_TK(self):
-        to_plot = [int(i) for i in self.files_spreadsheet.selection()]
-        FEDs_to_plot = [self.LOADED_FEDS[i] for i in to_plot]
+        FEDs_to_plot = self.get_selected_feds()
         for obj in FEDs_to_plot:
             if self.plotting == True:
-                self.clear_axes()
                 arg_dict = self.get_current_settings_as_args()
                 arg_dict['FED'] = obj
                 if self.date_filter_val.get():
@@ -2148,29 +2286,94 @@ class FED3_Viz(tk.Tk):
                         arg_dict['date_filter'] = (s,e)
                 arg_dict['ax'] = self.AX
                 plotfunc = plots.motor_plot
-                fig_name = self.create_plot_name('Motor Turns for ' + obj.filename)
-                plotdata = getdata.motor_plot(**arg_dict)
-                new_plot = FED_Plot(figname=fig_name, plotfunc=plotfunc,
-                                    plotdata=plotdata, arguments=arg_dict,
-                                    x=7, y=3.5)
-                self.PLOTS[fig_name] = new_plot
-                self.resize_plot(new_plot)
-                plotfunc(**arg_dict)
-                self.display_plot(new_plot)
+                self.queue_plot('Motor Turns for ' + obj.filename, plotfunc,
+                                getdata.motor_plot, arg_dict, x=7, y=3.5)
 
     #---HOME HELPER FUNCTIONS
     def update_file_view(self):
-        self.files_spreadsheet.delete(*self.files_spreadsheet.get_children())
-        for i,fed in enumerate(self.LOADED_FEDS):
-            if fed.missing_columns:
-                tag = emoji.emojize(':warning:')
-            else:
-                tag = ''
-            values = (tag, fed.basename, fed.mode, fed.events,
-                      fed.start_time.strftime('%b %d %Y, %H:%M'),
-                      fed.end_time.strftime('%b %d %Y, %H:%M'),
-                      str(fed.duration), ', '.join(fed.group))
-            self.files_spreadsheet.insert('', i, str(i), values=values)
+        #rows are keyed by a stable iid for each FED3_File (not its position),
+        #so only rows which were added, removed, changed or moved are touched
+        view = self.files_spreadsheet
+        wanted = []
+        for fed in self.LOADED_FEDS:
+            if fed not in self.FED_TO_IID:
+                self.fed_iid_counter += 1
+                iid = 'fed' + str(self.fed_iid_counter)
+                self.FED_TO_IID[fed] = iid
+                self.IID_TO_FED[iid] = fed
+                self.index_fed(fed)
+            wanted.append(self.FED_TO_IID[fed])
+        wanted_set = set(wanted)
+        gone = [iid for iid in self.IID_TO_FED if iid not in wanted_set]
+        view.delete(*[iid for iid in gone if iid in self.FED_ROWS])
+        for iid in gone:
+            fed = self.IID_TO_FED.pop(iid)
+            del self.FED_TO_IID[fed]
+            self.unindex_fed(fed)
+            self.FED_ROWS.pop(iid, None)
+            self.FED_MEMORY.pop(iid, None)
+        for iid in wanted:
+            if iid not in self.FED_MEMORY:
+                self.FED_MEMORY[iid] = self.IID_TO_FED[iid].memory_usage()
+            values = self.file_view_values(self.IID_TO_FED[iid])
+            if iid not in self.FED_ROWS:
+                view.insert('', 'end', iid, values=values)
+            elif self.FED_ROWS[iid] != values:
+                view.item(iid, values=values)
+            self.FED_ROWS[iid] = values
+        if list(view.get_children()) != wanted:
+            for i, iid in enumerate(wanted):
+                view.move(iid, '', i)
+        total = sum(self.FED_MEMORY.get(iid, 0) for iid in wanted)
+        view.heading('Memory', text='Memory (' + self.format_memory(total) + ' total)')
+
+    def file_view_values(self, fed):
+        if fed.missing_columns:
+            import emoji
+            tag = emoji.emojize(':warning:')
+        else:
+            tag = ''
+        return (tag, fed.basename, fed.mode, fed.events,
+                fed.start_time.strftime('%b %d %Y, %H:%M'),
+                fed.end_time.strftime('%b %d %Y, %H:%M'),
+                str(fed.duration), ', '.join(fed.group),
+                self.format_memory(self.FED_MEMORY[self.FED_TO_IID[fed]]))
+
+    def format_memory(self, nbytes):
+        for unit in ['B', 'KB', 'MB']:
+            if nbytes < 1024:
+                return '{:.1f} {}'.format(nbytes, unit)
+            nbytes /= 1024
+        return '{:.1f} GB'.format(nbytes)
+
+    def index_fed(self, fed):
+        #sessions saved before fingerprinting have FEDs without one
+        fingerprint = getattr(fed, 'fingerprint', None)
+        if fingerprint:
+            self.FEDS_BY_HASH[fingerprint] = fed
+        if fed.directory is not None:
+            self.FEDS_BY_PATH[fed.directory] = fed
+
+    def unindex_fed(self, fed):
+        fingerprint = getattr(fed, 'fingerprint', None)
+        if self.FEDS_BY_HASH.get(fingerprint) is fed:
+            del self.FEDS_BY_HASH[fingerprint]
+        if fed.directory is not None and self.FEDS_BY_PATH.get(fed.directory) is fed:
+            del self.FEDS_BY_PATH[fed.directory]
+
+    def find_loaded_fed(self, fed):
+        #the loaded object itself, or the loaded file with the same contents
+        if fed in self.FED_TO_IID:
+            return fed
+        fingerprint = getattr(fed, 'fingerprint', None)
+        if fingerprint in self.FEDS_BY_HASH:
+            return self.FEDS_BY_HASH[fingerprint]
+        return self.FEDS_BY_PATH.get(fed.directory)
+
+    def get_selected_feds(self):
+        selected = set(self.files_spreadsheet.selection())
+        return [fed for fed in self.LOADED_FEDS
+                if self.FED_TO_IID.get(fed) in selected]
 
     def update_group_view(self):
         self.GROUPS = list(set([name for fed in self.LOADED_FEDS for name in fed.group]))
@@ -2179,17 +2382,14 @@ class FED3_Viz(tk.Tk):
         for group in self.GROUPS:
             self.group_view.insert(tk.END,group)
 
-    def walk_filenames(self, folder):
-        output = []
-        dirs = os.walk(folder)
-        for directory in dirs:
-            dirname = directory[0]
-            filelist = directory[-1]
-            if filelist:
-                for file in filelist:
-                    path_to_file = os.path.join(dirname, file)
-                    output.append(path_to_file)
-        return output
+    def walk_filenames(self, folder, date_range=None):
+        #the index only re-lists changed directories and re-sniffs changed
+        #files, and leaves out files whose header isn't FED3 data
+        if self.folder_index is None:
+            self.folder_index = FolderIndex(self.folder_index_path)
+        self.folder_index.rescan(folder)
+        start, end = date_range if date_range else (None, None)
+        return self.folder_index.files(folder, start=start, end=end)
 
     def hover_text_one(self, event):
         widget = event.widget
@@ -2214,22 +2414,9 @@ class FED3_Viz(tk.Tk):
         if where_clicked == 'heading':
             column = self.files_spreadsheet.identify_column(event.x)
             column_name = self.files_spreadsheet.column(column)['id']
-            if column_name == "Name":
-                self.LOADED_FEDS.sort(key=lambda x:x.basename, reverse=reverse)
-            if column_name == "Mode":
-                self.LOADED_FEDS.sort(key=lambda x:x.mode, reverse=reverse)
-            if column_name == "Start Time":
-                self.LOADED_FEDS.sort(key=lambda x:x.start_time, reverse=reverse)
-            if column_name == "End Time":
-                self.LOADED_FEDS.sort(key=lambda x:x.end_time, reverse=reverse)
-            if column_name == "# Events":
-                self.LOADED_FEDS.sort(key=lambda x:x.events, reverse=reverse)
-            if column_name == "Duration":
-                self.LOADED_FEDS.sort(key=lambda x:x.duration, reverse=reverse)
-            if column_name == "Groups":
-                self.LOADED_FEDS.sort(key=lambda x:len(x.group), reverse=reverse)
-            if column_name == '':
-                self.LOADED_FEDS.sort(key=lambda x:len(x.missing_columns), reverse=reverse)
+            if column_name in self.fed_sort_keys:
+                self.LOADED_FEDS.sort(key=self.fed_sort_keys[column_name],
+                                      reverse=reverse)
             self.update_file_view()
 
     def is_plottable(self, plot_name):
@@ -2243,8 +2430,7 @@ class FED3_Viz(tk.Tk):
             if self.files_spreadsheet.selection():
                 plottable = True
                 if plot_name == 'Breakpoint Plot':
-                    selected = [self.LOADED_FEDS[int(i)]
-                                for i in self.files_spreadsheet.selection()]
+                    selected = self.get_selected_feds()
                     if not all(f.mode == 'PR' for f in selected):
                         plottable = False
             else:
@@ -2353,8 +2539,7 @@ class FED3_Viz(tk.Tk):
 
     def create_okay(self):
         group_name = self.create_name.get()
-        selected = self.files_spreadsheet.selection()
-        FEDs_to_add = [self.LOADED_FEDS[int(i)] for i in selected]
+        FEDs_to_add = self.get_selected_feds()
         for fed in FEDs_to_add:
             fed.group.append(group_name)
         self.update_file_view()
@@ -2380,9 +2565,9 @@ class FED3_Viz(tk.Tk):
             to_raise = []
             for ind in clicked:
                 group = self.GROUPS[ind]
-                for i,fed in enumerate(self.LOADED_FEDS):
+                for fed in self.LOADED_FEDS:
                     if group in fed.group:
-                        to_raise.append(i)
+                        to_raise.append(self.FED_TO_IID[fed])
             to_raise = list(set(to_raise))
             self.files_spreadsheet.selection_set(to_raise)
         self.update_buttons_home(None)
@@ -2401,8 +2586,7 @@ class FED3_Viz(tk.Tk):
         self.update_buttons_home()
 
     def select_all_FEDs(self, *event):
-        items = len(self.LOADED_FEDS)
-        self.files_spreadsheet.selection_set(list(range(items)))
+        self.files_spreadsheet.selection_set(self.files_spreadsheet.get_children())
         self.update_all_buttons()
 
     def escape(self, *event):
@@ -2426,13 +2610,12 @@ class FED3_Viz(tk.Tk):
 
     def handle_edit(self, todo):
         selected_groups = self.edit_listbox.curselection()
-        selected_feds = [int(i) for i in self.files_spreadsheet.selection()]
+        selected_feds = self.get_selected_feds()
         groups = []
         for i in selected_groups:
             groups.append(self.edit_listbox.get(i))
         for group in groups:
-            for i in selected_feds:
-                fed = self.LOADED_FEDS[i]
+            for fed in selected_feds:
                 if todo == 'add':
                     if group not in fed.group:
                         fed.group.append(group)
@@ -2450,10 +2633,10 @@ class FED3_Viz(tk.Tk):
 
     def stats_proceed(self):
         time = dt.datetime.now().strftime('%m%d%y_%H%M%S')
-        mini = int(self.meal_pelletmin_box.get())
-        delay = int(self.mealdelay_box.get())
+        mini = int(self.meal_pelletmin_box_val.get())
+        delay = int(self.mealdelay_box_val.get())
         if self.stats_radio_var.get() == 'from_feds':
-            feds = [self.LOADED_FEDS[int(i)] for i in self.files_spreadsheet.selection()]
+            feds = self.get_selected_feds()
             results = plots.fed_summary(feds, meal_pellet_minimum=mini,
                                         meal_duration=delay)
             savepath = tk.filedialog.askdirectory(title='Select where to save stats')
@@ -2466,11 +2649,16 @@ class FED3_Viz(tk.Tk):
                 groups = [self.GROUPS[int(i)] for i in self.group_view.curselection()]
             elif self.stats_radio_var.get() == 'all_groups':
                 groups = self.GROUPS
+            #each file is summarized once, even if it is in several groups
+            feds = [fed for fed in self.LOADED_FEDS
+                    if any(group in fed.group for group in groups)]
+            metrics = plots.summary_metrics(feds, meal_pellet_minimum=mini,
+                                            meal_duration=delay)
+            metrics = dict(zip(feds, metrics))
             results = OrderedDict()
             for group in groups:
-                feds = [fed for fed in self.LOADED_FEDS if group in fed.group]
-                results[group] = plots.fed_summary(feds, meal_pellet_minimum=mini,
-                                                   meal_duration=delay)
+                results[group] = plots.summary_table([metrics[fed] for fed in feds
+                                                      if group in fed.group])
             savepath = tk.filedialog.askdirectory(title='Select where to save stats')
             if savepath:
                 name = 'FED Stats ' + time
@@ -2480,6 +2668,122 @@ class FED3_Viz(tk.Tk):
                     result.to_csv(os.path.join(dirname, group) + '.csv')
         self.stat_window.destroy()
 
+    def query_window(self):
+        lights_on = self.times_to_int[self.nightshade_lightson_val.get()]
+        lights_off = self.times_to_int[self.nightshade_lightsoff_val.get()]
+        self.query_feds = list(self.LOADED_FEDS)
+        self.query_settings = dict(lights_on=lights_on, lights_off=lights_off)
+        self.query_db = None
+        self.query_result = None
+        self.query_sql = None
+        self.query_files_read = 0
+        def file_read(fed):
+            self.query_files_read += 1
+        #the database is built by a worker thread, see check_query_database
+        future = self.PLOT_POOL.submit(FedDatabase, self.query_feds,
+                                       callback=file_read, **self.query_settings)
+        window = tk.Toplevel(self)
+        window.title('Query loaded data (SQL)')
+        if not platform.system() == 'Darwin':
+            window.iconbitmap('img/python.ico')
+        schema = tk.Label(window, text=SCHEMA_HELP, justify=tk.LEFT,
+                          font=('Courier', 9))
+        self.query_text = tk.Text(window, height=6, width=100)
+        self.query_text.insert(tk.END, EXAMPLE_QUERY)
+        self.query_run_button = tk.Button(window, text='Run', command=self.run_query,
+                                          state=tk.DISABLED)
+        save_button = tk.Button(window, text='Save results',
+                                command=self.save_query_results)
+        plot_button = tk.Button(window, text='Add to plots',
+                                command=self.plot_query_result)
+        self.query_status = tk.StringVar()
+        status = tk.Label(window, textvariable=self.query_status)
+        self.query_view = ttk.Treeview(window, show='headings', height=15)
+        xscroll = ttk.Scrollbar(window, orient='horizontal',
+                                command=self.query_view.xview)
+        yscroll = ttk.Scrollbar(window, command=self.query_view.yview)
+        self.query_view.configure(xscrollcommand=xscroll.set,
+                                  yscrollcommand=yscroll.set)
+        schema.grid(row=0,column=0,columnspan=3,sticky='w',padx=10,pady=(10,5))
+        self.query_text.grid(row=1,column=0,columnspan=3,sticky='nsew',padx=10)
+        self.query_run_button.grid(row=2,column=0,sticky='w',padx=10,pady=5)
+        status.grid(row=2,column=1,sticky='w')
+        plot_button.grid(row=2,column=2,sticky='e',padx=(10,0))
+        save_button.grid(row=2,column=3,sticky='e',padx=10)
+        self.query_view.grid(row=3,column=0,columnspan=3,sticky='nsew',padx=(10,0))
+        yscroll.grid(row=3,column=3,sticky='nsw')
+        xscroll.grid(row=4,column=0,columnspan=3,sticky='ew',padx=(10,0),pady=(0,10))
+        window.grid_rowconfigure(3,weight=1)
+        window.grid_columnconfigure(1,weight=1)
+        def close_database(future):
+            if not future.cancelled() and future.exception() is None:
+                future.result().close()
+        def close():
+            #the database is closed once built (now, if it already is)
+            future.add_done_callback(close_database)
+            window.destroy()
+        window.protocol("WM_DELETE_WINDOW", close)
+        self.check_query_database(window, future)
+
+    def check_query_database(self, window, future):
+        if not window.winfo_exists():
+            return
+        if not future.done():
+            self.query_status.set('Reading files: {0}/{1}'.format(self.query_files_read,
+                                                                  len(self.query_feds)))
+            self.after(100, self.check_query_database, window, future)
+            return
+        if future.exception() is not None:
+            self.query_status.set('Error: ' + str(future.exception()))
+            return
+        self.query_db = future.result()
+        self.query_status.set('Ready ({0} files)'.format(len(self.query_feds)))
+        self.query_run_button.configure(state=tk.NORMAL)
+
+    def run_query(self):
+        sql = self.query_text.get('1.0', tk.END)
+        try:
+            result = self.query_db.query(sql)
+        except Exception as e:
+            self.query_status.set('Error: ' + str(e))
+            return
+        self.query_result = result
+        self.query_sql = sql.strip()
+        self.query_view.delete(*self.query_view.get_children())
+        self.query_view['columns'] = list(range(len(result.columns)))
+        for i, column in enumerate(result.columns):
+            self.query_view.heading(i, text=column)
+            self.query_view.column(i, width=120, stretch=False)
+        shown = result.head(1000)
+        for row in shown.itertuples(index=False):
+            self.query_view.insert('', tk.END, values=list(row))
+        text = str(len(result)) + ' rows'
+        if len(result) > len(shown):
+            text += ' (showing the first ' + str(len(shown)) + ')'
+        self.query_status.set(text)
+
+    def save_query_results(self):
+        if self.query_result is None:
+            return
+        savepath = tk.filedialog.askdirectory(title='Select where to save the query results')
+        if savepath:
+            name = 'Query ' + dt.datetime.now().strftime('%m%d%y_%H%M%S')
+            full_save = self.create_file_name(savepath, name, ext='.csv',
+                                              overwrite=self.overwrite_checkbox_val.get())
+            self.query_result.to_csv(full_save, index=False)
+
+    def plot_query_result(self):
+        #shown as a table in the plot list, so its data can also be saved
+        #with the other plots' (see save_plot_data)
+        if self.query_result is None:
+            return
+        arguments = dict(FEDs=self.query_feds, sql=self.query_sql,
+                         result=self.query_result, ax=self.AX, **self.query_settings)
+        self.plotting = True
+        self.queue_plot('Query', plots.query_table, getdata.query_table,
+                        arguments, x=7, y=3.5)
+        self.start_plot_queue()
+
     #---PLOT TAB BUTTON FUNCTIONS
     def rename_plot(self):
         clicked = self.plot_listbox.curselection()[0]
@@ -2523,11 +2827,13 @@ class FED3_Viz(tk.Tk):
             selection=self.plot_listbox.get(i)
             self.plot_listbox.delete(i)
             del(self.PLOTS[selection])
+            self.uncache_plot(selection)
             new_plot_index=self.plot_listbox.size()-1
         if new_plot_index>=0 and raise_plots:
             new_plot=self.plot_listbox.get(new_plot_index)
             self.raise_figure(new_plot, new=False)
         else:
+            self.image_shown = None
             self.clear_axes()
             self.canvas.draw_idle()
             self.nav_toolbar.update()
@@ -2598,29 +2904,45 @@ class FED3_Viz(tk.Tk):
 
     def save_plots(self):
         clicked=self.plot_listbox.curselection()
-        ext = self.img_format_menu.get()
+        ext = self.img_format_menu_val.get()
         if clicked:
             savepath = tk.filedialog.askdirectory(title='Select where to save highlighted plots')
             if savepath:
+                overwrite = self.overwrite_checkbox_val.get()
+                jobs = []
                 for i in clicked:
                     graph_name=self.plot_listbox.get(i)
-                    if len(clicked) > 1:
-                        self.raise_figure(graph_name, new=False)
-                    save_name = graph_name+ext
-                    full_save = os.path.join(savepath,save_name)
-                    if not self.overwrite_checkbox_val.get():
-                        c=1
-                        while os.path.exists(full_save):
-                            save_name = graph_name +  ' (' + str(c) + ')' + ext
-                            full_save = os.path.join(savepath,save_name)
-                            c+=1
-                    self.FIGURE.savefig(full_save,dpi=300)
-                    self.FIGURE.set_dpi(150)
-                    self.canvas.draw_idle()
-                    self.nav_toolbar.update()
-                    self.update()
+                    plot = self.PLOTS[graph_name]
+                    full_save = self.create_file_name(savepath, graph_name,
+                                                      ext, overwrite)
+                    #the GUI axes is not needed (or picklable) offscreen
+                    args = {k:v for k,v in plot.arguments.items() if k != 'ax'}
+                    jobs.append((plot.plotfunc, args, full_save, plot.x, plot.y))
+                if len(jobs) == 1:
+                    plots.export_plot(*jobs[0])
+                    return
+                #each plot is rendered into its own figure in a worker
+                #process, leaving the figure on screen untouched
+                workers = min(len(jobs), os.cpu_count() or 1)
+                pool = ProcessPoolExecutor(max_workers=workers,
+                                           mp_context=multiprocessing.get_context('spawn'))
+                futures = [pool.submit(plots.export_plot, *job) for job in jobs]
+                pool.shutdown(wait=False)
+                self.plot_save.configure(state=tk.DISABLED)
+                self.check_save_plots(futures)
+
+    def check_save_plots(self, futures):
+        if not all(future.done() for future in futures):
+            self.after(100, self.check_save_plots, futures)
+            return
+        self.update_buttons_plot()
+        for future in futures:
+            e = future.exception()
+            if e is not None:
+                self.report_callback_exception(type(e), e, e.__traceback__)
 
     def show_plot_code(self):
+        from fed_inspect import fed_inspect
         clicked = self.plot_listbox.curselection()
         for i in clicked:
             plotname = self.plot_listbox.get(i)
@@ -2676,28 +2998,93 @@ class FED3_Viz(tk.Tk):
                         df.to_csv(full_save)
 
     #---PLOT HELPER FUNCTIONS
-    def display_plot(self, plot_obj, new=True):
+    def display_plot(self, plot_obj, new=True, drawn=True):
+        #drawn is False when the plot is only shown as an image (see show_image)
         self.update()
-        self.canvas.draw_idle()
-        self.nav_toolbar.update()
-        if new:
-            if self.on_display_func == 'heatmap_chronogram':
+        if drawn:
+            if new and self.on_display_func == 'heatmap_chronogram':
                 self.clear_axes()
                 self.format_polar_axes(plot_obj.plotfunc)
                 self.recall_plotfunc(plot_obj)
+            self.draw_canvas()
+        self.nav_toolbar.update()
+        if new:
             self.plot_listbox.insert(tk.END,plot_obj.figname)
             self.plot_listbox.selection_clear(0,self.plot_listbox.size())
             self.plot_listbox.selection_set(self.plot_listbox.size()-1)
         self.update_buttons_plot()
         self.update()
         self.tabcontrol.select(self.plot_tab)
+        self.on_display_func = plot_obj.plotfunc.__name__ if drawn else None
+
+    def predict_canvas_size(self, plot_obj):
+        #size of the canvas once the window is resized for plot_obj, from
+        #earlier plots of the same size or the size of the rest of the window
+        geometry = (plot_obj.x_pix, plot_obj.y_pix)
+        if geometry in self.canvas_sizes:
+            return self.canvas_sizes[geometry]
+        widget = self.canvas.get_tk_widget()
+        return (plot_obj.x_pix - (self.winfo_width() - widget.winfo_width()),
+                plot_obj.y_pix - (self.winfo_height() - widget.winfo_height()))
+
+    def show_image(self, fig_name, image):
+        #copies a rendered plot onto the canvas, leaving the axes empty until
+        #they are needed (see draw_shown_image); False if the sizes differ
+        buffer = np.asarray(self.canvas.get_renderer().buffer_rgba())
+        if image is None or buffer.shape != image.shape:
+            return False
+        buffer[...] = image
+        self.canvas.blit()
+        self.AX.set_navigate(False)
+        self.image_shown = fig_name
+        return True
+
+    def draw_shown_image(self, *event):
+        #the user is interacting with (or resizing) a plot shown as an image:
+        #draw it on the axes so that zooming, etc. work
+        fig_name = self.image_shown
+        self.image_shown = None
+        if fig_name not in self.PLOTS:
+            return
+        plot_obj = self.PLOTS[fig_name]
+        self.clear_axes()
+        self.format_polar_axes(plot_obj.plotfunc)
+        output = self.recall_plotfunc(plot_obj)
+        if plot_obj.plotfunc == plots.heatmap_chronogram:
+            self.CB = output
         self.on_display_func = plot_obj.plotfunc.__name__
+        self.draw_canvas()
+
+    def draw_canvas(self):
+        #draws the figure now (not when idle) so the draw can be timed
+        with perf.span('draw', 'render'):
+            self.canvas.draw()
 
     def raise_figure(self, fig_name, new=True):
+        plot_obj = self.PLOTS[fig_name]
+        if not new:
+            self.resize_plot(plot_obj)
+            key = self.canvas_cache_key(plot_obj)
+            if key in self.CANVAS_CACHE:
+                #show the cached pixels; the axes are only drawn if the user
+                #zooms, resizes, etc. (see draw_shown_image)
+                self.CANVAS_CACHE.move_to_end(key)
+                if self.show_image(fig_name, self.CANVAS_CACHE[key]):
+                    self.on_display_func = None
+                    plot_index = list(self.PLOTS).index(fig_name)
+                    self.plot_listbox.selection_clear(0,self.plot_listbox.size())
+                    self.plot_listbox.selection_set(plot_index)
+                    self.update_all_buttons()
+                    return
+        self.render_figure(fig_name, new, resized=not new)
+
+    def render_figure(self, fig_name, new=True, resized=False):
+        #resized is True when raise_figure already called resize_plot
         plot_obj = self.PLOTS[fig_name]
         if platform.system() == 'Windows':
             self.plot_cover.grid()
-        self.resize_plot(plot_obj)
+        if not resized:
+            self.resize_plot(plot_obj)
         if plot_obj.plotfunc.__name__ == 'heatmap_chronogram':
             self.CB = self.recall_plotfunc(plot_obj)
         else:
@@ -2707,6 +3094,9 @@ class FED3_Viz(tk.Tk):
                 self.clear_axes()
                 self.format_polar_axes(plot_obj.plotfunc)
                 self.recall_plotfunc(plot_obj)
+        if not new:
+            #the next draw of the canvas is the finished plot
+            self.canvas_cache_target = self.canvas_cache_key(plot_obj)
         self.display_plot(plot_obj, new)
         if platform.system() == 'Windows':
             self.plot_cover.grid_remove()
@@ -2715,6 +3105,43 @@ class FED3_Viz(tk.Tk):
         self.plot_listbox.selection_set(plot_index)
         self.update_all_buttons()
 
+    def canvas_cache_key(self, plot_obj):
+        #FED3_Files are keyed by content (so a reloaded file hits the cache)
+        #and by their groups (so editing groups changes group plots)
+        def key_repr(v):
+            if isinstance(v, FED3_File):
+                return repr((getattr(v, 'fingerprint', v.directory),
+                             sorted(getattr(v, 'group', []))))
+            if isinstance(v, list):
+                return repr([key_repr(i) for i in v])
+            return repr(v)
+        settings = repr(sorted((k, key_repr(v)) for k, v in
+                               plot_obj.arguments.items() if k != 'ax'))
+        w, h = self.canvas.get_width_height()
+        return (plot_obj.figname, w, h, settings)
+
+    def cache_canvas(self, event):
+        key = self.canvas_cache_target
+        self.canvas_cache_target = None
+        if key is None or key[1:3] != self.canvas.get_width_height():
+            return
+        self.cache_image(key, np.array(self.canvas.buffer_rgba()))
+
+    def cache_image(self, key, image):
+        #rendered plots (RGBA arrays) by canvas_cache_key, least recently
+        #shown first, within canvas_cache_budget bytes
+        if key in self.CANVAS_CACHE:
+            self.canvas_cache_bytes -= self.CANVAS_CACHE.pop(key).nbytes
+        self.CANVAS_CACHE[key] = image
+        self.canvas_cache_bytes += image.nbytes
+        while self.canvas_cache_bytes > self.canvas_cache_budget:
+            _, old = self.CANVAS_CACHE.popitem(last=False)
+            self.canvas_cache_bytes -= old.nbytes
+
+    def uncache_plot(self, fig_name):
+        for key in [k for k in self.CANVAS_CACHE if k[0] == fig_name]:
+            self.canvas_cache_bytes -= self.CANVAS_CACHE.pop(key).nbytes
+
     def raise_figure_from_listbox(self, event):
         clicked=self.plot_listbox.curselection()
         if len(clicked) == 1:
@@ -2766,6 +3193,7 @@ class FED3_Viz(tk.Tk):
 
     def rename_okay(self):
         new_name = self.rename_var.get()
+        self.uncache_plot(self.old_name)
         self.PLOTS = OrderedDict([(new_name,v) if k == self.old_name
                                  else (k,v) for k,v in
                                  self.PLOTS.items()])
@@ -2785,6 +3213,113 @@ class FED3_Viz(tk.Tk):
             self.warning_var.set('')
             self.ok_button.configure(state=tk.NORMAL)
 
+    def performance_window(self):
+        if self.perf_window is not None and self.perf_window.winfo_exists():
+            self.perf_window.lift()
+            self.refresh_performance()
+            return
+        perf.recording = True
+        window = self.perf_window = tk.Toplevel(self)
+        window.title('Performance')
+        if not platform.system() == 'Darwin':
+            window.iconbitmap('img/graph_icon.ico')
+        buttons = tk.Frame(window)
+        self.perf_record_val = tk.BooleanVar()
+        self.perf_record_val.set(perf.recording)
+        record = tk.Checkbutton(buttons, text='Record', variable=self.perf_record_val,
+                                command=self.toggle_perf_recording)
+        refresh = tk.Button(buttons, text='Refresh', command=self.refresh_performance)
+        clear = tk.Button(buttons, text='Clear', command=self.clear_performance)
+        export_json = tk.Button(buttons, text='Export JSON',
+                                command=lambda: self.export_performance('json'))
+        export_trace = tk.Button(buttons, text='Export Chrome trace',
+                                 command=lambda: self.export_performance('trace'))
+        self.perf_totals_var = tk.StringVar()
+        totals = tk.Label(window, textvariable=self.perf_totals_var,
+                          justify=tk.LEFT, anchor='w')
+        columns = ['Category', 'Total (ms)', 'Self (ms)', 'Memory (MB)', 'Thread']
+        self.perf_view = ttk.Treeview(window, columns=columns, height=20)
+        self.perf_view.heading('#0', text='Span')
+        self.perf_view.column('#0', width=300)
+        for column in columns:
+            self.perf_view.heading(column, text=column)
+            self.perf_view.column(column, width=90, anchor='e')
+        self.perf_view.bind('<<TreeviewSelect>>', self.show_performance_totals)
+        scrollbar = ttk.Scrollbar(window, command=self.perf_view.yview)
+        self.perf_view.configure(yscrollcommand=scrollbar.set)
+        for i, widget in enumerate([record, refresh, clear, export_json, export_trace]):
+            widget.grid(row=0, column=i, sticky='w', padx=(0,5))
+        buttons.grid(row=0, column=0, sticky='w', padx=10, pady=(10,5))
+        self.perf_view.grid(row=1, column=0, sticky='nsew', padx=(10,0))
+        scrollbar.grid(row=1, column=1, sticky='nsw')
+        totals.grid(row=2, column=0, sticky='w', padx=10, pady=(5,10))
+        window.grid_rowconfigure(1, weight=1)
+        window.grid_columnconfigure(0, weight=1)
+        self.refresh_performance()
+
+    def refresh_performance(self):
+        spans = list(perf.SPANS)
+        by_id = {s.id : s for s in spans}
+        children = {}
+        for s in spans:
+            parent = s.parent if s.parent in by_id else None
+            children.setdefault(parent, []).append(s)
+        self.perf_view.delete(*self.perf_view.get_children())
+        def insert(s, parent_iid):
+            memory = '' if s.rss_delta is None else '{:+.1f}'.format(s.rss_delta / 2**20)
+            iid = self.perf_view.insert(parent_iid, tk.END, iid=str(s.id), text=s.name,
+                                        values=[s.category,
+                                                '{:.1f}'.format(s.duration * 1000),
+                                                '{:.1f}'.format(s.self_time * 1000),
+                                                memory, s.thread])
+            for child in sorted(children.get(s.id, []), key=lambda c: c.start):
+                insert(child, iid)
+        #most recent first; the oldest are dropped from the ring buffer
+        for s in sorted(children.get(None, []), key=lambda r: r.start, reverse=True)[:200]:
+            insert(s, '')
+        self.perf_spans = (by_id, children)
+        self.show_performance_totals()
+
+    def show_performance_totals(self, *event):
+        by_id, children = self.perf_spans
+        selected = [by_id[int(iid)] for iid in self.perf_view.selection()
+                    if int(iid) in by_id]
+        if selected:
+            spans, stack = {}, list(selected)
+            while stack:
+                s = stack.pop()
+                if s.id not in spans:
+                    spans[s.id] = s
+                    stack += children.get(s.id, [])
+            spans = list(spans.values())
+            label = 'Self time of the selected spans: '
+        else:
+            spans = list(by_id.values())
+            label = 'Self time of all spans: '
+        totals = perf.category_totals(spans)
+        order = perf.CATEGORIES + sorted(set(totals) - set(perf.CATEGORIES))
+        self.perf_totals_var.set(label + ', '.join('{} {:.2f}s'.format(c, totals[c])
+                                                   for c in order if c in totals))
+
+    def toggle_perf_recording(self):
+        perf.recording = self.perf_record_val.get()
+
+    def clear_performance(self):
+        perf.clear()
+        self.refresh_performance()
+
+    def export_performance(self, kind):
+        filetypes = ([('JSON', '*.json')] if kind == 'json' else
+                     [('Chrome trace (JSON)', '*.json')])
+        savepath = tk.filedialog.asksaveasfilename(title='Select where to save the timings',
+                                                   defaultextension='.json',
+                                                   filetypes=filetypes)
+        if savepath:
+            if kind == 'json':
+                perf.export_json(savepath)
+            else:
+                perf.export_chrome_trace(savepath)
+
     def save_code(self, plotname, text):
         savepath = tk.filedialog.asksaveasfilename(title='Select where to save code',
                                                    defaultextension='.py',
@@ -2804,6 +3339,7 @@ class FED3_Viz(tk.Tk):
             ax.clear()
             if ax != self.AX:
                 ax.remove()
+        self.AX.set_navigate(True)
 
     def format_polar_axes(self, plotfunc):
         if callable(plotfunc):
@@ -2820,11 +3356,15 @@ class FED3_Viz(tk.Tk):
             self.POLAR = False
 
     def resize_plot(self, plot_obj):
+        self.image_shown = None
         self.tabcontrol.select(self.plot_tab)
         self.clear_axes()
         self.format_polar_axes(plot_obj.plotfunc)
         self.geometry('{0}x{1}'.format(plot_obj.x_pix, plot_obj.y_pix))
         self.update()
+        widget = self.canvas.get_tk_widget()
+        self.canvas_sizes[(plot_obj.x_pix, plot_obj.y_pix)] = (widget.winfo_width(),
+                                                              widget.winfo_height())
 
     def recall_plotfunc(self, plotobj):
         func = plotobj.plotfunc
@@ -2833,7 +3373,9 @@ class FED3_Viz(tk.Tk):
 
     #---SETTINGS TAB FUNCTIONS
     def check_pellet_type(self, *event):
-        if self.pelletplottype_menu.get() == 'Frequency':
+        if not self.settings_built:
+            return
+        if self.pelletplottype_menu_val.get() == 'Frequency':
             self.pelletplotcumu_label.configure(fg='black')
             self.pelletplotcumu_menu.configure(state=tk.NORMAL)
         else:
@@ -2841,7 +3383,9 @@ class FED3_Viz(tk.Tk):
             self.pelletplotcumu_menu.configure(state=tk.DISABLED)
 
     def check_average_align(self, *event):
-        if self.average_method_menu.get() == 'shared time':
+        if not self.settings_built:
+            return
+        if self.average_method_menu_val.get() == 'shared time':
             self.average_align_ontime_label.configure(fg='black')
             self.average_alignstart_menu.configure(state=tk.NORMAL)
             self.average_aligndays_menu.configure(state=tk.NORMAL)
@@ -2851,6 +3395,8 @@ class FED3_Viz(tk.Tk):
             self.average_aligndays_menu.configure(state=tk.DISABLED)
 
     def check_date_filter(self, *event):
+        if not self.settings_built:
+            return
         if self.date_filter_val.get():
             self.date_filter_days_label.configure(fg='black')
             self.date_filter_hours_label.configure(fg='black')
@@ -2903,61 +3449,50 @@ class FED3_Viz(tk.Tk):
             if now is not None:
                 s = now
                 e = now
-            if str(self.date_filter_s_days.cget('state')) == 'disabled':
-                self.date_filter_s_days.configure(state=tk.NORMAL)
-                self.date_filter_s_days.set_date(s)
-                self.date_filter_s_days.configure(state=tk.DISABLED)
-            else:
-                self.date_filter_s_days.set_date(s)
-            if str(self.date_filter_e_days.cget('state')) == 'disabled':
-                self.date_filter_e_days.configure(state=tk.NORMAL)
-                self.date_filter_e_days.set_date(e)
-                self.date_filter_e_days.configure(state=tk.DISABLED)
-            else:
-                self.date_filter_e_days.set_date(e)
-            self.date_filter_s_hour.set(settings_df.loc['date_filter_s_hour','Values'])
-            self.date_filter_e_hour.set(settings_df.loc['date_filter_e_hour','Values'])
-            self.img_format_menu.set(settings_df.loc['img_format','Values'])
+            self.set_date_filter_days(s, e)
+            self.date_filter_s_hour_val.set(settings_df.loc['date_filter_s_hour','Values'])
+            self.date_filter_e_hour_val.set(settings_df.loc['date_filter_e_hour','Values'])
+            self.img_format_menu_val.set(settings_df.loc['img_format','Values'])
             self.nightshade_checkbox_val.set(settings_df.loc['shade_dark','Values'])
-            self.nightshade_lightson.set(settings_df.loc['lights_on','Values'])
-            self.nightshade_lightsoff.set(settings_df.loc['lights_off','Values'])
+            self.nightshade_lightson_val.set(settings_df.loc['lights_on','Values'])
+            self.nightshade_lightsoff_val.set(settings_df.loc['lights_off','Values'])
             self.abs_groups_val.set(settings_df.loc['abs_group','Values'])
             self.allgroups_val.set(settings_df.loc['allgroups','Values'])
             self.loadduplicates_checkbox_val.set(settings_df.loc['skip_duplicates','Values'])
             self.overwrite_checkbox_val.set(settings_df.loc['overwrite','Values'])
             self.weirdfed_warning_val.set(settings_df.loc['weirdwarn','Values'])
-            self.pelletplottype_menu.set(settings_df.loc['pellet_values','Values'])
-            self.pelletplotcumu_menu.set(settings_df.loc['pellet_bins','Values'])
-            self.pelletplotcolor_menu.set(settings_df.loc['pellet_color','Values']),
+            self.pelletplottype_menu_val.set(settings_df.loc['pellet_values','Values'])
+            self.pelletplotcumu_menu_val.set(settings_df.loc['pellet_bins','Values'])
+            self.pelletplotcolor_menu_val.set(settings_df.loc['pellet_color','Values']),
             self.pelletplotalign_checkbox_val.set(settings_df.loc['pellet_align','Values'])
-            self.average_error_menu.set(settings_df.loc['average_error','Values'])
-            self.average_bin_menu.set(settings_df.loc['average_bins','Values'])
-            self.average_method_menu.set(settings_df.loc['average_method','Values'])
-            self.average_alignstart_menu.set(settings_df.loc['average_align_start','Values'])
-            self.average_aligndays_menu.set(settings_df.loc['average_align_days','Values'])
-            self.daynight_values.set(settings_df.loc['circ_value','Values'])
-            self.daynight_error_menu.set(settings_df.loc['circ_error','Values'])
+            self.average_error_menu_val.set(settings_df.loc['average_error','Values'])
+            self.average_bin_menu_val.set(settings_df.loc['average_bins','Values'])
+            self.average_method_menu_val.set(settings_df.loc['average_method','Values'])
+            self.average_alignstart_menu_val.set(settings_df.loc['average_align_start','Values'])
+            self.average_aligndays_menu_val.set(settings_df.loc['average_align_days','Values'])
+            self.daynight_values_val.set(settings_df.loc['circ_value','Values'])
+            self.daynight_error_menu_val.set(settings_df.loc['circ_error','Values'])
             self.daynight_show_indvl_val.set(settings_df.loc['circ_show_indvl','Values'])
-            self.spiny_resolution_menu.set(settings_df.loc['resolution','Values'])
+            self.spiny_resolution_menu_val.set(settings_df.loc['resolution','Values'])
             self.ipi_kde_val.set(settings_df.loc['kde','Values'])
             self.ipi_log_val.set(settings_df.loc['logx','Values'])
             self.norm_meal_val.set(settings_df.loc['norm_meals','Values'])
-            self.meal_pelletmin_box.set(settings_df.loc['meal_pellet_minimum','Values'])
-            self.mealdelay_box.set(settings_df.loc['meal_duration','Values'])
-            self.retrieval_threshold_menu.set(settings_df.loc['retrieval_threshold','Values'])
-            self.poketime_cutoff_menu.set(settings_df.loc['poketime_cutoff','Values'])
-            self.pr_style_menu.set(settings_df.loc['break_style','Values'])
-            self.pr_hours_menu.set(settings_df.loc['break_hours','Values'])
-            self.pr_mins_menu.set(settings_df.loc['break_mins','Values'])
-            self.pr_error_menu.set(settings_df.loc['break_error','Values'])
+            self.meal_pelletmin_box_val.set(settings_df.loc['meal_pellet_minimum','Values'])
+            self.mealdelay_box_val.set(settings_df.loc['meal_duration','Values'])
+            self.retrieval_threshold_menu_val.set(settings_df.loc['retrieval_threshold','Values'])
+            self.poketime_cutoff_menu_val.set(settings_df.loc['poketime_cutoff','Values'])
+            self.pr_style_menu_val.set(settings_df.loc['break_style','Values'])
+            self.pr_hours_menu_val.set(settings_df.loc['break_hours','Values'])
+            self.pr_mins_menu_val.set(settings_df.loc['break_mins','Values'])
+            self.pr_error_menu_val.set(settings_df.loc['break_error','Values'])
             self.pr_show_indvl_val.set(settings_df.loc['break_show_indvl','Values'])
-            self.poke_style_menu.set(settings_df.loc['poke_style','Values'])
-            self.poke_bins_menu.set(settings_df.loc['poke_bins','Values'])
+            self.poke_style_menu_val.set(settings_df.loc['poke_style','Values'])
+            self.poke_bins_menu_val.set(settings_df.loc['poke_bins','Values'])
             self.poke_correct_val.set(settings_df.loc['poke_show_correct','Values'])
             self.poke_error_val.set(settings_df.loc['poke_show_error','Values'])
             self.poke_left_val.set(settings_df.loc['poke_show_left','Values'])
             self.poke_right_val.set(settings_df.loc['poke_show_right','Values'])
-            self.poke_biasstyle_menu.set(settings_df.loc['bias_style','Values'])
+            self.poke_biasstyle_menu_val.set(settings_df.loc['bias_style','Values'])
             self.poke_dynamiccolor_val.set(settings_df.loc['dynamic_color','Values'])
             self.settings_lastused_val.set(settings_df.loc['load_last_used','Values'])
             self.check_average_align()
@@ -2967,52 +3502,52 @@ class FED3_Viz(tk.Tk):
     #---SETTINGS HELPER FUNCTIONS
     def get_current_settings(self):
         settings_dict = dict(date_filter_val    =self.date_filter_val.get(),
-                             date_filter_s_days =self.date_filter_s_days.get_date(),
-                             date_filter_e_days =self.date_filter_e_days.get_date(),
-                             date_filter_s_hour =self.date_filter_s_hour.get(),
-                             date_filter_e_hour =self.date_filter_e_hour.get(),
-                             img_format         =self.img_format_menu.get(),
+                             date_filter_s_days =self.get_date_filter_days()[0],
+                             date_filter_e_days =self.get_date_filter_days()[1],
+                             date_filter_s_hour =self.date_filter_s_hour_val.get(),
+                             date_filter_e_hour =self.date_filter_e_hour_val.get(),
+                             img_format         =self.img_format_menu_val.get(),
                              shade_dark         =self.nightshade_checkbox_val.get(),
-                             lights_on          =self.nightshade_lightson.get(),
-                             lights_off         =self.nightshade_lightsoff.get(),
+                             lights_on          =self.nightshade_lightson_val.get(),
+                             lights_off         =self.nightshade_lightsoff_val.get(),
                              allgroups          =self.allgroups_val.get(),
                              abs_group          =self.abs_groups_val.get(),
                              skip_duplicates    =self.loadduplicates_checkbox_val.get(),
                              overwrite          =self.overwrite_checkbox_val.get(),
                              weirdwarn          =self.weirdfed_warning_val.get(),
-                             pellet_values      =self.pelletplottype_menu.get(),
-                             pellet_bins        =self.pelletplotcumu_menu.get(),
-                             pellet_color       =self.pelletplotcolor_menu.get(),
+                             pellet_values      =self.pelletplottype_menu_val.get(),
+                             pellet_bins        =self.pelletplotcumu_menu_val.get(),
+                             pellet_color       =self.pelletplotcolor_menu_val.get(),
                              pellet_align       =self.pelletplotalign_checkbox_val.get(),
-                             average_error      =self.average_error_menu.get(),
-                             average_bins       =self.average_bin_menu.get(),
+                             average_error      =self.average_error_menu_val.get(),
+                             average_bins       =self.average_bin_menu_val.get(),
                              load_last_used     =self.settings_lastused_val.get(),
-                             average_method     =self.average_method_menu.get(),
-                             average_align_start=self.average_alignstart_menu.get(),
-                             average_align_days =self.average_aligndays_menu.get(),
-                             circ_value         =self.daynight_values.get(),
-                             circ_error         =self.daynight_error_menu.get(),
+                             average_method     =self.average_method_menu_val.get(),
+                             average_align_start=self.average_alignstart_menu_val.get(),
+                             average_align_days =self.average_aligndays_menu_val.get(),
+                             circ_value         =self.daynight_values_val.get(),
+                             circ_error         =self.daynight_error_menu_val.get(),
                              circ_show_indvl    =self.daynight_show_indvl_val.get(),
-                             resolution         =self.spiny_resolution_menu.get(),
+                             resolution         =self.spiny_resolution_menu_val.get(),
                              kde                =self.ipi_kde_val.get(),
                              logx               =self.ipi_log_val.get(),
                              norm_meals         =self.norm_meal_val.get(),
-                             meal_pellet_minimum=self.meal_pelletmin_box.get(),
-                             meal_duration      =self.mealdelay_box.get(),
-                             retrieval_threshold=self.retrieval_threshold_menu.get(),
-                             poketime_cutoff    =self.poketime_cutoff_menu.get(),
-                             poke_style         =self.poke_style_menu.get(),
-                             poke_bins          =self.poke_bins_menu.get(),
+                             meal_pellet_minimum=self.meal_pelletmin_box_val.get(),
+                             meal_duration      =self.mealdelay_box_val.get(),
+                             retrieval_threshold=self.retrieval_threshold_menu_val.get(),
+                             poketime_cutoff    =self.poketime_cutoff_menu_val.get(),
+                             poke_style         =self.poke_style_menu_val.get(),
+                             poke_bins          =self.poke_bins_menu_val.get(),
                              poke_show_correct  =self.poke_correct_val.get(),
                              poke_show_error    =self.poke_error_val.get(),
                              poke_show_left     =self.poke_left_val.get(),
                              poke_show_right    =self.poke_right_val.get(),
-                             bias_style         =self.poke_biasstyle_menu.get(),
+                             bias_style         =self.poke_biasstyle_menu_val.get(),
                              dynamic_color      =self.poke_dynamiccolor_val.get(),
-                             break_style        =self.pr_style_menu.get(),
-                             break_hours        =self.pr_hours_menu.get(),
-                             break_mins         =self.pr_mins_menu.get(),
-                             break_error        =self.pr_error_menu.get(),
+                             break_style        =self.pr_style_menu_val.get(),
+                             break_hours        =self.pr_hours_menu_val.get(),
+                             break_mins         =self.pr_mins_menu_val.get(),
+                             break_error        =self.pr_error_menu_val.get(),
                              break_show_indvl   =self.pr_show_indvl_val.get())
         return settings_dict
 
@@ -3056,16 +3591,51 @@ class FED3_Viz(tk.Tk):
         self.settings_canvas.configure(scrollregion=self.settings_canvas.bbox("all"),)
 
     def get_date_filter_dates(self):
-        start_date = self.date_filter_s_days.get_date()
-        start_hour = self.date_filter_s_hour.get()
+        start_date, end_date = self.get_date_filter_days()
+        start_hour = self.date_filter_s_hour_val.get()
         start_hour = self.times_to_int[start_hour]
         start_stamp = dt.datetime.combine(start_date, dt.time(hour=start_hour))
-        end_date = self.date_filter_e_days.get_date()
-        end_hour = self.date_filter_e_hour.get()
+        end_hour = self.date_filter_e_hour_val.get()
         end_hour = self.times_to_int[end_hour]
         end_stamp = dt.datetime.combine(end_date, dt.time(hour=end_hour))
         return start_stamp, end_stamp
 
+    def get_date_filter_days(self):
+        if self.settings_built:
+            self.date_filter_s_date = self.date_filter_s_days.get_date()
+            self.date_filter_e_date = self.date_filter_e_days.get_date()
+        return self.date_filter_s_date, self.date_filter_e_date
+
+    def set_date_filter_days(self, s, e):
+        self.date_filter_s_date = pd.Timestamp(s).date()
+        self.date_filter_e_date = pd.Timestamp(e).date()
+        if not self.settings_built:
+            return
+        for widget, date in [(self.date_filter_s_days, self.date_filter_s_date),
+                             (self.date_filter_e_days, self.date_filter_e_date)]:
+            if str(widget.cget('state')) == 'disabled':
+                widget.configure(state=tk.NORMAL)
+                widget.set_date(date)
+                widget.configure(state=tk.DISABLED)
+            else:
+                widget.set_date(date)
+
+    def handle_tab_change(self, event):
+        tab = self.tabcontrol.nametowidget(self.tabcontrol.select())
+        if tab == self.settings_tab and not self.settings_built:
+            self.build_settings_tab()
+        elif tab == self.about_tab and not self.about_built:
+            self.build_about_tab()
+
+    def config_color_mac(self, widget):
+        if type(widget) in [tk.Button, tk.Frame, tk.Label,]:
+            widget.configure(bg=self.mac_color)
+        if type(widget) == tk.Button:
+            widget.configure(highlightbackground=self.mac_color)
+        if widget.grid_slaves():
+            for i in widget.grid_slaves():
+                self.config_color_mac(i)
+
     def on_close(self):
         #save last used settings
         settingsdir = 'settings'
@@ -3075,6 +3645,9 @@ class FED3_Viz(tk.Tk):
         #save current session
         if os.path.isdir('sessions'):
             self.save_session(dialog=False)
+        for job in self.PLOT_QUEUE:
+            job['future'].cancel()
+        self.PLOT_POOL.shutdown(wait=False)
         self.destroy()
         self.quit()
 
@@ -3160,13 +3733,20 @@ class FED3_Viz(tk.Tk):
         warning = tk.Label(warn_window, text=text, justify=tk.LEFT)
         warning.pack(padx=(20,20),pady=(20,20))
 
-    def raise_fed_concat_error(self):
+    def raise_fed_concat_error(self, feds):
         warn_window = tk.Toplevel(self)
         warn_window.grab_set()
         warn_window.title('Error: cannot concatenate')
         if not platform.system() == 'Darwin':
             warn_window.iconbitmap('img/exclam.ico')
         text = ("The selected FEDs have overlapping dates and could not be concatenated")
+        pairs = overlapping_pairs(fed_intervals(feds))
+        if pairs:
+            text += ':\n'
+            text += '\n'.join(feds[i].basename + ' & ' + feds[j].basename
+                              for i, j in pairs[:10])
+            if len(pairs) > 10:
+                text += '\n(and ' + str(len(pairs) - 10) + ' more)'
         warning = tk.Label(warn_window, text=text, justify=tk.LEFT)
         warning.pack(padx=(20,20),pady=(20,20))
 
@@ -3191,9 +3771,12 @@ class FED3_Viz(tk.Tk):
             menu.grab_release()
 
     def r_open_location(self,):
-        selected = self.files_spreadsheet.selection()
-        fed = self.LOADED_FEDS[int(selected[0])]
-        dirname = os.path.dirname(fed.directory)
+        fed = self.get_selected_feds()[0]
+        if fed.directory is None:
+            self.show_in_memory_info(fed)
+            return
+        archive = split_archive_path(fed.directory)
+        dirname = os.path.dirname(archive[0] if archive else fed.directory)
         try:
             os.startfile(dirname)
         except:
@@ -3201,15 +3784,25 @@ class FED3_Viz(tk.Tk):
             subprocess.call([opener,dirname])
 
     def r_open_externally(self):
-        selected = self.files_spreadsheet.selection()
-        fed = self.LOADED_FEDS[int(selected[0])]
+        fed = self.get_selected_feds()[0]
+        if fed.directory is None:
+            self.show_in_memory_info(fed)
+            return
+        archive = split_archive_path(fed.directory)
+        path = archive[0] if archive else fed.directory
         try:
-            os.startfile(fed.directory)
+            os.startfile(path)
         except:
             opener = 'open' if sys.platform == 'darwin' else 'xdg-open'
-            subprocess.call([opener,fed.directory])
+            subprocess.call([opener,path])
+
+    def show_in_memory_info(self, fed):
+        tk.messagebox.showinfo('File only in memory',
+                               fed.basename + ' was concatenated without being saved, '
+                               'so it has no file on disk.')
 
     def r_load_plot_settings(self):
+        from fed_inspect import fed_inspect
         current_settings_dict = self.get_current_settings_as_args()
         current_settings_df = self.convert_settingsdict_to_df(current_settings_dict)
         clicked=self.plot_listbox.curselection()
@@ -3235,47 +3828,36 @@ class FED3_Viz(tk.Tk):
         elif 'FEDs' in plot_obj.arguments:
             feds_to_select += plot_obj.arguments['FEDs']
         self.files_spreadsheet.selection_remove(self.files_spreadsheet.selection())
-        to_select = []
-        for plot_fed in feds_to_select:
-            for i,loaded_fed in enumerate(self.LOADED_FEDS):
-                if plot_fed == loaded_fed:
-                    to_select.append(i)
+        loaded = [self.find_loaded_fed(fed) for fed in feds_to_select]
+        to_select = [self.FED_TO_IID[fed] for fed in loaded if fed is not None]
         self.files_spreadsheet.selection_set(to_select)
         self.update_buttons_home(None)
         self.tabcontrol.select(self.home_tab)
 
-    def r_set_datefilter_fromfiles(self):
-        selected = self.files_spreadsheet.selection()
-        feds = [self.LOADED_FEDS[int(i)] for i in selected]
+    def r_set_datefilter_fromfiles(self, shared=False):
+        feds = self.get_selected_feds()
         if not feds:
             return
-        s = min([fed.start_time for fed in feds])
-        e = max([fed.end_time for fed in feds])
+        if shared:
+            #the window recorded by all files (or by the most, if none is)
+            s, e = (pd.Timestamp(t) for t in busiest_window(fed_intervals(feds)))
+        else:
+            s = min([fed.start_time for fed in feds])
+            e = max([fed.end_time for fed in feds])
         shour = list(self.times_to_int.keys())[s.hour]
         ehour = list(self.times_to_int.keys())[e.hour]
-        if str(self.date_filter_s_days.cget('state')) == 'disabled':
-            self.date_filter_s_days.configure(state=tk.NORMAL)
-            self.date_filter_s_days.set_date(s)
-            self.date_filter_s_days.configure(state=tk.DISABLED)
-        else:
-            self.date_filter_s_days.set_date(s)
-        if str(self.date_filter_e_days.cget('state')) == 'disabled':
-            self.date_filter_e_days.configure(state=tk.NORMAL)
-            self.date_filter_e_days.set_date(e)
-            self.date_filter_e_days.configure(state=tk.DISABLED)
-        else:
-            self.date_filter_e_days.set_date(e)
-        self.date_filter_s_hour.set(shour)
-        self.date_filter_e_hour.set(ehour)
-
-root = FED3_Viz()
-root.protocol("WM_DELETE_WINDOW", root.on_close)
-root.bind('<Escape>', root.escape)
-root.geometry("1400x700")
+        self.set_date_filter_days(s, e)
+        self.date_filter_s_hour_val.set(shour)
+        self.date_filter_e_hour_val.set(ehour)
+
 if __name__=="__main__":
+    multiprocessing.freeze_support()
+    root = FED3_Viz()
+    root.protocol("WM_DELETE_WINDOW", root.on_close)
+    root.bind('<Escape>', root.escape)
+    root.geometry("1400x700")
     root.lift()
     root.attributes('-topmost',True)
     root.after_idle(root.attributes,'-topmost',False)
     root.focus_force()
     root.mainloop()
-plt.close('all')
\ No newline at end of file
@@ -9,15 +9,24 @@ import inspect
 from importlib import import_module
 import importlib.util
 import os
+import sys
 
 mymod1 = import_module('load.load') #my load module
-homedir = os.path.dirname(os.path.dirname(__file__))
-plotsloc = os.path.join(homedir, 'plots/plots.py')
-spec = importlib.util.spec_from_file_location("plots.plots", plotsloc)
-mymod2 = importlib.util.module_from_spec(spec) #my plots module
-spec.loader.exec_module(mymod2)
+if getattr(sys, 'frozen', False):
+    #frozen builds have no source for imported modules, so load the
+    #plots.py bundled as data to be able to show its code
+    homedir = os.path.dirname(os.path.dirname(__file__))
+    plotsloc = os.path.join(homedir, 'plots/plots.py')
+    spec = importlib.util.spec_from_file_location("plots.plots", plotsloc)
+    mymod2 = importlib.util.module_from_spec(spec) #my plots module
+    spec.loader.exec_module(mymod2)
+else:
+    mymod2 = import_module('plots.plots') #my plots module
+mymod3 = import_module('fedquery.fedquery') #my query module
 
-plotfuncs = {name:func for name, func in inspect.getmembers(mymod2)}
+#unwrapped, in case they are timed by perf.instrument()
+plotfuncs = {name:inspect.unwrap(func) for name, func in
+             inspect.getmembers(mymod2, inspect.isfunction)}
 
 string_arguments = ['pellet_color', 'pellet_bins', 'average_bins',
                     'average_error', 'circ_value', 'circ_error','bias_style',
@@ -40,13 +49,26 @@ date_format_funcs = ['pellet_plot_single','pellet_freq_single',
                      'diagnostic plot','pellet_plot_multi_unaligned',
                      'pellet_freq_multi_unaligned','retrieval_time_single',
                      'battery_plot','motor_plot','poketime_plot']
+freq_funcs = ['pellet_freq_single','pellet_freq_multi_aligned',
+              'pellet_freq_multi_unaligned']
 pr_funcs = ['pr_plot','group_pr_plot']
 meal_funcs = ['meal_size_histogram','grouped_meal_size_histogram']
+decimate_funcs = ['pellet_plot_single','pellet_freq_multi_aligned',
+                  'pellet_freq_multi_unaligned','poke_plot','battery_plot',
+                  'motor_plot']
+collection_funcs = ['pellet_plot_multi_aligned','pellet_plot_multi_unaligned',
+                    'line_chronogram','circle_chronogram','spiny_chronogram']
 
 def add_quotes(string):
     output = '"' + string + '"'
     return output
 
+def fed_code(fedfile):
+    #files only in memory (concatenated without saving) have no path to load
+    if fedfile.directory is None:
+        return 'None'
+    return str(fedfile)
+
 def generate_code(PLOTOBJ):
     used_args = PLOTOBJ.arguments
     plotfunc    = plotfuncs[PLOTOBJ.plotfunc.__name__]
@@ -65,9 +87,17 @@ def generate_code(PLOTOBJ):
 #these are libraries used for ALL plotting functions in FED3 Viz,
 #so some may be redundant!
 
+import bz2
 import datetime
 import datetime as dt
+import gzip
+import hashlib
+import importlib.util
+import io
+import lzma
 import os
+import threading
+import zipfile
 
 import matplotlib as mpl
 import matplotlib.dates as mdates
@@ -76,7 +106,10 @@ import numpy as np
 import pandas as pd
 import seaborn as sns
 
+from contextlib import contextmanager, ExitStack
 from difflib import SequenceMatcher
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
 from matplotlib.ticker import AutoMinorLocator
 from pandas.plotting import register_matplotlib_converters
 from scipy import stats
@@ -84,7 +117,15 @@ from scipy import stats
 register_matplotlib_converters()
 """
     load_code = '\n#CODE TO LOAD FED DATA FROM A DIRECTORY\n\n'
-    load_code += inspect.getsource(mymod1.FED3_File)
+    load_code += inspect.getsource(mymod1.FED3_File) + '\n'
+    load_code += inspect.getsource(mymod1.aggregate_rows) + '\n'
+    load_code += inspect.getsource(mymod1.row_aggregates) + '\n'
+    load_code += inspect.getsource(mymod1.read_and_fingerprint) + '\n'
+    load_code += inspect.getsource(mymod1.strip_compression) + '\n'
+    load_code += inspect.getsource(mymod1.split_archive_path) + '\n'
+    load_code += inspect.getsource(mymod1.open_fed_file) + '\n'
+    load_code += inspect.getsource(mymod1.read_fed_table) + '\n'
+    load_code += inspect.getsource(mymod1.read_xlsx)
 
     shade_helpers = '\n#HELPER FUNCTIONS (SHADING DARK)\n\n'
     shade_helpers += inspect.getsource(mymod2.convert_dt64_to_dt) + '\n'
@@ -101,6 +142,8 @@ register_matplotlib_converters()
 
     circ_helpers = '\n#HELPER FUNCTIONS (CIRCADIAN PLOTS)\n\n'
     circ_helpers += inspect.getsource(mymod2.resample_get_yvals) + '\n'
+    circ_helpers += inspect.getsource(mymod2.aggregate_get_yvals) + '\n'
+    circ_helpers += inspect.getsource(mymod2.hourly_yvals) + '\n'
 
     poke_helpers = '\n#HELPER FUNCTIONS (POKE PLOTS)\n\n'
     poke_helpers += inspect.getsource(mymod2.left_right_noncumulative)
@@ -108,11 +151,20 @@ register_matplotlib_converters()
     bias_helpers = '\n#HELPER FUNCTIONS (BIAS PLOTS)\n\n'
     bias_helpers += inspect.getsource(mymod2.resample_get_yvals)
     bias_helpers += inspect.getsource(mymod2.left_right_bias)
+    bias_helpers += inspect.getsource(mymod2.aggregate_get_yvals)
+    bias_helpers += inspect.getsource(mymod2.binned_yvals)
 
     avg_helpers = '\n#HELPER FUNCTIONS (AVERAGE PLOTS)\n\n'
     avg_helpers += inspect.getsource(mymod2.resample_get_yvals)
     avg_helpers += inspect.getsource(mymod2.left_right_noncumulative)
     avg_helpers += inspect.getsource(mymod2.left_right_bias)
+    avg_helpers += inspect.getsource(mymod2.aggregate_get_yvals)
+    avg_helpers += inspect.getsource(mymod2.binned_yvals)
+    avg_helpers += inspect.getsource(mymod2.data_intervals) + '\n'
+    avg_helpers += inspect.getsource(mymod1.common_overlap)
+
+    freq_helpers = '\n#HELPER FUNCTIONS (PELLET FREQUENCY)\n\n'
+    freq_helpers += inspect.getsource(mymod2.binned_pellets)
 
     date_helpers = '\n#HELPER FUNCTIONS (DATE FORMATTING)\n\n'
     date_helpers += inspect.getsource(mymod2.date_format_x)
@@ -123,11 +175,28 @@ register_matplotlib_converters()
     meal_helpers = '\n#HELPER FUNCTIONS (MEAL SIZE)\n\n'
     meal_helpers += inspect.getsource(mymod2.label_meals)
 
+    decimate_helpers = '\n#HELPER FUNCTIONS (DECIMATING LONG LINES)\n\n'
+    decimate_helpers += inspect.getsource(mymod2.decimate_indices) + '\n'
+    decimate_helpers += inspect.getsource(mymod2.plot_decimated)
+
+    collection_helpers = '\n#HELPER FUNCTIONS (DRAWING MANY LINES)\n\n'
+    collection_helpers += inspect.getsource(mymod2.decimate_indices) + '\n'
+    collection_helpers += inspect.getsource(mymod2.plot_collection)
+
+    query_helpers = '\n#HELPER FUNCTIONS (SQL QUERIES)\n\n'
+    query_helpers += inspect.getsource(mymod3) + '\n'
+    query_helpers += inspect.getsource(mymod2.fed_query)
+
     function_code ='\n#PLOTTING FUNCTION:\n\n'
     inspected = inspect.getsource(plotfunc).replace('plt.close()','')
     function_code += inspected
 
     arguments = '\n#ARGUMENT VALUES:\n\n'
+    feds = used_args['FEDs'] if 'FEDs' in used_args else [used_args.get('FED')]
+    in_memory = [f.basename for f in feds if f is not None and f.directory is None]
+    if in_memory:
+        arguments += ('#only in memory in FED3 Viz (replace None by the file '
+                      'once saved): ' + ', '.join(in_memory) + '\n\n')
     for arg in args_ordered:
         if arg == 'FEDs' and len(used_args['FEDs']) > 1:
             feds_text = ''
@@ -135,7 +204,7 @@ register_matplotlib_converters()
             fed_varname_dict = {}
             for i, fedfile in enumerate(used_args[arg],start=1):
                 var_name = 'fed' + str(i)
-                feds_text += var_name + ' = ' + str(fedfile) + '\n'
+                feds_text += var_name + ' = ' + fed_code(fedfile) + '\n'
                 fed_list.append(var_name)
                 fed_varname_dict[fedfile] = var_name
             feds_text += '\nFEDs = ' + '[%s]' % ', '.join(map(str, fed_list)) + '\n'
@@ -151,10 +220,22 @@ register_matplotlib_converters()
         else:
             if arg in string_arguments:
                 formatted = add_quotes(str(used_args[arg]))
+            elif arg == 'sql':
+                formatted = repr(used_args[arg])
+            elif arg == 'FED':
+                formatted = fed_code(used_args[arg])
+            elif arg == 'FEDs':
+                formatted = '[' + ', '.join(map(fed_code, used_args[arg])) + ']'
             else:
                 formatted = str(used_args[arg])
             text = arg + ' = ' + formatted +'\n'
             arguments += text
+    if PLOTOBJ.plotfunc.__name__ == 'query_table':
+        #the database's groups table comes from the files' groups
+        arguments += '\n'
+        for i, fedfile in enumerate(used_args['FEDs']):
+            if fedfile.group:
+                arguments += 'FEDs[' + str(i) + '].group = ' + str(fedfile.group) + '\n'
 
     call = '\n#CALLING THE FUNCTION\n\n'
     call += 'plot = '
@@ -185,12 +266,20 @@ register_matplotlib_converters()
         output += bias_helpers
     if plotfunc.__name__ in avg_funcs:
         output += avg_helpers
+    if plotfunc.__name__ in freq_funcs:
+        output += freq_helpers
     if plotfunc.__name__ in date_format_funcs:
         output += date_helpers
     if plotfunc.__name__ in pr_funcs:
         output += pr_helpers
     if plotfunc.__name__ in meal_funcs:
         output += meal_helpers
+    if plotfunc.__name__ in decimate_funcs:
+        output += decimate_helpers
+    if plotfunc.__name__ in collection_funcs:
+        output += collection_helpers
+    if plotfunc.__name__ == 'query_table':
+        output += query_helpers
     output += function_code
     output += arguments
     output += call
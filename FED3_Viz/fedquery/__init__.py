@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""
+SQL queries over loaded FED3 data.
+
+@author: https://github.com/earnestt1234
+"""
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory SQLite database of loaded FED3 data, for answering questions
+across files (e.g. "mean pellets per dark hour for group X on days 3 to 5")
+with SQL instead of loops over FED3_Files:
+
+    SELECT group_name, AVG(pellets) FROM group_hourly
+    WHERE group_name = 'X' AND dark = 1 AND day BETWEEN 3 AND 5
+    GROUP BY group_name
+
+Tables are files, groups, events and hours (every hour of each recording);
+the hourly/daily views (and group_hourly/group_daily, joined with the groups)
+compute the outputs of plots.resample_get_yvals() for each bin.
+
+@author: https://github.com/earnestt1234
+"""
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+#(name, SQL over events, summed - i.e. 0 rather than NULL for empty bins)
+METRICS = [('events', 'COUNT(*)', True),
+           ('pellets', 'TOTAL(pellets)', True),
+           ('retrieval_time', 'AVG(retrieval_time)', False),
+           ('interpellet_intervals', 'AVG(ipi)', False),
+           ('correct_pokes', 'TOTAL(correct = 1)', True),
+           ('errors', 'TOTAL(correct = 0)', True),
+           ('correct_pokes_pct',
+            '100.0 * TOTAL(correct = 1) / NULLIF(TOTAL(correct IN (0, 1)), 0)', False),
+           ('errors_pct',
+            '100.0 * TOTAL(correct = 0) / NULLIF(TOTAL(correct IN (0, 1)), 0)', False),
+           ('poke_bias_correct_minus_error', 'TOTAL(correct = 1) - TOTAL(correct = 0)', True),
+           ('poke_bias_left_minus_right', 'TOTAL(left_pokes) - TOTAL(right_pokes)', True),]
+
+EVENT_COLUMNS = {'Event':'event',
+                 'Active_Poke':'active_poke',
+                 'Binary_Pellets':'pellets',
+                 'Binary_Left_Pokes':'left_pokes',
+                 'Binary_Right_Pokes':'right_pokes',
+                 'Correct_Poke':'correct',
+                 'Interpellet_Intervals':'ipi',
+                 'Retrieval_Time':'retrieval_time',
+                 'Poke_Time':'poke_time',
+                 'Battery_Voltage':'battery',
+                 'Motor_Turns':'motor_turns',}
+
+SCHEMA_HELP = """Tables:
+  files(file_id, basename, filename, directory, fingerprint, device, mode,
+        start_time, end_time, events)
+  groups(file_id, group_name)
+  events(file_id, time, hour_bin, elapsed_hours, day, hour, dark, event,
+         active_poke, pellets, left_pokes, right_pokes, correct, ipi,
+         retrieval_time, poke_time, battery, motor_turns)
+  hours(file_id, bin, day, hour, dark) - every hour of each recording
+Views (one row per file and hour/day, including bins without events):
+  hourly(file_id, bin, day, hour, dark, <metrics>)
+  daily(file_id, bin, day, <metrics>)
+  group_hourly, group_daily - the same, with group_name
+Metrics: """ + ', '.join(name for name, _, _ in METRICS) + """
+Times are text ('YYYY-MM-DD HH:MM:SS'); day 1 is the first calendar day of
+each file; dark uses the lights on/off settings."""
+
+EXAMPLE_QUERY = """SELECT group_name, AVG(pellets) AS pellets_per_dark_hour
+FROM group_hourly
+WHERE dark = 1 AND day BETWEEN 3 AND 5
+GROUP BY group_name"""
+
+def dark_hours(hours, lights_on=7, lights_off=19):
+    """Vectorized plots.is_day_or_night(..., 'night') for hours (0-23)."""
+    hours = np.asarray(hours)
+    if lights_off > lights_on:
+        return (hours >= lights_off) | (hours < lights_on)
+    elif lights_off < lights_on:
+        return (hours >= lights_off) & (hours < lights_on)
+    return np.zeros(len(hours), dtype=bool)
+
+def metric_view(name, bins, bin_columns, bin_expression):
+    """SQL for a view of the METRICS of events in each bin of a bins table."""
+    inner = ', '.join(sql + ' AS ' + metric for metric, sql, _ in METRICS)
+    outer = ', '.join(('COALESCE(m.{0}, 0) AS {0}' if summed else 'm.{0}').format(metric)
+                      for metric, _, summed in METRICS)
+    columns = ', '.join('b.' + column for column in bin_columns)
+    return ('CREATE VIEW {name} AS SELECT {columns}, {outer} FROM {bins} b '
+            'LEFT JOIN (SELECT file_id, {expr} AS bin, {inner} FROM events '
+            'GROUP BY file_id, {expr}) m ON m.file_id = b.file_id AND m.bin = b.bin;'
+            ).format(name=name, columns=columns, outer=outer, bins=bins,
+                     expr=bin_expression, inner=inner)
+
+class FedDatabase():
+    """SQLite database of the data of FED3_Files"""
+    def __init__(self, feds, lights_on=7, lights_off=19, callback=None):
+        """
+        Builds the database (in memory) from FED3_Files.  It can be built
+        in one thread and queried from another.
+
+        Parameters
+        ----------
+        feds : list
+            FED3_File objects
+        lights_on : int, optional
+            Hour of the day (0-23) when lights turn on. The default is 7.
+        lights_off : int, optional
+            Hour of the day (0-23) when lights turn off. The default is 19.
+        callback : callable, optional
+            Called with each FED3_File after its data is read.
+        """
+        self.conn = sqlite3.connect(':memory:', check_same_thread=False)
+        files, groups, events, hours = [], [], [], []
+        for file_id, fed in enumerate(feds, start=1):
+            df = fed.data
+            device = (df['Device_Number'].iloc[0] if 'Device_Number' in df.columns
+                      else None)
+            files.append({'file_id':file_id, 'basename':fed.basename,
+                          'filename':fed.filename, 'directory':fed.directory,
+                          'fingerprint':fed.fingerprint,
+                          'device':None if pd.isna(device) else str(device),
+                          'mode':fed.mode, 'start_time':str(fed.start_time),
+                          'end_time':str(fed.end_time), 'events':fed.events})
+            groups += [{'file_id':file_id, 'group_name':group} for group in fed.group]
+            first_day = fed.start_time.normalize()
+            table = pd.DataFrame({'file_id':file_id,
+                                  'time':df.index.strftime('%Y-%m-%d %H:%M:%S'),
+                                  'hour_bin':df.index.strftime('%Y-%m-%d %H:00:00'),
+                                  'elapsed_hours':(df.index - fed.start_time) / pd.Timedelta(hours=1),
+                                  'day':(df.index.normalize() - first_day).days + 1,
+                                  'hour':df.index.hour,
+                                  'dark':dark_hours(df.index.hour, lights_on, lights_off).astype(int)})
+            for column, name in EVENT_COLUMNS.items():
+                if column in df.columns:
+                    values = df[column]
+                    if isinstance(values.dtype, pd.SparseDtype):
+                        values = values.sparse.to_dense()
+                    elif isinstance(values.dtype, pd.CategoricalDtype):
+                        values = values.astype(object)
+                    table[name] = values.values
+                else:
+                    table[name] = np.nan
+            events.append(table)
+            span = pd.date_range(fed.start_time.floor('H'), fed.end_time.floor('H'), freq='H')
+            hours.append(pd.DataFrame({'file_id':file_id,
+                                       'bin':span.strftime('%Y-%m-%d %H:00:00'),
+                                       'day':(span.normalize() - first_day).days + 1,
+                                       'hour':span.hour,
+                                       'dark':dark_hours(span.hour, lights_on, lights_off).astype(int)}))
+            if callback:
+                callback(fed)
+        pd.DataFrame(files, columns=['file_id', 'basename', 'filename', 'directory',
+                                     'fingerprint', 'device', 'mode', 'start_time',
+                                     'end_time', 'events']).to_sql('files', self.conn, index=False)
+        pd.DataFrame(groups, columns=['file_id', 'group_name']).to_sql('groups', self.conn, index=False)
+        if events:
+            pd.concat(events).to_sql('events', self.conn, index=False)
+            pd.concat(hours).to_sql('hours', self.conn, index=False)
+        else:
+            self.conn.execute('CREATE TABLE events (file_id, time, hour_bin, elapsed_hours, day, hour, dark, ' +
+                              ', '.join(EVENT_COLUMNS.values()) + ')')
+            self.conn.execute('CREATE TABLE hours (file_id, bin, day, hour, dark)')
+        self.conn.executescript("""
+            CREATE INDEX events_bins ON events (file_id, hour_bin);
+            CREATE INDEX groups_file ON groups (file_id);
+            CREATE VIEW days AS SELECT DISTINCT file_id, substr(bin, 1, 10) AS bin, day FROM hours;
+            """ +
+            metric_view('hourly', 'hours', ['file_id', 'bin', 'day', 'hour', 'dark'], 'hour_bin') +
+            metric_view('daily', 'days', ['file_id', 'bin', 'day'], 'substr(time, 1, 10)') + """
+            CREATE VIEW group_hourly AS SELECT g.group_name, h.* FROM hourly h
+                JOIN groups g ON g.file_id = h.file_id;
+            CREATE VIEW group_daily AS SELECT g.group_name, d.* FROM daily d
+                JOIN groups g ON g.file_id = d.file_id;
+            """)
+
+    def query(self, sql, params=()):
+        """
+        Runs a SQL query.
+
+        Parameters
+        ----------
+        sql : str
+            SQLite query
+        params : sequence or dict, optional
+            Values for placeholders in sql. The default is ().
+
+        Returns
+        -------
+        pandas.DataFrame
+            The result
+        """
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def close(self):
+        self.conn.close()
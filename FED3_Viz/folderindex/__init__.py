@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent index of FED3 files found in folders.
+
+@author: https://github.com/earnestt1234
+"""
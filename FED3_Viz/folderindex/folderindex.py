@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite index of candidate FED3 files within folders.  Stores the path, size,
+modified time, and sniffed contents (header validity, device number,
+start/end time and event count) of each .csv/.xlsx file (including
+compressed files, and members of zip archives), so that loading a
+folder (or finding files within a date range) doesn't require parsing every
+file.  Rescans only list directories which have changed since the last scan,
+and only re-sniff files which are new or modified.
+
+@author: https://github.com/earnestt1234
+"""
+
+import os
+import sqlite3
+
+import pandas as pd
+
+import zipfile
+
+from load.load import fed_file_extension, list_archive_members, sniff_fed_file
+
+CANDIDATE_EXTENSIONS = ('.csv', '.xlsx')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path   TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime  REAL
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+CREATE TABLE IF NOT EXISTS files (
+    path       TEXT PRIMARY KEY,
+    dir        TEXT,
+    size       INTEGER,
+    mtime      REAL,
+    valid      INTEGER,
+    device     TEXT,
+    start_time TEXT,
+    end_time   TEXT,
+    events     INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+"""
+
+def normalize(path):
+    """Absolute path with forward slashes (as in FED3_File.directory)."""
+    return os.path.abspath(path).replace('\\', '/')
+
+def subtree_bounds(path):
+    """Bounds such that lower <= p < upper for all paths p below path."""
+    return path + '/', path + '0'
+
+def time_text(stamp):
+    return None if stamp is None else str(pd.Timestamp(stamp))
+
+class FolderIndex():
+    """Persistent index of the FED3 files found in scanned folders"""
+    def __init__(self, db_path):
+        """
+        Opens (or creates) the index database.
+
+        Parameters
+        ----------
+        db_path : str
+            Path to the SQLite database file
+        """
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def rescan(self, root, full=False, callback=None):
+        """
+        Brings the index of a folder (and all its subfolders) up to date.
+        Directories whose modified time is unchanged are not listed again;
+        their known subdirectories are still visited.  Files are only
+        sniffed when they are new, or their size or modified time changed.
+
+        Parameters
+        ----------
+        root : str
+            Folder to scan
+        full : bool, optional
+            List every directory, even if unchanged (catches files modified
+            in place, which doesn't update the directory time on all
+            systems). The default is False.
+        callback : callable, optional
+            Called with the path of each directory which is listed.
+
+        Returns
+        -------
+        dict
+            Counts of directories listed ("listed") and files sniffed
+            ("sniffed")
+        """
+        root = normalize(root)
+        counts = {'listed':0, 'sniffed':0}
+        cur = self.conn.cursor()
+        stack = [root]
+        while stack:
+            folder = stack.pop()
+            try:
+                mtime = os.stat(folder).st_mtime
+            except OSError:
+                self.forget(folder)
+                continue
+            known = cur.execute('SELECT mtime FROM dirs WHERE path=?',
+                                (folder,)).fetchone()
+            if known and known[0] == mtime and not full:
+                stack += [row[0] for row in
+                          cur.execute('SELECT path FROM dirs WHERE parent=?',
+                                      (folder,))]
+                continue
+            if callback:
+                callback(folder)
+            counts['listed'] += 1
+            subdirs = []
+            seen = set()
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                entries = []
+            for entry in entries:
+                path = folder + '/' + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                    is_archive = entry.name.lower().endswith('.zip')
+                    if (not is_archive and
+                        fed_file_extension(entry.name) not in CANDIDATE_EXTENSIONS):
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if is_archive:
+                    seen.update(self.scan_archive(path, stat, counts))
+                    continue
+                seen.add(path)
+                old = cur.execute('SELECT size, mtime FROM files WHERE path=?',
+                                  (path,)).fetchone()
+                if old == (stat.st_size, stat.st_mtime):
+                    continue
+                try:
+                    info = sniff_fed_file(path)
+                except ImportError: #a compression not installed: left to loading
+                    info = {'valid':None, 'device':None, 'start_time':None,
+                            'end_time':None, 'events':None}
+                except Exception: #unreadable
+                    info = {'valid':False, 'device':None, 'start_time':None,
+                            'end_time':None, 'events':None}
+                counts['sniffed'] += 1
+                cur.execute('INSERT OR REPLACE INTO files VALUES (?,?,?,?,?,?,?,?,?)',
+                            (path, folder, stat.st_size, stat.st_mtime,
+                             info['valid'], info['device'],
+                             time_text(info['start_time']),
+                             time_text(info['end_time']), info['events']))
+            gone = [row[0] for row in
+                    cur.execute('SELECT path FROM files WHERE dir=?', (folder,))
+                    if row[0] not in seen]
+            cur.executemany('DELETE FROM files WHERE path=?',
+                            [(path,) for path in gone])
+            for row in cur.execute('SELECT path FROM dirs WHERE parent=?',
+                                   (folder,)).fetchall():
+                if row[0] not in subdirs:
+                    self.forget(row[0])
+            cur.execute('INSERT OR REPLACE INTO dirs VALUES (?,?,?)',
+                        (folder, os.path.dirname(folder), mtime))
+            stack += subdirs
+        self.conn.commit()
+        return counts
+
+    def scan_archive(self, path, stat, counts):
+        """
+        Indexes the members of a zip archive as files (e.g.
+        "cohort.zip/FED1.csv"), stamped with the size and modified time of
+        the archive.  Members are only re-sniffed when the archive changed.
+
+        Returns
+        -------
+        list
+            Paths of the indexed members
+        """
+        lower, upper = subtree_bounds(path)
+        rows = self.conn.execute('SELECT path, size, mtime FROM files '
+                                 'WHERE path>=? AND path<?',
+                                 (lower, upper)).fetchall()
+        if rows and all(row[1:] == (stat.st_size, stat.st_mtime) for row in rows):
+            return [row[0] for row in rows]
+        try:
+            members = list_archive_members(path)
+        except (OSError, zipfile.BadZipFile):
+            members = []
+        for member in members:
+            try:
+                info = sniff_fed_file(member)
+            except ImportError:
+                info = {'valid':None, 'device':None, 'start_time':None,
+                        'end_time':None, 'events':None}
+            except Exception:
+                info = {'valid':False, 'device':None, 'start_time':None,
+                        'end_time':None, 'events':None}
+            counts['sniffed'] += 1
+            self.conn.execute('INSERT OR REPLACE INTO files VALUES (?,?,?,?,?,?,?,?,?)',
+                              (member, os.path.dirname(path), stat.st_size,
+                               stat.st_mtime, info['valid'], info['device'],
+                               time_text(info['start_time']),
+                               time_text(info['end_time']), info['events']))
+        return members
+
+    def forget(self, folder):
+        """Removes a folder, its subfolders, and their files from the index."""
+        folder = normalize(folder)
+        lower, upper = subtree_bounds(folder)
+        self.conn.execute('DELETE FROM dirs WHERE path=? OR (path>=? AND path<?)',
+                          (folder, lower, upper))
+        self.conn.execute('DELETE FROM files WHERE dir=? OR (dir>=? AND dir<?)',
+                          (folder, lower, upper))
+
+    def files(self, root, valid_only=True, start=None, end=None):
+        """
+        Queries the indexed files below a folder.  Call rescan() first to
+        make sure the index is current.
+
+        Parameters
+        ----------
+        root : str
+            Folder to search
+        valid_only : bool, optional
+            Exclude files whose header showed they aren't FED3 data.  Files
+            whose validity is unknown are kept. The default is True.
+        start : datetime-like, optional
+            Only return files recording after this time. The default is None.
+        end : datetime-like, optional
+            Only return files recording before this time. The default is None.
+
+        Returns
+        -------
+        list
+            Paths of matching files, sorted
+        """
+        root = normalize(root)
+        lower, upper = subtree_bounds(root)
+        query = 'SELECT path FROM files WHERE (dir=? OR (dir>=? AND dir<?))'
+        params = [root, lower, upper]
+        if valid_only:
+            query += ' AND (valid IS NULL OR valid=1)'
+        if start is not None:
+            query += ' AND (end_time IS NULL OR end_time>=?)'
+            params.append(time_text(start))
+        if end is not None:
+            query += ' AND (start_time IS NULL OR start_time<=?)'
+            params.append(time_text(end))
+        query += ' ORDER BY path'
+        return [row[0] for row in self.conn.execute(query, params)]
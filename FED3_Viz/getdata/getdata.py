@@ -6,16 +6,15 @@ Has one "getdata" function for each "plots" function
 @author: https://github.com/earnestt1234
 """
 import datetime as dt
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import numpy as np
 import pandas as pd
-import seaborn as sns
-
-from scipy import stats
 
+from load.load import common_overlap
 from plots.plots import (resample_get_yvals, night_intervals, left_right_bias,
                          left_right_noncumulative, label_meals,
-                         get_daynight_count)
+                         get_daynight_count, data_intervals, binned_yvals,
+                         binned_pellets, hourly_yvals, fed_query)
 
 def pellet_plot_single(FED,*args, **kwargs):
     df = FED.data
@@ -30,12 +29,8 @@ def pellet_plot_single(FED,*args, **kwargs):
     return output
 
 def pellet_freq_single(FED, pellet_bins,*args, **kwargs):
-    df = FED.data
-    if 'date_filter' in kwargs:
-        s, e = kwargs['date_filter']
-        df = df[(df.index >= s) &
-                (df.index <= e)].copy()
-    df = df.resample(pellet_bins).sum()
+    df = binned_pellets(FED, pellet_bins,
+                        kwargs.get('date_filter')).to_frame()
     x = df.index.values
     y = df['Binary_Pellets']
     y = y.rename('Pellets')
@@ -83,12 +78,8 @@ def pellet_plot_multi_unaligned(FEDs,*args,**kwargs):
 def pellet_freq_multi_aligned(FEDs, pellet_bins, *args,**kwargs):
     df_list = []
     for file in FEDs:
-        df = file.data
-        if 'date_filter' in kwargs:
-            s, e = kwargs['date_filter']
-            df = df[(df.index >= s) &
-                    (df.index <= e)].copy()
-        df = df.resample(pellet_bins,base=0).sum()
+        df = binned_pellets(file, pellet_bins,
+                            kwargs.get('date_filter')).to_frame()
         x = []
         for i, date in enumerate(df.index.values):
             x.append(date - df.index[0])
@@ -105,12 +96,8 @@ def pellet_freq_multi_aligned(FEDs, pellet_bins, *args,**kwargs):
 def pellet_freq_multi_unaligned(FEDs, pellet_bins, *args,**kwargs):
     df_list = []
     for file in FEDs:
-        df = file.data
-        if 'date_filter' in kwargs:
-            s, e = kwargs['date_filter']
-            df = df[(df.index >= s) &
-                    (df.index <= e)].copy()
-        df = df.resample(pellet_bins,base=0).sum()
+        df = binned_pellets(file, pellet_bins,
+                            kwargs.get('date_filter')).to_frame()
         x = df.index.values
         y = list(df['Binary_Pellets'])
         dic = {file.basename:y}
@@ -123,23 +110,18 @@ def pellet_freq_multi_unaligned(FEDs, pellet_bins, *args,**kwargs):
 
 def average_plot_ondatetime(FEDs, groups, dependent, average_bins,
                             average_error, *args, **kwargs):
+    from scipy import stats
     retrieval_threshold=None
     if 'retrieval_threshold' in kwargs:
         retrieval_threshold = kwargs['retrieval_threshold']
     output = pd.DataFrame()
     group_avg_df = pd.DataFrame()
-    earliest_end = dt.datetime(2999,1,1,0,0,0)
-    latest_start = dt.datetime(1970,1,1,0,0,0)
-    for file in FEDs:
-        df = file.data
-        if 'date_filter' in kwargs:
-            s, e = kwargs['date_filter']
-            df = df[(df.index >= s) &
-                    (df.index <= e)].copy()
-        if min(df.index) > latest_start:
-            latest_start = min(df.index)
-        if max(df.index) < earliest_end:
-            earliest_end = max(df.index)
+    intervals = data_intervals(FEDs, kwargs.get('date_filter'))
+    #a file with no data shares no time with the others
+    window = common_overlap(intervals) if len(intervals) == len(FEDs) else None
+    if window is None:
+        return None
+    latest_start, earliest_end = window
     for i, group in enumerate(groups):
         avg = []
         for file in FEDs:
@@ -156,8 +138,8 @@ def average_plot_ondatetime(FEDs, groups, dependent, average_bins,
                 elif dependent == 'right pokes':
                     y = left_right_noncumulative(df,average_bins,side='r',version='ondatetime')
                 else:
-                    df = df.groupby(pd.Grouper(freq=average_bins,base=0))
-                    y = df.apply(resample_get_yvals,dependent, retrieval_threshold)
+                    y = binned_yvals(file, average_bins, dependent, retrieval_threshold,
+                                     kwargs.get('date_filter'))
                     y = y[(y.index > latest_start) &
                           (y.index < earliest_end)].copy()
                 avg.append(y)
@@ -179,6 +161,7 @@ def average_plot_ondatetime(FEDs, groups, dependent, average_bins,
 def average_plot_ontime(FEDs, groups, dependent, average_bins, average_align_start,
                         average_align_days, average_error, *args,
                         **kwargs):
+    from scipy import stats
     retrieval_threshold=None
     if 'retrieval_threshold' in kwargs:
         retrieval_threshold = kwargs['retrieval_threshold']
@@ -239,6 +222,7 @@ def average_plot_ontime(FEDs, groups, dependent, average_bins, average_align_sta
 
 def average_plot_onstart(FEDs, groups, dependent, average_bins, average_error,
                          *args, **kwargs):
+    from scipy import stats
     retrieval_threshold=None
     if 'retrieval_threshold' in kwargs:
         retrieval_threshold = kwargs['retrieval_threshold']
@@ -299,6 +283,7 @@ def average_plot_onstart(FEDs, groups, dependent, average_bins, average_error,
 
 
 def interpellet_interval_plot(FEDs, kde, logx, *args, **kwargs):
+    import seaborn as sns
     kde_output = pd.DataFrame()
     bar_output = pd.DataFrame()
     bins = []
@@ -313,14 +298,13 @@ def interpellet_interval_plot(FEDs, kde, logx, *args, **kwargs):
         div = 900/50
         bins = [i*div for i in range(50)]
     for FED in FEDs:
-        fig = plt.figure() #made to not disrupt fig in app
-        plt.clf()
+        ax = Figure().add_subplot() #made to not disrupt fig in app
         df = FED.data
         y = df['Interpellet_Intervals'][df['Interpellet_Intervals'] > 0]
         if logx:
             y = [np.log10(val) for val in y if not pd.isna(val)]
         plot = sns.distplot(y,bins=bins,label=FED.basename,kde=kde,
-                            norm_hist=False)
+                            norm_hist=False, ax=ax)
         if kde:
             if plot.get_lines():
                 kde = plot.get_lines()[0].get_data()
@@ -334,12 +318,12 @@ def interpellet_interval_plot(FEDs, kde, logx, *args, **kwargs):
         bar_dic = {FED.basename:bar_h}
         bar_df = pd.DataFrame(bar_dic, index=bar_x)
         bar_output = bar_output.join(bar_df, how='outer')
-        plt.close()
     kde_output.index.name = 'log10(minutes)' if logx else 'minutes'
     bar_output.index.name = 'log10(minutes)' if logx else 'minutes'
     return kde_output, bar_output
 
 def group_interpellet_interval_plot(FEDs, groups, kde, logx, *args, **kwargs):
+    import seaborn as sns
     kde_output = pd.DataFrame()
     bar_output = pd.DataFrame()
     bins = []
@@ -355,8 +339,7 @@ def group_interpellet_interval_plot(FEDs, groups, kde, logx, *args, **kwargs):
         bins = [i*div for i in range(50)]
     for group in groups:
         #made to not disrupt fig in app
-        fig = plt.figure()
-        plt.clf()
+        ax = Figure().add_subplot()
         all_vals = []
         for FED in FEDs:
             if group in FED.group:
@@ -366,7 +349,7 @@ def group_interpellet_interval_plot(FEDs, groups, kde, logx, *args, **kwargs):
                     y = [np.log10(val) for val in y if not pd.isna(val)]
                 all_vals += y
         plot = sns.distplot(all_vals,bins=bins,label=group,kde=kde,
-                            norm_hist=False)
+                            norm_hist=False, ax=ax)
         if kde:
             if plot.get_lines():
                 kde = plot.get_lines()[0].get_data()
@@ -380,13 +363,13 @@ def group_interpellet_interval_plot(FEDs, groups, kde, logx, *args, **kwargs):
         bar_dic = {group:bar_h}
         bar_df = pd.DataFrame(bar_dic, index=bar_x)
         bar_output = bar_output.join(bar_df, how='outer')
-        plt.close()
     kde_output.index.name = 'log10(minutes)' if logx else 'minutes'
     bar_output.index.name = 'log10(minutes)' if logx else 'minutes'
     return kde_output, bar_output
 
 def meal_size_histogram(FEDs, meal_pellet_minimum, meal_duration,
                         norm_meals, **kwargs):
+    import seaborn as sns
     output = pd.DataFrame()
     if not isinstance(FEDs, list):
         FEDs = [FEDs]
@@ -408,20 +391,19 @@ def meal_size_histogram(FEDs, meal_pellet_minimum, meal_duration,
     bins = range(1,longest_meal+2)
     for series, fed in zip(sizes,FEDs):
         #made to not disrupt fig in app
-        fig = plt.figure()
-        plt.clf()
+        ax = Figure().add_subplot()
         plot = sns.distplot(series,bins=bins,kde=False,label=fed.basename,
-                            norm_hist=norm_meals,)
+                            norm_hist=norm_meals, ax=ax)
         bar_x = [v.get_x() for v in plot.patches]
         bar_h = [v.get_height() for v in plot.patches]
         bar_dic = {fed.filename:bar_h}
         bar_df = pd.DataFrame(bar_dic, index=bar_x)
         output = output.join(bar_df, how='outer')
-        plt.close()
     return output
 
 def grouped_meal_size_histogram(FEDs, groups, meal_pellet_minimum, meal_duration,
                                 norm_meals, **kwargs):
+    import seaborn as sns
     output = pd.DataFrame()
     if not isinstance(FEDs, list):
         FEDs = [FEDs]
@@ -447,16 +429,14 @@ def grouped_meal_size_histogram(FEDs, groups, meal_pellet_minimum, meal_duration
     bins = range(1,longest_meal+2)
     for series, group in zip(sizes,groups):
         #made to not disrupt fig in app
-        fig = plt.figure()
-        plt.clf()
+        ax = Figure().add_subplot()
         plot = sns.distplot(series,bins=bins,kde=False,label=group,
-                            norm_hist=norm_meals,)
+                            norm_hist=norm_meals, ax=ax)
         bar_x = [v.get_x() for v in plot.patches]
         bar_h = [v.get_height() for v in plot.patches]
         bar_dic = {group:bar_h}
         bar_df = pd.DataFrame(bar_dic, index=bar_x)
         output = output.join(bar_df, how='outer')
-        plt.close()
     return output
 
 def retrieval_time_single(FED, retrieval_threshold, **kwargs):
@@ -492,6 +472,7 @@ def retrieval_time_multi(FEDs, retrieval_threshold, **kwargs):
 
 def daynight_plot(FEDs, groups, circ_value, lights_on, lights_off, circ_error,
                   *args, **kwargs):
+    from scipy import stats
     retrieval_threshold=None
     if 'retrieval_threshold' in kwargs:
         retrieval_threshold = kwargs['retrieval_threshold']
@@ -612,15 +593,20 @@ def poke_plot(FED, poke_bins, poke_show_correct, poke_show_error, poke_show_left
                     (df.index <= e)].copy()
             df['Left_Poke_Count'] -= df['Left_Poke_Count'][0]
             df['Right_Poke_Count'] -= df['Right_Poke_Count'][0]
-        resampled_correct = df['Correct_Poke'].dropna().resample(poke_bins)
+        s, e = kwargs.get('date_filter', (None, None))
+        agg = FED.binned(poke_bins, s, e, trim='Pokes')
+        if agg is None:
+            resampled_correct = df['Correct_Poke'].dropna().resample(poke_bins)
+            agg = pd.DataFrame({'Correct':resampled_correct.apply(lambda binn: (binn==True).sum()),
+                                'Errors':resampled_correct.apply(lambda binn: (binn==False).sum())})
         if poke_show_correct:
-            y = resampled_correct.apply(lambda binn: (binn==True).sum())
+            y = agg['Correct']
             y = y.rename('Correct Pokes')
             x = y.index
             temp = pd.DataFrame(y, index=x,)
             output = output.join(temp, how='outer')
         if poke_show_error:
-            y = resampled_correct.apply(lambda binn: (binn==False).sum())
+            y = agg['Errors']
             y = y.rename('Incorrect Pokes')
             x = y.index
             temp = pd.DataFrame(y, index=x,)
@@ -646,8 +632,8 @@ def poke_bias(FED, poke_bins, bias_style, *args, **kwargs):
         df = df[(df.index >= s) &
                 (df.index <= e)].copy()
     if bias_style == 'correct (%)':
-        resampled = df.groupby(pd.Grouper(freq=poke_bins))
-        y = resampled.apply(resample_get_yvals, 'poke bias (correct %)')
+        y = binned_yvals(FED, poke_bins, 'poke bias (correct %)',
+                         date_filter=kwargs.get('date_filter'))
     elif bias_style == 'left (%)':
         y = left_right_bias(df, poke_bins)
     y = y.rename('Poke Bias (' + bias_style + ')')
@@ -716,16 +702,8 @@ def heatmap_chronogram(FEDs, circ_value, lights_on, *args, **kwargs):
     matrix = []
     index = []
     for FED in FEDs:
-        df = FED.data
-        if 'date_filter' in kwargs:
-            s, e = kwargs['date_filter']
-            df = df[(df.index >= s) &
-                    (df.index <= e)].copy()
-        byhour = df.groupby([df.index.hour])
-        byhour = byhour.apply(resample_get_yvals,circ_value,retrieval_threshold)
-        byhourday = df.groupby([df.index.hour,df.index.date])
-        num_days_by_hour = byhourday.sum().index.get_level_values(0).value_counts()
-        byhour = byhour.divide(num_days_by_hour, axis=0)
+        byhour = hourly_yvals(FED, circ_value, retrieval_threshold,
+                              kwargs.get('date_filter'))
         new_index = list(range(lights_on, 24)) + list(range(0,lights_on))
         reindexed = byhour.reindex(new_index)
         if circ_value in ['pellets', 'correct pokes','errors']:
@@ -741,6 +719,7 @@ def heatmap_chronogram(FEDs, circ_value, lights_on, *args, **kwargs):
 
 def line_chronogram(FEDs, groups, circ_value, circ_error, circ_show_indvl, shade_dark,
                     lights_on, lights_off, *args, **kwargs):
+    from scipy import stats
     retrieval_threshold=None
     if 'retrieval_threshold' in kwargs:
         retrieval_threshold = kwargs['retrieval_threshold']
@@ -750,16 +729,8 @@ def line_chronogram(FEDs, groups, circ_value, circ_error, circ_show_indvl, shade
         group_vals = []
         for FED in FEDs:
             if group in FED.group:
-                df = FED.data
-                if 'date_filter' in kwargs:
-                    s, e = kwargs['date_filter']
-                    df = df[(df.index >= s) &
-                            (df.index <= e)].copy()
-                byhour = df.groupby([df.index.hour])
-                byhour = byhour.apply(resample_get_yvals,circ_value,retrieval_threshold)
-                byhourday = df.groupby([df.index.hour,df.index.date])
-                num_days_by_hour = byhourday.sum().index.get_level_values(0).value_counts()
-                byhour = byhour.divide(num_days_by_hour, axis=0)
+                byhour = hourly_yvals(FED, circ_value, retrieval_threshold,
+                                      kwargs.get('date_filter'))
                 new_index = list(range(lights_on, 24)) + list(range(0,lights_on))
                 reindexed = byhour.reindex(new_index)
                 if circ_value in ['pellets', 'correct pokes','errors']:
@@ -843,6 +814,7 @@ def spiny_chronogram(FEDs, circ_value, resolution, lights_on, **kwargs):
     return output
 
 def day_night_ipi_plot(FEDs, kde, logx, lights_on, lights_off, **kwargs):
+    import seaborn as sns
     kde_output = pd.DataFrame()
     bar_output = pd.DataFrame()
     bins = []
@@ -857,8 +829,7 @@ def day_night_ipi_plot(FEDs, kde, logx, lights_on, lights_off, **kwargs):
         div = 900/50
         bins = [i*div for i in range(50)]
     for val in [False, True]:
-        fig = plt.figure()
-        plt.clf()
+        ax = Figure().add_subplot()
         all_vals = []
         for FED in FEDs:
             df = FED.data
@@ -880,7 +851,7 @@ def day_night_ipi_plot(FEDs, kde, logx, lights_on, lights_off, **kwargs):
             all_vals = [np.log10(val) for val in all_vals if not pd.isna(val)]
         label = 'Day' if val else 'Night'
         plot = sns.distplot(all_vals,bins=bins,label=label,norm_hist=False,
-                            kde=kde,)
+                            kde=kde, ax=ax)
         if kde:
             if plot.get_lines():
                 kde = plot.get_lines()[0].get_data()
@@ -894,7 +865,6 @@ def day_night_ipi_plot(FEDs, kde, logx, lights_on, lights_off, **kwargs):
         bar_dic = {label:bar_h}
         bar_df = pd.DataFrame(bar_dic, index=bar_x)
         bar_output = bar_output.join(bar_df, how='outer')
-        plt.close()
     kde_output.index.name = 'log10(minutes)' if logx else 'minutes'
     bar_output.index.name = 'log10(minutes)' if logx else 'minutes'
     return kde_output, bar_output
@@ -939,6 +909,7 @@ def pr_plot(FEDs, break_hours, break_mins, break_style, *args, **kwargs):
 
 def group_pr_plot(FEDs, groups, break_hours, break_mins, break_style,
                   break_error, *args, **kwargs):
+    from scipy import stats
     delta = dt.timedelta(hours=break_hours, minutes=break_mins)
     output = pd.DataFrame()
     group_output = pd.DataFrame()
@@ -1013,6 +984,11 @@ def motor_plot(FED,*args, **kwargs):
     output = pd.DataFrame(y, index=x)
     return output
 
+def query_table(FEDs, sql, lights_on, lights_off, **kwargs):
+    if kwargs.get('result') is not None:
+        return kwargs['result']
+    return fed_query(FEDs, sql, lights_on, lights_off)
+
 #---Old functions
 
 def diagnostic_plot(FED, *args, **kwargs):
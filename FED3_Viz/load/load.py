@@ -6,14 +6,56 @@ extra columns.
 @author: https://github.com/earnestt1234
 """
 
+import bz2
+from contextlib import contextmanager, ExitStack
+import csv
 from difflib import SequenceMatcher
+import gzip
+import hashlib
+import heapq
+import importlib.util
+import io
+import lzma
 import os
+import threading
+import zipfile
 import pandas as pd
 import numpy as np
 
+#bump when the parsed tables change, so older cache entries are ignored
+PARSED_CACHE_VERSION = 1
+PARSED_CACHE_BYTES = 1 << 30
+
 class FED3_File():
     """Class used by FED3 Viz to .csv and .xlsx FED3 Files"""
-    def __init__(self,directory):
+    fixed_names = ['Device_Number',
+                   'Battery_Voltage',
+                   'Motor_Turns',
+                   'Session_Type',
+                   'Event',
+                   'Active_Poke',
+                   'Left_Poke_Count',
+                   'Right_Poke_Count',
+                   'Pellet_Count',
+                   'Retrieval_Time',]
+    needed_names = ['Pellet_Count',
+                    'Left_Poke_Count',
+                    'Right_Poke_Count',]
+    derived_names = ['Elapsed_Time',
+                     'Binary_Pellets',
+                     'Interpellet_Intervals',
+                     'Binary_Left_Pokes',
+                     'Binary_Right_Pokes',
+                     'Correct_Poke',]
+    counter_names = ['Left_Poke_Count',
+                     'Right_Poke_Count',
+                     'Pellet_Count',
+                     'Motor_Turns',]
+    pyramid_levels = ['1T', '5T', '15T', '1H']
+    #plots are computed in worker threads, which may share files
+    pyramid_lock = threading.RLock()
+
+    def __init__(self,directory,cache_dir=None):
         """
         Reads FED3 data, adds variables, and assigns attributes
         based on recording.  Will fail if there are no logged rows.
@@ -21,7 +63,12 @@ class FED3_File():
         Parameters
         ----------
         directory : str
-            Path to the FED3 file (.csv or .xlsx)
+            Path to the FED3 file (.csv or .xlsx).  May be compressed
+            (.gz, .bz2, .xz, .zst) or a member of a zip archive (see
+            open_fed_file()).
+        cache_dir : str, optional
+            Folder of parsed-file cache (see read_fed_table()).  The
+            default is None (no caching).
 
         Raises
         ------
@@ -30,32 +77,12 @@ class FED3_File():
             occurs if the file is not tabular or if it is missing the
             FED3 "MM:DD:YYYY hh:mm:ss" column.
         """
-        self.directory = os.path.abspath(directory).replace('\\','/')
-        self.fixed_names = ['Device_Number',
-                            'Battery_Voltage',
-                            'Motor_Turns',
-                            'Session_Type',
-                            'Event',
-                            'Active_Poke',
-                            'Left_Poke_Count',
-                            'Right_Poke_Count',
-                            'Pellet_Count',
-                            'Retrieval_Time',]
-        self.needed_names = ['Pellet_Count',
-                             'Left_Poke_Count',
-                             'Right_Poke_Count',]
-
-        self.basename = os.path.basename(directory)
-        splitext = os.path.splitext(self.basename)
-        self.filename = splitext[0]
-        self.extension = splitext[1].lower()
+        self.set_directory(directory)
         self.foreign_columns=[]
         try:
-            read_opts = {'.csv':pd.read_csv, '.xlsx':pd.read_excel}
-            func = read_opts[self.extension]
-            self.data = func(directory,
-                                parse_dates=True,
-                                index_col='MM:DD:YYYY hh:mm:ss')
+            raw, self.fingerprint = read_and_fingerprint(directory)
+            self.data = read_fed_table(raw, self.extension,
+                                       self.fingerprint, cache_dir)
             for column in self.data.columns:
                 for name in self.fixed_names:
                     likeness = SequenceMatcher(a=column, b=name).ratio()
@@ -65,6 +92,91 @@ class FED3_File():
                     self.foreign_columns.append(column)
         except Exception as e:
             raise e
+        self.process_data()
+
+    @classmethod
+    def from_dataframe(cls, data, directory=None, name=None):
+        """
+        Creates a FED3_File from data already in memory (e.g. the output of
+        fed_concat()), rather than reading a file.
+
+        Parameters
+        ----------
+        data : pandas.DataFrame
+            FED3 data indexed by time, with the default FED3 column names
+        directory : str or None, optional
+            Path the data were saved to, or None (the default) when they
+            are only in memory
+        name : str, optional
+            Name of a file only in memory (its basename and filename), used
+            when directory is None.  The default is None.
+
+        Returns
+        -------
+        FED3_File
+        """
+        fed = cls.__new__(cls)
+        fed.set_directory(directory, name)
+        fed.foreign_columns = []
+        hashed = pd.util.hash_pandas_object(data).values
+        fed.fingerprint = hashlib.blake2b(hashed.tobytes(), digest_size=8).hexdigest()
+        fed.data = data
+        fed.process_data()
+        return fed
+
+    @classmethod
+    def from_processed(cls, data, attributes, start_time=None):
+        """
+        Recreates a FED3_File from data which was already processed (e.g.
+        read back from an experiment store), without deriving its columns
+        again.  The times and number of events are taken from the data.
+
+        Parameters
+        ----------
+        data : pandas.DataFrame
+            Processed FED3 data (including the derived columns)
+        attributes : dict
+            Other attributes of the file (directory, basename, filename,
+            extension, fingerprint, foreign_columns, missing_columns, mode,
+            group)
+        start_time : datetime-like, optional
+            Start of the recording, which the derived columns (e.g.
+            Elapsed_Time) are relative to, when data is only the later part
+            of it.  The default is None (the first time of data).
+
+        Returns
+        -------
+        FED3_File
+        """
+        fed = cls.__new__(cls)
+        fed.__dict__.update(attributes)
+        fed.data = data
+        fed.events = len(data.index)
+        fed.end_time = pd.Timestamp(data.index.values[-1])
+        if start_time is None:
+            start_time = data.index.values[0]
+        fed.start_time = pd.Timestamp(start_time)
+        fed.duration = fed.end_time-fed.start_time
+        fed.compact_data()
+        return fed
+
+    def set_directory(self, directory, name=None):
+        """Set the path and name attributes for the file.  Files only in
+        memory have no directory (None) and are named by name."""
+        if directory is None:
+            self.directory = None
+            self.basename = self.filename = name
+            self.extension = ''
+            return
+        self.directory = os.path.abspath(directory).replace('\\','/')
+        self.basename = os.path.basename(directory)
+        splitext = os.path.splitext(strip_compression(self.basename))
+        self.filename = splitext[0]
+        self.extension = splitext[1].lower()
+
+    def process_data(self):
+        """Assign attributes based on the recording, and add the derived
+        columns (Elapsed_Time, Binary_Pellets, etc.) to the data."""
         self.missing_columns = [name for name in self.needed_names if
                                 name not in self.data.columns]
         self.events = len(self.data.index)
@@ -79,18 +191,19 @@ class FED3_File():
         self.handle_retrieval_time()
         self.handle_poke_time()
         self.mode = self.determine_mode()
+        self.compact_data()
         self.group = []
 
     def __repr__(self):
         """Shows the directory used to make the file."""
+        if self.directory is None:
+            return 'FED3_File(<in memory: ' + self.basename + '>)'
         return 'FED3_File("' + self.directory + '")'
 
     def add_elapsed_time(self):
         """pandas Timedelta relative to starting point for each row.
         Stored in new Elapsed_Time column"""
-        events = self.data.index
-        elapsed_times = [event - self.start_time for event in events]
-        self.data['Elapsed_Time'] = elapsed_times
+        self.data['Elapsed_Time'] = self.data.index - self.start_time
 
     def add_binary_pellet_count(self):
         """Convert cumulative pellet count to binary value for each row.
@@ -141,37 +254,34 @@ class FED3_File():
         df['Binary_Right_Pokes'] = df['Right_Poke_Count'].diff()
         df.iloc[0,df.columns.get_loc('Binary_Left_Pokes')] = df['Left_Poke_Count'][0]
         df.iloc[0,df.columns.get_loc('Binary_Right_Pokes')] = df['Right_Poke_Count'][0]
-        df['Correct_Poke'] = df.apply(lambda row: self.is_correct_poke(row), axis=1)
-        df['Correct_Poke'] = df['Correct_Poke'].astype(float)
-
-    def is_correct_poke(self,row):
-        """For each poke event against the active poke column to verify correctness."""
-        try:
-            if row['Event'] == 'Poke':
-                return (row['Active_Poke'] == 'Left' and row['Binary_Left_Pokes'] == 1 or
-                        row['Active_Poke'] == 'Right' and row['Binary_Right_Pokes'] )
-            else:
-                return np.nan
-        except:
-            return np.nan
+        if 'Active_Poke' not in df.columns:
+            df['Correct_Poke'] = np.nan
+            return
+        #a poke is correct if it was on the active side; for the right side
+        #this takes the value of Binary_Right_Pokes (as logged)
+        active = df['Active_Poke']
+        left = (active == 'Left') & (df['Binary_Left_Pokes'] == 1)
+        right = np.where(active == 'Right', df['Binary_Right_Pokes'], 0.0)
+        correct = np.where(left, 1.0, right)
+        df['Correct_Poke'] = np.where(df['Event'] == 'Poke', correct, np.nan)
 
     def determine_mode(self):
         """Find the recording mode of the file.  Returns the mode as a string."""
         mode = 'Unknown'
-        column = pd.Series()
+        column = pd.Series(dtype=object)
         for name in ['FR','FR_Ratio',' FR_Ratio','Mode','Session_Type']:
             if name in self.data.columns:
                 column = self.data[name]
         if not column.empty:
-            if all(isinstance(i,int) for i in column):
-                if len(set(column)) == 1:
-                    mode = 'FR' + str(column[0])
+            if pd.api.types.infer_dtype(column, skipna=False) == 'integer':
+                if column.nunique() == 1:
+                    mode = 'FR' + str(column.iloc[0])
                 else:
                     mode = 'PR'
-            elif 'PR' in column[0]:
+            elif 'PR' in str(column.iloc[0]):
                 mode = 'PR'
             else:
-                mode = str(column[0])
+                mode = str(column.iloc[0])
         return mode
 
     def handle_retrieval_time(self):
@@ -193,17 +303,757 @@ class FED3_File():
         counts.  Catches some errors with improper event logging.  Weekly tries
         and exits if errors encountered."""
         try:
-            events = ["Pellet" if v else 'Poke' for v in self.data['Binary_Pellets']]
-            self.data['Event'] = events
+            self.data['Event'] = np.where(self.data['Binary_Pellets'], 'Pellet', 'Poke')
         except:
             pass
 
+    def compact_data(self):
+        """Convert the data to compact dtypes: low-cardinality strings
+        (Event, Active_Poke, ...) become categoricals, integer columns use
+        the narrowest type which fits (at least int32 for the counters, which
+        are used in arithmetic), and all-NaN placeholder columns (e.g.
+        Poke_Time for older files) are stored as sparse."""
+        df = self.data
+        for column in df.columns:
+            values = df[column]
+            if values.dtype == object:
+                if values.nunique() <= len(values) // 2:
+                    df[column] = values.astype('category')
+            elif pd.api.types.is_integer_dtype(values.dtype):
+                narrow = pd.to_numeric(values, downcast='integer')
+                if column in self.counter_names:
+                    narrow = narrow.astype(np.promote_types(narrow.dtype, np.int32))
+                df[column] = narrow
+            elif pd.api.types.is_float_dtype(values.dtype) and values.isna().all():
+                df[column] = values.astype(pd.SparseDtype(float, np.nan))
+
+    def memory_usage(self):
+        """Bytes of memory used by the data."""
+        return int(self.data.memory_usage(deep=True).sum())
+
+    def __getstate__(self):
+        """Leave the pyramid out of pickles (it is rebuilt when needed)."""
+        state = self.__dict__.copy()
+        state.pop('pyramid', None)
+        return state
+
+    def get_pyramid(self, level='1T'):
+        """
+        Returns the aggregates of the data (see aggregate_rows()) at one
+        level of the pyramid.  Levels are built on first use, each by summing
+        the next finer level (the finest, 1 minute, from the rows); building
+        holds FED3_File.pyramid_lock, so threads don't build them twice.
+
+        Parameters
+        ----------
+        level : str, optional
+            One of FED3_File.pyramid_levels. The default is '1T'.
+
+        Returns
+        -------
+        pandas.DataFrame
+        """
+        pyramid = getattr(self, 'pyramid', {})
+        if level in pyramid:
+            return pyramid[level]
+        with self.pyramid_lock:
+            if not hasattr(self, 'pyramid'):
+                self.pyramid = {}
+            if level not in self.pyramid:
+                i = self.pyramid_levels.index(level)
+                if i == 0:
+                    self.pyramid[level] = aggregate_rows(self.data, level)
+                else:
+                    finer = self.get_pyramid(self.pyramid_levels[i-1])
+                    self.pyramid[level] = finer.resample(level).sum()
+            return self.pyramid[level]
+
+    def binned(self, freq, start=None, end=None, trim='Rows'):
+        """
+        Sums the pyramid aggregates into bins of freq, giving the same bins
+        as resampling the rows (within start and end, inclusive) would,
+        without touching the rows.
+
+        Parameters
+        ----------
+        freq : str
+            Bin size (a pandas offset alias)
+        start, end : datetime-like, optional
+            Only use data within these times (like the date filter). The
+            default is None.
+        trim : str, optional
+            Aggregate column used to find the first and last bins: bins
+            span the first to last cell where it is nonzero.  The default
+            is 'Rows' (the first and last row of data).
+
+        Returns
+        -------
+        pandas.DataFrame or None
+            Summed aggregates for each bin; None when freq is not a whole
+            multiple of a pyramid level (or start/end fall within a level),
+            in which case the rows have to be binned instead.
+        """
+        try:
+            nanos = pd.tseries.frequencies.to_offset(freq).nanos
+        except ValueError: #calendar offsets (months, etc.)
+            return None
+        level = None
+        for candidate in self.pyramid_levels:
+            step = pd.Timedelta(candidate)
+            if nanos % step.value:
+                continue
+            if any(bound is not None and pd.Timestamp(bound).floor(step) != bound
+                   for bound in (start, end)):
+                continue
+            level = candidate
+        if level is None:
+            return None
+        cells = self.get_pyramid(level)
+        if start is not None:
+            cells = cells[cells.index >= start]
+        if end is not None:
+            #the cell starting at end only counts its rows logged at end
+            cells = cells[cells.index < end]
+            at_end = self.data[self.data.index == end]
+            if not at_end.empty:
+                cells = pd.concat([cells, aggregate_rows(at_end, level)])
+        present = np.flatnonzero(cells[trim].values)
+        if not len(present):
+            return cells.iloc[:0]
+        cells = cells.iloc[present[0]:present[-1]+1].resample(freq).sum()
+        cells.index.name = self.data.index.name
+        return cells
+
     def handle_poke_time(self):
         """Creates a dummy poke time column if one hasn't been created (newer
         FED feature as of Fall 2020."""
         if 'Poke_Time' not in self.data.columns:
             self.data['Poke_Time'] = np.nan
 
+def aggregate_rows(data, level):
+    """
+    Sums FED3 data into cells of a fixed time (the base of the pyramid of
+    FED3_File.get_pyramid()).  See row_aggregates() for the columns.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame
+        Data of a FED3_File
+    level : str
+        Cell size (a pandas offset alias)
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    return row_aggregates(data).resample(level).sum()
+
+def row_aggregates(data):
+    """
+    Converts each row of FED3 data to summable values: the number of rows
+    (1), pellets, left & right pokes, pokes with a known side (correct &
+    errors), and the sums & counts of interpellet intervals and retrieval
+    times.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame
+        Data of a FED3_File
+
+    Returns
+    -------
+    pandas.DataFrame
+        Same index as data
+    """
+    def values(column):
+        if column not in data.columns:
+            return np.full(len(data), np.nan)
+        return np.asarray(data[column], dtype=float)
+    correct = values('Correct_Poke')
+    ipi = values('Interpellet_Intervals')
+    retrieval = values('Retrieval_Time')
+    cells = pd.DataFrame({'Rows': np.ones(len(data), dtype=np.int64),
+                          'Pellets': np.nan_to_num(values('Binary_Pellets')),
+                          'Left_Pokes': np.nan_to_num(values('Binary_Left_Pokes')),
+                          'Right_Pokes': np.nan_to_num(values('Binary_Right_Pokes')),
+                          'Pokes': (~np.isnan(correct)).astype(np.int64),
+                          'Correct': (correct == 1).astype(np.int64),
+                          'Errors': (correct == 0).astype(np.int64),
+                          'IPI_Sum': np.nan_to_num(ipi),
+                          'IPI_Count': (~np.isnan(ipi)).astype(np.int64),
+                          'Retrieval_Sum': np.nan_to_num(retrieval),
+                          'Retrieval_Count': (~np.isnan(retrieval)).astype(np.int64),},
+                         index=data.index)
+    return cells
+
+def read_and_fingerprint(path, chunk_size=1<<20):
+    """
+    Reads a file once, hashing its bytes while they are read.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file
+    chunk_size : int, optional
+        Number of bytes read at a time. The default is 1 MiB.
+
+    Returns
+    -------
+    buffer : io.BytesIO
+        The file contents, positioned at the start (for parsing)
+    fingerprint : str
+        16 character hex digest (64-bit BLAKE2b) of the file contents
+    """
+    buffer = io.BytesIO()
+    digest = hashlib.blake2b(digest_size=8)
+    with open_fed_file(path) as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+            buffer.write(chunk)
+    buffer.seek(0)
+    return buffer, digest.hexdigest()
+
+def strip_compression(name):
+    """Removes a compression extension (.gz, .bz2, .xz, .zst) from a name."""
+    root, ext = os.path.splitext(name)
+    if ext.lower() in ['.gz', '.bz2', '.xz', '.zst']:
+        return root
+    return name
+
+def fed_file_extension(path):
+    """The data extension of a file (e.g. ".csv" for "log.csv.gz")."""
+    return os.path.splitext(strip_compression(path))[1].lower()
+
+def split_archive_path(path):
+    """
+    Splits a path to a member of a zip archive (e.g. "cohort.zip/FED1.csv")
+    into the archive and member names.  Returns None for other paths.
+    """
+    parts = path.replace('\\', '/').split('/')
+    for i in range(1, len(parts)):
+        archive = '/'.join(parts[:i])
+        if archive.lower().endswith('.zip') and os.path.isfile(archive):
+            return archive, '/'.join(parts[i:])
+    return None
+
+@contextmanager
+def open_fed_file(path):
+    """
+    Opens a FED3 file for reading bytes, decompressing gzip, bz2, xz or
+    zstandard (requires the zstandard package) files while streaming, and
+    reading members of zip archives directly (see split_archive_path()).
+
+    Parameters
+    ----------
+    path : str
+        Path to the file, or to a member of a zip archive
+
+    Yields
+    ------
+    file-like
+        Binary stream of the (uncompressed) file contents
+    """
+    with ExitStack() as stack:
+        archive = split_archive_path(path)
+        if archive:
+            zipped = stack.enter_context(zipfile.ZipFile(archive[0]))
+            f = stack.enter_context(zipped.open(archive[1]))
+        else:
+            f = stack.enter_context(open(path, 'rb'))
+        ext = os.path.splitext(path)[1].lower()
+        if ext == '.gz':
+            f = stack.enter_context(gzip.GzipFile(fileobj=f))
+        elif ext == '.bz2':
+            f = stack.enter_context(bz2.BZ2File(f))
+        elif ext == '.xz':
+            f = stack.enter_context(lzma.LZMAFile(f))
+        elif ext == '.zst':
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError('reading .zst files requires the zstandard package')
+            f = stack.enter_context(zstandard.ZstdDecompressor().stream_reader(f))
+        yield f
+
+def list_archive_members(path):
+    """
+    Lists the members of a zip archive which could be FED3 files, as paths
+    usable by FED3_File (e.g. "cohort.zip/FED1.csv").
+
+    Parameters
+    ----------
+    path : str
+        Path to the zip archive
+
+    Returns
+    -------
+    list
+    """
+    with zipfile.ZipFile(path) as zipped:
+        names = zipped.namelist()
+    return [path + '/' + name for name in names if not name.endswith('/')
+            and fed_file_extension(name) in ['.csv', '.xlsx']]
+
+def expand_archives(paths):
+    """Replaces any zip archives in a list of paths with their members."""
+    output = []
+    for path in paths:
+        if path.lower().endswith('.zip') and os.path.isfile(path):
+            try:
+                output += list_archive_members(path)
+            except (OSError, zipfile.BadZipFile):
+                output.append(path)
+        else:
+            output.append(path)
+    return output
+
+def read_fed_table(buffer, extension, fingerprint=None, cache_dir=None):
+    """
+    Parses the raw contents of a FED3 file into a DataFrame indexed by
+    the "MM:DD:YYYY hh:mm:ss" column.  When a cache folder is given, the
+    parsed table is pickled there under the file's fingerprint (plus the
+    cache format and pandas versions), and an unchanged file is read back
+    from the cache rather than parsed again.  Only files written by this
+    function are unpickled; the cache is kept under PARSED_CACHE_BYTES
+    (see evict_parsed_cache()).
+
+    Parameters
+    ----------
+    buffer : file-like
+        Contents of the file (see read_and_fingerprint())
+    extension : str
+        ".csv" or ".xlsx"
+    fingerprint : str, optional
+        Content fingerprint of the file. The default is None.
+    cache_dir : str, optional
+        Folder of the parsed-file cache. The default is None (no caching).
+
+    Raises
+    ------
+    ValueError
+        The extension is not supported.
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    cache_path = None
+    if cache_dir and fingerprint:
+        cache_name = '{}-v{}-pandas{}.pkl'.format(fingerprint, PARSED_CACHE_VERSION,
+                                                   pd.__version__)
+        cache_path = os.path.join(cache_dir, cache_name)
+        if os.path.exists(cache_path):
+            try:
+                data = pd.read_pickle(cache_path)
+                os.utime(cache_path) #mark as recently used
+                return data
+            except Exception:
+                pass
+    if extension == '.csv':
+        data = pd.read_csv(buffer, parse_dates=True,
+                           index_col='MM:DD:YYYY hh:mm:ss')
+    elif extension == '.xlsx':
+        data = read_xlsx(buffer)
+    else:
+        raise ValueError('Unsupported file type: ' + extension)
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            data.to_pickle(cache_path)
+            evict_parsed_cache(cache_dir)
+        except OSError:
+            pass
+    return data
+
+def evict_parsed_cache(cache_dir, max_bytes=PARSED_CACHE_BYTES):
+    """
+    Deletes the least recently used files of the parsed-file cache (see
+    read_fed_table()) until it is no larger than max_bytes.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Folder of the parsed-file cache
+    max_bytes : int, optional
+        Size limit of the cache. The default is PARSED_CACHE_BYTES.
+
+    Returns
+    -------
+    None.
+    """
+    entries = []
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.endswith('.pkl'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def read_xlsx(buffer):
+    """
+    Reads the first sheet of a FED3 .xlsx file.  Uses the calamine engine
+    when python-calamine is installed (and pandas supports it); otherwise
+    streams rows with openpyxl in read-only mode, keeping only the columns
+    with a header and skipping empty rows.  Values are converted with the
+    same parser pandas uses for read_excel, so the output matches it.
+    Without openpyxl, the file is read with pandas.read_excel and its
+    default engine (xlrd, for older pandas).
+
+    Parameters
+    ----------
+    buffer : file-like or str
+        Contents of (or path to) the .xlsx file
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    if importlib.util.find_spec('python_calamine'):
+        try:
+            return pd.read_excel(buffer, engine='calamine', parse_dates=True,
+                                 index_col='MM:DD:YYYY hh:mm:ss')
+        except ValueError: #pandas too old for the engine
+            if hasattr(buffer, 'seek'):
+                buffer.seek(0)
+    if not importlib.util.find_spec('openpyxl'):
+        return pd.read_excel(buffer, parse_dates=True,
+                             index_col='MM:DD:YYYY hh:mm:ss')
+    import openpyxl
+    from pandas.io.parsers import TextParser
+    book = openpyxl.load_workbook(buffer, read_only=True, data_only=True)
+    try:
+        rows = book.worksheets[0].iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        while header and header[-1] is None:
+            header.pop()
+        width = len(header)
+        records = [header]
+        for row in rows:
+            row = list(row[:width])
+            if any(value is not None for value in row):
+                records.append(row)
+    finally:
+        book.close()
+    return TextParser(records, header=0, parse_dates=True,
+                      index_col='MM:DD:YYYY hh:mm:ss').read()
+
+def file_fingerprint(path, chunk_size=1<<20):
+    """
+    Computes the content fingerprint of a file without parsing it; matches
+    the fingerprint attribute of a FED3_File loaded from the same bytes.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file
+    chunk_size : int, optional
+        Number of bytes read at a time. The default is 1 MiB.
+
+    Returns
+    -------
+    str
+        16 character hex digest (64-bit BLAKE2b) of the file contents
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    with open_fed_file(path) as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def parse_header_line(line):
+    """Splits the raw (bytes) first line of a .csv into column names."""
+    text = line.decode('utf-8-sig', 'replace').strip()
+    return next(csv.reader([text]), [])
+
+def classify_header(names):
+    """
+    Sorts a file by its column names, matching them the same way FED3_File
+    does when loading.
+
+    Parameters
+    ----------
+    names : list
+        Column names of the file
+
+    Returns
+    -------
+    str
+        "reject" if there is no "MM:DD:YYYY hh:mm:ss" column (the file can't
+        be loaded), "weird" if any of the counter columns
+        (FED3_File.needed_names) are missing (the file loads, but some plots
+        won't work), otherwise "accept"
+    """
+    if 'MM:DD:YYYY hh:mm:ss' not in names:
+        return 'reject'
+    found = set()
+    for column in names:
+        for name in FED3_File.fixed_names:
+            if SequenceMatcher(a=column, b=name).ratio() > 0.85:
+                found.add(name)
+                break
+    if all(name in found for name in FED3_File.needed_names):
+        return 'accept'
+    return 'weird'
+
+def sniff_header(path):
+    """
+    Reads only the first line (.csv) or first row (.xlsx) of a file to
+    decide whether it is FED3 data, before any full parse.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file
+
+    Returns
+    -------
+    str
+        "accept", "weird", or "reject" (see classify_header()).  Files
+        with other extensions, or which can't be read, are rejected.  If
+        openpyxl isn't available, .xlsx files are accepted (and left to
+        the full parse).
+
+    Raises
+    ------
+    ImportError
+        A package needed to decompress the file (zstandard) is missing
+    """
+    extension = fed_file_extension(path)
+    try:
+        if extension == '.csv':
+            with open_fed_file(path) as f:
+                names = parse_header_line(f.read(1<<16).split(b'\n')[0])
+        elif extension == '.xlsx':
+            try:
+                import openpyxl
+            except ImportError:
+                return 'accept'
+            with open_fed_file(path) as f:
+                contents = io.BytesIO(f.read())
+            book = openpyxl.load_workbook(contents, read_only=True)
+            try:
+                row = next(book.worksheets[0].iter_rows(max_row=1,
+                                                        values_only=True), ())
+            finally:
+                book.close()
+            names = [str(name) for name in row if name is not None]
+        else:
+            return 'reject'
+    except ImportError:
+        raise
+    except Exception:
+        return 'reject'
+    return classify_header(names)
+
+def sniff_fed_file(path, chunk_size=1<<20):
+    """
+    Cheaply inspects a FED3 .csv file without parsing it: reads the header,
+    the first and last logged rows, and counts lines.  For .xlsx files only
+    the header is checked; other values are returned as unknown.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file
+    chunk_size : int, optional
+        Number of bytes read at a time. The default is 1 MiB.
+
+    Returns
+    -------
+    dict
+        Keys are "valid" (True/False, or None if unknown), "device" (str),
+        "start_time" and "end_time" (pandas Timestamps) and "events" (int).
+        Unknown values are None.
+    """
+    info = {'valid':None, 'device':None, 'start_time':None,
+            'end_time':None, 'events':None}
+    if fed_file_extension(path) != '.csv':
+        if fed_file_extension(path) == '.xlsx':
+            info['valid'] = sniff_header(path) != 'reject'
+        return info
+    newlines = 0
+    head = tail = b''
+    ended = True
+    with open_fed_file(path) as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            if head.count(b'\n') < 2:
+                head += chunk
+            newlines += chunk.count(b'\n')
+            tail = (tail + chunk)[-chunk_size:]
+            ended = chunk.endswith(b'\n')
+    lines = newlines + (0 if ended else 1)
+    tail_lines = tail.splitlines()
+    while tail_lines and not tail_lines[-1].strip():
+        tail_lines.pop()
+        lines -= 1
+    head_lines = head.splitlines()
+    header = head_lines[0] if head_lines else b''
+    first = head_lines[1] if len(head_lines) > 1 else b''
+    last = tail_lines[-1] if tail_lines else b''
+    names = parse_header_line(header)
+    if classify_header(names) == 'reject':
+        info['valid'] = False
+        return info
+    time_col = names.index('MM:DD:YYYY hh:mm:ss')
+    stripped = [name.strip() for name in names]
+    try:
+        first_row = first.decode('utf-8', 'replace').strip().split(',')
+        last_row = last.decode('utf-8', 'replace').strip().split(',')
+        info['start_time'] = pd.Timestamp(first_row[time_col])
+        info['end_time'] = pd.Timestamp(last_row[time_col])
+        if 'Device_Number' in stripped:
+            info['device'] = first_row[stripped.index('Device_Number')].strip()
+    except Exception:
+        info['valid'] = False
+        return info
+    info['events'] = lines - 1
+    info['valid'] = info['events'] > 0
+    return info
+
+def fed_intervals(feds):
+    """Returns the (start_time, end_time) of each FED3_File."""
+    return [(fed.start_time, fed.end_time) for fed in feds]
+
+def common_overlap(intervals):
+    """
+    Finds the window shared by all intervals (the latest start to the
+    earliest end).
+
+    Parameters
+    ----------
+    intervals : list
+        (start, end) pairs
+
+    Returns
+    -------
+    tuple or None
+        (latest start, earliest end), or None if there is no time covered
+        by every interval
+
+    """
+    if not intervals:
+        return None
+    latest_start = max(start for start, end in intervals)
+    earliest_end = min(end for start, end in intervals)
+    if earliest_end < latest_start:
+        return None
+    return latest_start, earliest_end
+
+def overlapping_pairs(intervals):
+    """
+    Finds all pairs of intervals which overlap (or touch), with a sweep over
+    the intervals sorted by start.  Runs in O(n log n + k) for k pairs.
+
+    Parameters
+    ----------
+    intervals : list
+        (start, end) pairs
+
+    Returns
+    -------
+    list
+        (i, j) indices into intervals (i < j) of each overlapping pair
+
+    """
+    order = sorted(range(len(intervals)), key=lambda i: intervals[i][0])
+    active = [] #heap of (end, index) of intervals started so far
+    pairs = []
+    for i in order:
+        start, end = intervals[i]
+        while active and active[0][0] < start:
+            heapq.heappop(active)
+        pairs += [tuple(sorted((i, j))) for _, j in active]
+        heapq.heappush(active, (end, i))
+    return sorted(pairs)
+
+def interval_gaps(intervals):
+    """
+    Finds the periods between the first start and the last end which are
+    not covered by any interval.
+
+    Parameters
+    ----------
+    intervals : list
+        (start, end) pairs
+
+    Returns
+    -------
+    list
+        (gap start, gap end) pairs, in order
+
+    """
+    gaps = []
+    covered_until = None
+    for start, end in sorted(intervals):
+        if covered_until is not None and start > covered_until:
+            gaps.append((covered_until, start))
+        if covered_until is None or end > covered_until:
+            covered_until = end
+    return gaps
+
+def interval_coverage(intervals):
+    """
+    Counts how many intervals are active over time, by sweeping over the
+    sorted start (+1) and end (-1) events.
+
+    Parameters
+    ----------
+    intervals : list
+        (start, end) pairs
+
+    Returns
+    -------
+    pandas.Series
+        Step function: the number of active intervals from each index time
+        until the next one (0 after the last end)
+
+    """
+    if not intervals:
+        return pd.Series(dtype=int)
+    starts, ends = zip(*intervals)
+    events = pd.Series(np.concatenate([np.ones(len(starts), dtype=int),
+                                       -np.ones(len(ends), dtype=int)]),
+                       index=pd.DatetimeIndex(list(starts) + list(ends)))
+    #events at the same time are combined
+    events = events.groupby(level=0).sum().sort_index()
+    return events.cumsum()
+
+def busiest_window(intervals):
+    """
+    Finds the longest period covered by the most intervals; this is the
+    common_overlap() when one exists.
+
+    Parameters
+    ----------
+    intervals : list
+        (start, end) pairs
+
+    Returns
+    -------
+    tuple or None
+        (start, end) of the window, or None if intervals is empty
+
+    """
+    coverage = interval_coverage(intervals)
+    if coverage.empty:
+        return None
+    window = common_overlap(intervals)
+    if window is not None:
+        return window
+    most = coverage.max()
+    times = coverage.index
+    windows = [(times[i], times[i+1]) for i in np.flatnonzero(coverage.values == most)
+               if i + 1 < len(times)]
+    return max(windows, key=lambda w: w[1] - w[0])
+
 class FedCannotConcat(Exception):
     """Error when FEDs can't be concatendated"""
     pass
@@ -223,17 +1073,15 @@ def is_concatable(feds):
     bool
 
     """
-    sorted_feds = sorted(feds, key=lambda x: x.start_time)
-    for i, file in enumerate(sorted_feds[1:], start=1):
-        if file.start_time <= sorted_feds[i-1].end_time:
-            return False
-    return True
+    return not overlapping_pairs(fed_intervals(feds))
 
 def fed_concat(feds):
     """
     Concatenates the data of multiple FED3_Files into a single DataFrame.
-    It will only contain the default FED3 columns, but loading it into
-    FED3 Viz can generate additional columns and metrics.
+    It will only contain the default FED3 columns (derived columns are
+    left out); pass it to FED3_File.from_dataframe() to generate additional
+    columns and metrics.  The cumulative counters of each file are offset
+    by the sum of the maximums of the files before it.
 
     Parameters
     ----------
@@ -247,24 +1095,20 @@ def fed_concat(feds):
     """
     if not is_concatable(feds):
         raise FedCannotConcat('FED file dates overlap, cannot concat')
-    output=[]
-    offsets = {}
     sorted_feds = sorted(feds, key=lambda x: x.start_time)
-    for i, fed in enumerate(sorted_feds):
-        df = fed.data.copy()
-        if i==0:
-            df['Concat_#'] = i
-            output.append(df)
-            for col in['Pellet_Count', 'Left_Poke_Count','Right_Poke_Count']:
-                if col in df.columns:
-                    offsets[col] = df[col].max()
-        else:
-            df['Concat_#'] = i
-            for name, offset in offsets.items():
-                df[name] += offset
-                offsets[name] = df[name].max()
-            output.append(df)
-    output = pd.concat(output)
+    output = pd.concat([fed.data.drop(columns=FED3_File.derived_names,
+                                      errors='ignore')
+                        for fed in sorted_feds], copy=False)
+    sizes = [len(fed.data) for fed in sorted_feds]
+    output['Concat_#'] = np.repeat(np.arange(len(sorted_feds)), sizes)
+    for col in ['Pellet_Count', 'Left_Poke_Count','Right_Poke_Count']:
+        if col in sorted_feds[0].data.columns:
+            #each file is offset by the running total of the previous maximums
+            maxes = output[col].groupby(output['Concat_#'].values).max()
+            offsets = maxes.cumsum().shift(1, fill_value=0)
+            #compacted counters can be int32; upcast before offsetting
+            values = output[col].astype(np.promote_types(output[col].dtype, np.int64))
+            output[col] = values + offsets.values[output['Concat_#'].values]
     if len(set([i.mode for i in feds])) == 1:
         output.loc[:,'Mode'] = feds[0].mode
     return output
\ No newline at end of file
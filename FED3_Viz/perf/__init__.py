@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""
+Timing and memory instrumentation of FED3 Viz.
+
+@author: https://github.com/earnestt1234
+"""
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Named spans timing the stages of FED3 Viz (load -> derive -> aggregate ->
+render), with the change in the process' resident memory over each span.
+Finished spans go to a ring buffer (SPANS) and can be exported as JSON or
+in the Chrome trace format (open in chrome://tracing or ui.perfetto.dev).
+
+Spans nest: each records its own ("self") time, excluding the spans
+started inside it, so the categories show where a slow plot spends time:
+
+- load: reading a FED3_File (FED3_File, fed_concat)
+- parse: turning the file into a table (read_fed_table, read_xlsx)
+- derive: each FED3_File step adding columns (add_*, compact_data...)
+- aggregate: binning FED3_File data (get_pyramid)
+- getdata: computing plot data (getdata.*, fed_summary)
+- plot: plotting functions drawing on their axes (plots.*), including
+  their own tight_layout
+- render: drawing and saving figures (export_plot, render_plot and the
+  "draw" and "savefig" spans inside them and around the GUI's draws)
+
+The functions are not decorated in their modules (the "Plot Code" of
+fed_inspect shows their source); instrument() wraps them in place instead.
+Third-party classes are not patched: the draws and saves of figures are
+timed by span() blocks where FED3 Viz calls them.
+Nothing is recorded (and the wrappers only add a check) until recording
+is turned on:
+
+    from perf import perf
+    perf.instrument()
+    perf.recording = True
+    ...
+    perf.export_chrome_trace('trace.json')
+
+@author: https://github.com/earnestt1234
+"""
+import functools
+import inspect
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+SPANS = deque(maxlen=5000)
+
+CATEGORIES = ['load', 'parse', 'derive', 'aggregate', 'getdata', 'plot', 'render']
+
+recording = False
+origin = time.perf_counter()
+span_ids = itertools.count(1)
+local = threading.local()
+
+class Span():
+    """A finished span (times are seconds from perf.origin)."""
+    __slots__ = ['id', 'parent', 'name', 'category', 'start', 'duration',
+                 'self_time', 'rss_delta', 'thread', 'depth']
+
+    def __init__(self, **kwargs):
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    def to_dict(self):
+        return {'id': self.id, 'parent': self.parent, 'name': self.name,
+                'category': self.category, 'depth': self.depth,
+                'thread': self.thread, 'start_ms': self.start * 1000,
+                'duration_ms': self.duration * 1000,
+                'self_ms': self.self_time * 1000,
+                'rss_delta_mb': (None if self.rss_delta is None else
+                                 self.rss_delta / 2**20)}
+
+def windows_rss():
+    import ctypes
+    from ctypes import wintypes
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD),
+                    ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t),
+                    ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t),
+                    ('PeakPagefileUsage', ctypes.c_size_t)]
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    get_info = ctypes.windll.kernel32.K32GetProcessMemoryInfo
+    get_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS),
+                         wintypes.DWORD]
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not get_info(process, ctypes.byref(counters), counters.cb):
+        return None
+    return counters.WorkingSetSize
+
+def current_rss():
+    """Resident memory of this process in bytes (via psutil, /proc on Linux
+    or the Windows API), or None if unknown."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        if sys.platform == 'win32':
+            return windows_rss()
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+@contextmanager
+def span(name, category='other'):
+    """
+    Times a block of code as a named span (nothing is recorded when
+    perf.recording is False).
+
+    Parameters
+    ----------
+    name : str
+        Name of the span
+    category : str, optional
+        One of CATEGORIES. The default is 'other'.
+    """
+    if not recording:
+        yield
+        return
+    stack = getattr(local, 'stack', None)
+    if stack is None:
+        stack = local.stack = []
+    #[id, time spent in child spans]
+    frame = [next(span_ids), 0.0]
+    parent = stack[-1][0] if stack else None
+    stack.append(frame)
+    rss = current_rss()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        stack.pop()
+        duration = end - start
+        if stack:
+            stack[-1][1] += duration
+        after = current_rss() if rss is not None else None
+        SPANS.append(Span(id=frame[0], parent=parent, name=name,
+                          category=category, start=start - origin,
+                          duration=duration, self_time=duration - frame[1],
+                          rss_delta=None if after is None else after - rss,
+                          thread=threading.current_thread().name,
+                          depth=len(stack)))
+
+def timed(func, name, category):
+    """Wraps a function to run in a span (see instrument())."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not recording:
+            return func(*args, **kwargs)
+        with span(name, category):
+            return func(*args, **kwargs)
+    wrapper.perf_span = name
+    return wrapper
+
+def instrument_attribute(owner, attribute, name, category):
+    """Replaces owner.attribute (a function or method) with a timed one."""
+    func = getattr(owner, attribute)
+    if not hasattr(func, 'perf_span'):
+        setattr(owner, attribute, timed(func, name, category))
+
+def data_functions(module):
+    """Names of the plotting functions of a module (taking "FED" or "FEDs"
+    first, and any settings as **kwargs)."""
+    output = []
+    for name, func in inspect.getmembers(module, inspect.isfunction):
+        if inspect.unwrap(func).__module__ != module.__name__:
+            continue
+        params = list(inspect.signature(inspect.unwrap(func)).parameters.values())
+        if (params and params[0].name in ['FED', 'FEDs'] and
+            params[-1].kind == inspect.Parameter.VAR_KEYWORD):
+            output.append(name)
+    return output
+
+def instrument():
+    """Times the stages of FED3 Viz: wraps the loading, deriving and
+    aggregating functions of load.load, and the getdata and plots
+    functions.  Calling it again does nothing."""
+    from getdata import getdata
+    from load import load
+    from plots import plots
+
+    FED3_File = load.FED3_File
+    instrument_attribute(FED3_File, '__init__', 'FED3_File', 'load')
+    instrument_attribute(FED3_File, 'from_dataframe', 'FED3_File.from_dataframe', 'load')
+    instrument_attribute(load, 'fed_concat', 'fed_concat', 'load')
+    instrument_attribute(load, 'read_fed_table', 'read_fed_table', 'parse')
+    instrument_attribute(load, 'read_xlsx', 'read_xlsx', 'parse')
+    for method in ['add_elapsed_time', 'add_binary_pellet_count',
+                   'reassign_events', 'add_interpellet_intervals',
+                   'add_correct_pokes', 'handle_retrieval_time',
+                   'handle_poke_time', 'determine_mode', 'compact_data']:
+        instrument_attribute(FED3_File, method, method, 'derive')
+    instrument_attribute(FED3_File, 'get_pyramid', 'get_pyramid', 'aggregate')
+    for name in data_functions(getdata):
+        instrument_attribute(getdata, name, 'getdata.' + name, 'getdata')
+    for name in data_functions(plots):
+        instrument_attribute(plots, name, 'plots.' + name, 'plot')
+    instrument_attribute(plots, 'fed_summary', 'fed_summary', 'getdata')
+    instrument_attribute(plots, 'export_plot', 'export_plot', 'render')
+    instrument_attribute(plots, 'render_plot', 'render_plot', 'render')
+
+def clear():
+    SPANS.clear()
+
+def category_totals(spans=None):
+    """Total self time (seconds) of each category of spans (default all
+    spans in the buffer)."""
+    totals = {}
+    for s in (SPANS if spans is None else spans):
+        totals[s.category] = totals.get(s.category, 0) + s.self_time
+    return totals
+
+def export_json(path, spans=None):
+    """Writes spans (default all in the buffer) as a JSON list."""
+    with open(path, 'w') as f:
+        json.dump([s.to_dict() for s in (list(SPANS) if spans is None else spans)],
+                  f, indent=1)
+
+def export_chrome_trace(path, spans=None):
+    """Writes spans (default all in the buffer) in the Chrome trace event
+    format."""
+    spans = list(SPANS) if spans is None else spans
+    threads = {}
+    events = []
+    for s in spans:
+        tid = threads.setdefault(s.thread, len(threads) + 1)
+        events.append({'name': s.name, 'cat': s.category, 'ph': 'X',
+                       'ts': s.start * 1e6, 'dur': s.duration * 1e6,
+                       'pid': os.getpid(), 'tid': tid,
+                       'args': {'self_ms': s.self_time * 1000,
+                                'rss_delta_mb': (None if s.rss_delta is None
+                                                 else s.rss_delta / 2**20)}})
+    for thread, tid in threads.items():
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(),
+                       'tid': tid, 'args': {'name': thread}})
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
@@ -6,22 +6,33 @@ shows it to the user when prompted with the "Plot Code" button.
 
 @author: https://github.com/earnestt1234
 """
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import datetime
+import multiprocessing
+import os
+import pickle
 
 import matplotlib as mpl
 import matplotlib.dates as mdates
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
 from matplotlib.ticker import AutoMinorLocator
 import numpy as np
 import pandas as pd
 from pandas.plotting import register_matplotlib_converters
-from scipy import stats
-import seaborn as sns
 
-from load.load import FED3_File
+from fedquery.fedquery import FedDatabase
+from load.load import FED3_File, common_overlap
+from perf import perf
 
 register_matplotlib_converters()
 
+#fed_summary() uses worker processes for files totalling this many rows
+#(starting them takes a couple of seconds, more than smaller jobs)
+SUMMARY_POOL_ROWS = 2000000
+
 #---ERROR HANDLING
 
 # class DateFilterError(Exception):
@@ -251,6 +262,34 @@ def shade_darkness(ax, min_date,max_date,lights_on,lights_off,
                            label='_'*i + 'lights off',
                            zorder=0)
 
+def data_intervals(FEDs, date_filter=None):
+    """
+    Returns the (first, last) timestamp of the data of each FED3_File,
+    optionally only counting data within a date filter.  Files with no
+    data (within the filter) have no interval and are left out.
+
+    Parameters
+    ----------
+    FEDs : list
+        FED3_File objects
+    date_filter : tuple, optional
+        (start, end) datetimes. The default is None.
+
+    Returns
+    -------
+    list
+        (first, last) pairs, for the files with data
+    """
+    intervals = []
+    for file in FEDs:
+        index = file.data.index
+        if date_filter is not None:
+            s, e = date_filter
+            index = index[(index >= s) & (index <= e)]
+        if not index.empty:
+            intervals.append((index.min(), index.max()))
+    return intervals
+
 def resample_get_yvals(df, value, retrieval_threshold=None):
     """
     Function for passing to the apply() method of pandas Resampler or
@@ -314,6 +353,156 @@ def resample_get_yvals(df, value, retrieval_threshold=None):
         output = df['Binary_Left_Pokes'].sum() - df['Binary_Right_Pokes'].sum()
     return output
 
+def aggregate_get_yvals(agg, value):
+    """
+    Computes the outputs of resample_get_yvals() for each bin at once, from
+    binned aggregates (see FED3_File.binned()) rather than from the rows.
+
+    Parameters
+    ----------
+    agg : pandas.DataFrame
+        Summed aggregates for each bin
+    value : str
+        Output to compute; the options of resample_get_yvals()
+
+    Returns
+    -------
+    output : pandas.Series
+        Computed value for each bin
+    """
+    if value == 'poke bias (correct %)':
+        value = 'correct pokes (%)'
+    pokes = agg['Correct'] + agg['Errors']
+    if value == 'pellets':
+        output = agg['Pellets']
+    elif value == 'retrieval time':
+        output = (agg['Retrieval_Sum']/agg['Retrieval_Count']).where(agg['Retrieval_Count'] > 0)
+    elif value == 'interpellet intervals':
+        output = (agg['IPI_Sum']/agg['IPI_Count']).where(agg['IPI_Count'] > 0)
+    elif value == 'correct pokes':
+        output = agg['Correct']
+    elif value == 'errors':
+        output = agg['Errors']
+    elif value == 'correct pokes (%)':
+        output = (agg['Correct']/pokes * 100).where(pokes > 0)
+    elif value == 'errors (%)':
+        output = (agg['Errors']/pokes * 100).where(pokes > 0)
+    elif value == 'poke bias (correct - error)':
+        output = agg['Correct'] - agg['Errors']
+    elif value == 'poke bias (left - right)':
+        output = agg['Left_Pokes'] - agg['Right_Pokes']
+    else:
+        raise ValueError('Value not understood by daynight plot: ' + value)
+    return output.rename(None)
+
+def binned_yvals(FED, bin_size, value, retrieval_threshold=None,
+                 date_filter=None):
+    """
+    Bins the data of a FED3_File by time and computes resample_get_yvals()
+    for each bin.  Uses the file's pre-aggregated pyramid when bin_size
+    allows it, otherwise bins the rows.
+
+    Parameters
+    ----------
+    FED : FED3_File
+        FED3 data
+    bin_size : str
+        how frequently to bin, passed to freq argument of pandas.Grouper
+    value : str
+        Output to compute; the options of resample_get_yvals()
+    retrieval_threshold : int, float, optional
+        Retrieval times at or above this are excluded. The default is None.
+    date_filter : tuple, optional
+        (start, end) datetimes. The default is None.
+
+    Returns
+    -------
+    pandas.Series
+        Computed value for each bin
+    """
+    s, e = date_filter if date_filter is not None else (None, None)
+    if not (value == 'retrieval time' and retrieval_threshold):
+        agg = FED.binned(bin_size, s, e)
+        if agg is not None:
+            return aggregate_get_yvals(agg, value)
+    df = FED.data
+    if date_filter is not None:
+        df = df[(df.index >= s) &
+                (df.index <= e)].copy()
+    df = df.groupby(pd.Grouper(freq=bin_size,base=0))
+    return df.apply(resample_get_yvals, value, retrieval_threshold)
+
+def binned_pellets(FED, bin_size, date_filter=None):
+    """
+    Counts the pellets retrieved in each time bin of a FED3_File, using
+    the file's pre-aggregated pyramid when bin_size allows it.
+
+    Parameters
+    ----------
+    FED : FED3_File
+        FED3 data
+    bin_size : str
+        how frequently to bin, passed to rule argument of DataFrame.resample()
+    date_filter : tuple, optional
+        (start, end) datetimes. The default is None.
+
+    Returns
+    -------
+    pandas.Series
+        Pellets in each bin
+    """
+    s, e = date_filter if date_filter is not None else (None, None)
+    agg = FED.binned(bin_size, s, e)
+    if agg is not None:
+        return agg['Pellets'].rename('Binary_Pellets')
+    df = FED.data
+    if date_filter is not None:
+        df = df[(df.index >= s) &
+                (df.index <= e)]
+    return df['Binary_Pellets'].resample(bin_size,base=0).sum()
+
+def hourly_yvals(FED, value, retrieval_threshold=None, date_filter=None):
+    """
+    Computes resample_get_yvals() for the data in each hour of the day,
+    divided by the number of days recorded in that hour (used by the
+    chronograms).  Uses the hourly level of the file's pre-aggregated
+    pyramid when possible.
+
+    Parameters
+    ----------
+    FED : FED3_File
+        FED3 data
+    value : str
+        Output to compute; the options of resample_get_yvals()
+    retrieval_threshold : int, float, optional
+        Retrieval times at or above this are excluded. The default is None.
+    date_filter : tuple, optional
+        (start, end) datetimes. The default is None.
+
+    Returns
+    -------
+    pandas.Series
+        Value for each hour (0-23) with data
+    """
+    s, e = date_filter if date_filter is not None else (None, None)
+    if not (value == 'retrieval time' and retrieval_threshold):
+        agg = FED.binned('1H', s, e)
+        if agg is not None:
+            agg = agg[agg['Rows'] > 0]
+            byhour = agg.groupby([agg.index.hour])
+            num_days_by_hour = byhour.size()
+            byhour = aggregate_get_yvals(byhour.sum(), value)
+            return byhour.divide(num_days_by_hour, axis=0).rename_axis(None)
+    df = FED.data
+    if date_filter is not None:
+        df = df[(df.index >= s) &
+                (df.index <= e)].copy()
+    byhour = df.groupby([df.index.hour])
+    byhour = byhour.apply(resample_get_yvals,value,retrieval_threshold)
+    byhourday = df.groupby([df.index.hour,df.index.date])
+    num_days_by_hour = byhourday.sum().index.get_level_values(0).value_counts()
+    return byhour.divide(num_days_by_hour, axis=0)
+
 def raw_data_scatter(array, xcenter, spread):
     """
     Create points for graphing individual observations as points on a bar plot.
@@ -391,22 +580,22 @@ def date_format_x(ax, start, end):
         xfmt = mdates.DateFormatter('%b %d')
         major = mdates.DayLocator(interval=5)
         minor = mdates.DayLocator()
-        plt.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
+        mpl.artist.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
     elif datetime.timedelta(days=32) <= d8_span < datetime.timedelta(days=60):
         xfmt = mdates.DateFormatter('%b %d')
         major = mdates.DayLocator(interval=10)
         minor = mdates.DayLocator(interval=5)
-        plt.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
+        mpl.artist.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
     elif datetime.timedelta(days=62) <= d8_span < datetime.timedelta(days=120):
         xfmt = mdates.DateFormatter('%b %d')
         major = mdates.DayLocator(interval=15)
         minor = mdates.DayLocator(interval=5)
-        plt.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
+        mpl.artist.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
     elif d8_span >= datetime.timedelta(days=120):
         xfmt = mdates.DateFormatter("%b '%y")
         major = mdates.MonthLocator()
         minor = mdates.DayLocator(bymonthday=[7,15,23])
-        plt.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
+        mpl.artist.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
     ax.xaxis.set_major_locator(major)
     ax.xaxis.set_major_formatter(xfmt)
     ax.xaxis.set_minor_locator(minor)
@@ -541,29 +730,215 @@ def label_meals(ipi, meal_pellet_minimum=1, meal_duration=1):
     pandas.Series
         Series of meals labeled by meal number
     """
-    output = []
-    meal_no = 1
-    c = 0
-    while c < len(ipi):
-        following_pellets = ipi[c+1:c+meal_pellet_minimum]
-        if len(following_pellets) == 0 and c == len(ipi) - 1:
-            if ipi[c] >= meal_duration:
-                output.append(meal_no if meal_pellet_minimum == 1 else None)
-            break
-        if all(p < meal_duration for p in following_pellets):
-            output.append(meal_no)
-            while c < len(ipi) - 1:
-                if ipi[c+1] < meal_duration:
-                    output.append(meal_no)
-                    c+=1
-                else:
-                    c+=1
-                    break
-            meal_no += 1
+    ipi = np.asarray(ipi, dtype=float)
+    n = len(ipi)
+    if n == 0 or (n == 1 and ipi[0] < meal_duration):
+        return pd.Series([], dtype=float)
+    short = ipi < meal_duration
+    #a pellet can start a meal if the following pellets (up to the minimum)
+    #are all within the meal duration; the last can only if the minimum is 1
+    shorts = np.concatenate([[0], np.cumsum(short)])
+    positions = np.arange(n)
+    following = np.minimum(positions + 1, n)
+    window_end = np.minimum(positions + max(meal_pellet_minimum, 1), n)
+    can_start = shorts[window_end] - shorts[following] == window_end - following
+    can_start[-1] = meal_pellet_minimum == 1
+    #a meal continues through the following short intervals; within each run
+    #of short intervals (after a long one), pellets are in a meal from the
+    #first which can start one
+    run_start = np.maximum.accumulate(np.where(~short | (positions == 0), positions, 0))
+    last_start = np.maximum.accumulate(np.where(can_start, positions, -1))
+    in_meal = last_start >= run_start
+    previous = np.concatenate([[False], in_meal[:-1]])
+    new_meal = in_meal & (~short | ~previous)
+    meal_no = np.cumsum(new_meal)
+    #a short last pellet not continuing a meal is left out
+    if short[-1] and not (n > 1 and previous[-1]):
+        in_meal, meal_no = in_meal[:-1], meal_no[:-1]
+    if in_meal.all():
+        return pd.Series(meal_no)
+    if not in_meal.any():
+        return pd.Series([None] * len(in_meal))
+    return pd.Series(np.where(in_meal, meal_no, np.nan))
+
+def decimate_indices(x, y, start=None, end=None, n_bins=1000, scatter=False):
+    """
+    Select the points of a series which need to be drawn for it to look the
+    same as the full series at a given pixel width.  The visible x-range is
+    cut into n_bins columns; for lines, the first, last, minimum, and maximum
+    point of each column are kept (min/max or "M4" decimation).  For scatter
+    plots, points sharing a column and a y-value are drawn only once.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        Numeric x-values (sorted)
+    y : numpy.ndarray
+        y-values, same length as x
+    start : float, optional
+        Left edge of the visible x-range. The default is None (first x-value).
+    end : float, optional
+        Right edge of the visible x-range. The default is None (last x-value).
+    n_bins : int, optional
+        Number of columns, roughly the width of the Axes in pixels. The
+        default is 1000.
+    scatter : bool, optional
+        Use the scatter plot rule instead of the line rule. The default is
+        False.
+
+    Returns
+    -------
+    numpy.ndarray
+        Sorted integer positions of the points to draw
+    """
+    n = len(x)
+    lo = 0 if start is None else max(np.searchsorted(x, start, 'left') - 1, 0)
+    hi = n if end is None else min(np.searchsorted(x, end, 'right') + 1, n)
+    if hi - lo <= 4 * n_bins:
+        return np.arange(lo, hi)
+    xs = x[lo:hi]
+    ys = np.asarray(y[lo:hi], dtype=float)
+    edges = np.linspace(xs[0], xs[-1], n_bins + 1)[1:-1]
+    bounds = np.searchsorted(xs, edges, 'right')
+    starts = np.concatenate([[0], bounds])
+    stops = np.concatenate([bounds, [len(xs)]])
+    keep = starts < stops
+    starts, stops = starts[keep], stops[keep]
+    column = np.repeat(np.arange(len(starts)), stops - starts)
+    if scatter:
+        finite = np.flatnonzero(~np.isnan(ys))
+        pairs = np.column_stack([column[finite], ys[finite]])
+        _, first = np.unique(pairs, axis=0, return_index=True)
+        return np.sort(finite[first]) + lo
+    by_min = np.lexsort((np.where(np.isnan(ys), np.inf, ys), column))
+    by_max = np.lexsort((np.where(np.isnan(ys), -np.inf, ys), column))
+    chosen = np.concatenate([starts, stops - 1,
+                             by_min[starts], by_max[stops - 1]])
+    return np.unique(chosen) + lo
+
+def plot_decimated(ax, x, y, scatter=False, **kwargs):
+    """
+    Plot a (long) series on an Axes, drawing only about as many points as
+    the Axes is wide in pixels (see decimate_indices).  The full data are
+    held by the plot, and the drawn points are recomputed when the x-limits
+    change (e.g. zooming with the navigation toolbar).  Short or unsorted
+    series are plotted as is.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes.Axes
+        Axes to plot on
+    x : array
+        x-values (numeric or datetime)
+    y : array
+        y-values
+    scatter : bool, optional
+        Make a scatter plot instead of a line plot. The default is False.
+    **kwargs :
+        Passed to ax.plot() or ax.scatter(); when scatter is True, a "c"
+        array the same length as y is decimated along with the points.
+
+    Returns
+    -------
+    matplotlib.lines.Line2D or matplotlib.collections.PathCollection
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    ax.xaxis.update_units(x)
+    xf = np.asarray(ax.convert_xunits(x), dtype=float)
+    n_bins = max(int(ax.bbox.width), 100)
+    c = kwargs.pop('c', None) if scatter else None
+    recolor = c is not None and np.ndim(c) > 0 and len(c) == len(y)
+    if len(x) <= 4 * n_bins or np.any(np.diff(xf) < 0):
+        if scatter:
+            return ax.scatter(x, y, c=c, **kwargs)
+        return ax.plot(x, y, **kwargs)[0]
+    idx = decimate_indices(xf, y, n_bins=n_bins, scatter=scatter)
+    if scatter:
+        artist = ax.scatter(x[idx], y[idx],
+                            c=np.asarray(c)[idx] if recolor else c, **kwargs)
+    else:
+        artist = ax.plot(x[idx], y[idx], **kwargs)[0]
+
+    def refine(ax):
+        start, end = ax.get_xlim()
+        idx = decimate_indices(xf, y, start, end, max(int(ax.bbox.width), 100),
+                               scatter=scatter)
+        if scatter:
+            artist.set_offsets(np.column_stack([xf[idx], y[idx]]))
+            if recolor:
+                artist.set_array(np.asarray(c)[idx])
         else:
-            output.append(None)
-            c+=1
-    return pd.Series(output)
+            artist.set_data(x[idx], y[idx])
+
+    ax.callbacks.connect('xlim_changed', refine)
+    return artist
+
+def plot_collection(ax, xs, ys, colors, labels=None, alpha=None, lw=None):
+    """
+    Draw several lines (e.g. one per device) as a single LineCollection,
+    rather than one Line2D each.  Long lines are decimated to the width of
+    the Axes as in plot_decimated().  When labels are given, empty proxy
+    lines are added so the lines appear in legends made with ax.legend().
+
+    Parameters
+    ----------
+    ax : matplotlib.axes.Axes
+        Axes to plot on
+    xs : list of arrays
+        x-values of each line (numeric or datetime)
+    ys : list of arrays
+        y-values of each line
+    colors : str or list
+        One color for all lines, or one color per line
+    labels : list of str, optional
+        Legend label for each line. The default is None (no legend entries).
+    alpha : float, optional
+        Line transparency. The default is None.
+    lw : float, optional
+        Line width. The default is None (matplotlib default).
+
+    Returns
+    -------
+    matplotlib.collections.LineCollection
+    """
+    data = []
+    for x, y in zip(xs, ys):
+        x = np.asarray(x)
+        ax.xaxis.update_units(x)
+        xf = np.asarray(ax.convert_xunits(x), dtype=float)
+        data.append((xf, np.asarray(y, dtype=float),
+                     not np.any(np.diff(xf) < 0)))
+
+    def segments(start=None, end=None):
+        n_bins = max(int(ax.bbox.width), 100)
+        output = []
+        for xf, y, is_sorted in data:
+            if is_sorted:
+                idx = decimate_indices(xf, y, start, end, n_bins)
+                xf, y = xf[idx], y[idx]
+            output.append(np.column_stack([xf, y]))
+        return output
+
+    collection = LineCollection(segments(), colors=colors, alpha=alpha,
+                                linewidths=lw)
+    ax.add_collection(collection, autolim=False)
+    if data:
+        points = np.concatenate([np.column_stack(d[:2]) for d in data])
+        ax.update_datalim(points[np.isfinite(points).all(axis=1)])
+        ax.autoscale_view()
+    if labels is not None:
+        if isinstance(colors, str):
+            colors = [colors] * len(labels)
+        for color, label in zip(colors, labels):
+            ax.plot([], [], color=color, label=label, alpha=alpha, lw=lw)
+    n_bins = max(int(ax.bbox.width), 100)
+    if any(len(d[0]) > 4 * n_bins and d[2] for d in data):
+        def refine(ax):
+            start, end = ax.get_xlim()
+            collection.set_segments(segments(start, end))
+        ax.callbacks.connect('xlim_changed', refine)
+    return collection
 
 #---Pellet Plots
 
@@ -599,7 +974,8 @@ def pellet_plot_single(FED, shade_dark, lights_on, lights_off, pellet_color,
     """
     assert isinstance(FED, FED3_File),'Non FED3_File passed to pellet_plot_single()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=150)
+        fig = Figure(figsize=(7,3.5), dpi=150)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
     df = FED.data
@@ -609,7 +985,7 @@ def pellet_plot_single(FED, shade_dark, lights_on, lights_off, pellet_color,
                 (df.index <= e)].copy()
     x = df.index
     y = df['Pellet_Count']
-    ax.plot(x, y,color=pellet_color)
+    plot_decimated(ax, x, y, color=pellet_color)
     date_format_x(ax, x[0], x[-1])
     ax.set_xlabel('Time')
     ax.set_ylabel('Cumulative Pellets')
@@ -620,7 +996,7 @@ def pellet_plot_single(FED, shade_dark, lights_on, lights_off, pellet_color,
                        lights_on=lights_on,
                        lights_off=lights_off)
         ax.legend(bbox_to_anchor=(1,1), loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -658,10 +1034,11 @@ def pellet_freq_single(FED, pellet_bins, shade_dark, lights_on,
     """
     assert isinstance(FED, FED3_File),'Non FED3_File passed to pellet_freq_single()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=150)
+        fig = Figure(figsize=(7,3.5), dpi=150)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
-    df = FED.data.resample(pellet_bins).sum()
+    df = binned_pellets(FED, pellet_bins).to_frame()
     if 'date_filter' in kwargs:
         s, e = kwargs['date_filter']
         df = df[(df.index >= s) &
@@ -680,7 +1057,7 @@ def pellet_freq_single(FED, pellet_bins, shade_dark, lights_on,
                        lights_on=lights_on,
                        lights_off=lights_off)
         ax.legend(bbox_to_anchor=(1,1), loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -711,11 +1088,15 @@ def pellet_plot_multi_aligned(FEDs, **kwargs):
     for file in FEDs:
         assert isinstance(file, FED3_File),'Non FED3_File passed to pellet_plot_multi()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=150)
+        fig = Figure(figsize=(7,3.5), dpi=150)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
+    colors = mpl.rcParams['axes.prop_cycle'].by_key()['color']
     xmax = 0
     ymax = 0
+    xs = []
+    ys = []
     for file in FEDs:
         df = file.data
         if 'date_filter' in kwargs:
@@ -726,11 +1107,15 @@ def pellet_plot_multi_aligned(FEDs, **kwargs):
             df['Elapsed_Time'] -= df['Elapsed_Time'][0]
         x = [(time.total_seconds()/3600) for time in df['Elapsed_Time']]
         y = df['Pellet_Count']
-        ax.plot(x, y, label=file.filename, alpha=.6, lw=1)
+        xs.append(x)
+        ys.append(y)
         if max(x) > xmax:
             xmax = max(x)
         if max(y) > ymax:
             ymax = max(y)
+    labels = [file.filename for file in FEDs] if len(FEDs) < 10 else None
+    plot_collection(ax, xs, ys, labels=labels, alpha=.6, lw=1,
+                    colors=[colors[i % len(colors)] for i in range(len(FEDs))])
     ax.set_xlabel('Time (h)')
     ax.set_xlim(0,xmax)
     number_of_days = int(xmax//24)
@@ -749,7 +1134,7 @@ def pellet_plot_multi_aligned(FEDs, **kwargs):
     ax.set_title(title)
     if len(FEDs) < 10:
         ax.legend(bbox_to_anchor=(1,1), loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -787,11 +1172,15 @@ def pellet_plot_multi_unaligned(FEDs, shade_dark, lights_on,
     for file in FEDs:
         assert isinstance(file, FED3_File),'Non FED3_File passed to pellet_plot_multi()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=150)
+        fig = Figure(figsize=(7,3.5), dpi=150)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
+    colors = mpl.rcParams['axes.prop_cycle'].by_key()['color']
     min_date = np.datetime64('2100')
     max_date = np.datetime64('1970')
+    xs = []
+    ys = []
     for file in FEDs:
         df = file.data
         if 'date_filter' in kwargs:
@@ -800,11 +1189,15 @@ def pellet_plot_multi_unaligned(FEDs, shade_dark, lights_on,
                     (df.index <= e)].copy()
         x = df.index
         y = df['Pellet_Count']
-        ax.plot(x, y, label=file.filename, alpha=.6, lw=1)
+        xs.append(x)
+        ys.append(y)
         if max(x) > max_date:
             max_date = max(x)
         if min(x) < min_date:
             min_date = min(x)
+    labels = [file.filename for file in FEDs] if len(FEDs) < 10 else None
+    plot_collection(ax, xs, ys, labels=labels, alpha=.6, lw=1,
+                    colors=[colors[i % len(colors)] for i in range(len(FEDs))])
     ax.set_xlabel('Time (h)')
     date_format_x(ax, min_date, max_date)
     ax.set_ylabel('Cumulative Pellets')
@@ -816,7 +1209,7 @@ def pellet_plot_multi_unaligned(FEDs, shade_dark, lights_on,
                    lights_off=lights_off)
     if len(FEDs) < 10:
         ax.legend(bbox_to_anchor=(1,1), loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -850,24 +1243,21 @@ def pellet_freq_multi_aligned(FEDs, pellet_bins, **kwargs):
     for file in FEDs:
         assert isinstance(file, FED3_File),'Non FED3_File passed to pellet_plot_multi()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=150)
+        fig = Figure(figsize=(7,3.5), dpi=150)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
     max_time = 0
     for file in FEDs:
-        df = file.data
-        if 'date_filter' in kwargs:
-            s, e = kwargs['date_filter']
-            df = df[(df.index >= s) &
-                    (df.index <= e)].copy()
-        df = df.resample(pellet_bins,base=0).sum()
+        df = binned_pellets(file, pellet_bins,
+                            kwargs.get('date_filter')).to_frame()
         times = []
         for i, date in enumerate(df.index):
             times.append(date - df.index[0])
         times = [(time/np.timedelta64(1,'h')) for time in times]
         x = times
         y = df['Binary_Pellets']
-        ax.plot(x, y, alpha=.6, label=file.filename, lw=1)
+        plot_decimated(ax, x, y, alpha=.6, label=file.filename, lw=1)
         if max(times) > max_time:
             max_time = max(times)
     ax.set_xlabel('Time (h)')
@@ -881,7 +1271,7 @@ def pellet_freq_multi_aligned(FEDs, pellet_bins, **kwargs):
     ax.set_title(title)
     if len(FEDs) < 10:
         ax.legend(bbox_to_anchor=(1,1), loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -921,22 +1311,19 @@ def pellet_freq_multi_unaligned(FEDs, pellet_bins, shade_dark,
     for file in FEDs:
         assert isinstance(file, FED3_File),'Non FED3_File passed to pellet_plot_multi()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=150)
+        fig = Figure(figsize=(7,3.5), dpi=150)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
     min_date = np.datetime64('2100')
     max_date = np.datetime64('1970')
     for file in FEDs:
-        df = file.data
-        if 'date_filter' in kwargs:
-            s, e = kwargs['date_filter']
-            df = df[(df.index >= s) &
-                    (df.index <= e)].copy()
-        df = df.resample(pellet_bins,base=0).sum()
+        df = binned_pellets(file, pellet_bins,
+                            kwargs.get('date_filter')).to_frame()
         x = df.index
         y = df['Binary_Pellets']
-        ax.plot(x, y, label=file.filename,
-               alpha=.6, lw=1)
+        plot_decimated(ax, x, y, label=file.filename,
+                       alpha=.6, lw=1)
         if max(x) > max_date:
             max_date = max(x)
         if min(x) < min_date:
@@ -952,7 +1339,7 @@ def pellet_freq_multi_unaligned(FEDs, pellet_bins, shade_dark,
                    lights_off=lights_off)
     if len(FEDs) < 10:
         ax.legend(bbox_to_anchor=(1,1), loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -983,12 +1370,14 @@ def interpellet_interval_plot(FEDs, kde, logx, **kwargs):
     -------
     fig : matplotlib.figure.Figure
     """
+    import seaborn as sns
     if not isinstance(FEDs, list):
         FEDs = [FEDs]
     for FED in FEDs:
         assert isinstance(FED, FED3_File),'Non FED3_File passed to interpellet_interval_plot()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(4,5), dpi=125)
+        fig = Figure(figsize=(4,5), dpi=125)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
     bins = []
@@ -1022,7 +1411,7 @@ def interpellet_interval_plot(FEDs, kde, logx, **kwargs):
     ax.set_ylabel(ylabel)
     ax.set_xlabel('minutes between pellets')
     ax.set_title('Interpellet Interval Plot')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -1056,12 +1445,14 @@ def group_interpellet_interval_plot(FEDs, groups, kde, logx, **kwargs):
     -------
     fig : matplotlib.figure.Figure
     """
+    import seaborn as sns
     if not isinstance(FEDs, list):
         FEDs = [FEDs]
     for FED in FEDs:
         assert isinstance(FED, FED3_File),'Non FED3_File passed to interpellet_interval_plot()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(4,5), dpi=125)
+        fig = Figure(figsize=(4,5), dpi=125)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
     bins=[]
@@ -1099,7 +1490,7 @@ def group_interpellet_interval_plot(FEDs, groups, kde, logx, **kwargs):
     ax.set_ylabel(ylabel)
     ax.set_xlabel('minutes between pellets')
     ax.set_title('Interpellet Interval Plot')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -1138,7 +1529,8 @@ def retrieval_time_single(FED, retrieval_threshold, shade_dark,
     """
     assert isinstance(FED, FED3_File),'Non FED3_File passed to pellet_plot_single()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=150)
+        fig = Figure(figsize=(7,3.5), dpi=150)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
     df = FED.data
@@ -1171,7 +1563,7 @@ def retrieval_time_single(FED, retrieval_threshold, shade_dark,
     h1, l1 = ax.get_legend_handles_labels()
     h2, l2 = ax2.get_legend_handles_labels()
     ax.legend(h1+h2, l1+l2, bbox_to_anchor=(1.15,1), loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -1204,7 +1596,8 @@ def retrieval_time_multi(FEDs, retrieval_threshold, **kwargs):
     for file in FEDs:
         assert isinstance(file, FED3_File),'Non FED3_File passed to retrieval_time_multi()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=150)
+        fig = Figure(figsize=(7,3.5), dpi=150)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
     color_gradient_divisions = [(1/len(FEDs))*i for i in range(len(FEDs))]
@@ -1241,7 +1634,7 @@ def retrieval_time_multi(FEDs, retrieval_threshold, **kwargs):
     ax.set_title('Pellet Retrieval Time')
     if len(FEDs) < 10:
         ax.legend(bbox_to_anchor=(1,1), loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -1275,12 +1668,14 @@ def meal_size_histogram(FEDs, meal_pellet_minimum, meal_duration,
     -------
     fig : matplotlib.figure.Figure
     """
+    import seaborn as sns
     if not isinstance(FEDs, list):
         FEDs = [FEDs]
     for file in FEDs:
         assert isinstance(file, FED3_File),'Non FED3_File passed to retrieval_time_multi()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=150)
+        fig = Figure(figsize=(7,3.5), dpi=150)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
     ax.set_title('Meal Size Histogram')
@@ -1312,7 +1707,7 @@ def meal_size_histogram(FEDs, meal_pellet_minimum, meal_duration,
     ax.set_xticks(range(1,longest_meal+1))
     if len(FEDs) < 10:
         ax.legend(bbox_to_anchor=(1,1), loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
     return fig if 'ax' not in kwargs else None
 
 def grouped_meal_size_histogram(FEDs, groups, meal_pellet_minimum, meal_duration,
@@ -1345,12 +1740,14 @@ def grouped_meal_size_histogram(FEDs, groups, meal_pellet_minimum, meal_duration
     -------
     fig : matplotlib.figure.Figure
     """
+    import seaborn as sns
     if not isinstance(FEDs, list):
         FEDs = [FEDs]
     for file in FEDs:
         assert isinstance(file, FED3_File),'Non FED3_File passed to retrieval_time_multi()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=150)
+        fig = Figure(figsize=(7,3.5), dpi=150)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
     ax.set_title('Meal Size Histogram')
@@ -1386,7 +1783,7 @@ def grouped_meal_size_histogram(FEDs, groups, meal_pellet_minimum, meal_duration
     ax.set_xticks(range(1, longest_meal+1))
     if len(groups) < 10:
         ax.legend(bbox_to_anchor=(1,1), loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
     return fig if 'ax' not in kwargs else None
 
 #---Average Pellet Plots
@@ -1434,6 +1831,7 @@ def average_plot_ondatetime(FEDs, groups, dependent, average_bins, average_error
     -------
     fig : matplotlib.figure.Figure
     """
+    from scipy import stats
     retrieval_threshold=None
     if 'retrieval_threshold' in kwargs:
         retrieval_threshold = kwargs['retrieval_threshold']
@@ -1441,26 +1839,20 @@ def average_plot_ondatetime(FEDs, groups, dependent, average_bins, average_error
     if average_error == 'raw data':
         average_error = 'None'
         show_indvl=True
-    earliest_end = datetime.datetime(2999,1,1,0,0,0)
-    latest_start = datetime.datetime(1970,1,1,0,0,0)
     for file in FEDs:
         assert isinstance(file, FED3_File),'Non FED3_File passed to pellet_plot_average_cumulative()'
-        df = file.data
-        if 'date_filter' in kwargs:
-            s, e = kwargs['date_filter']
-            df = df[(df.index >= s) &
-                    (df.index <= e)].copy()
-        if min(df.index) > latest_start:
-            latest_start = min(df.index)
-        if max(df.index) < earliest_end:
-            earliest_end = max(df.index)
-    if earliest_end < latest_start:
+    intervals = data_intervals(FEDs, kwargs.get('date_filter'))
+    #a file with no data shares no time with the others
+    window = common_overlap(intervals) if len(intervals) == len(FEDs) else None
+    if window is None:
         return 'NO_OVERLAP ERROR'
+    latest_start, earliest_end = window
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=150)
+        fig = Figure(figsize=(7,3.5), dpi=150)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
-    colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    colors = mpl.rcParams['axes.prop_cycle'].by_key()['color']
     maxy = 0
     for i, group in enumerate(groups):
         avg = []
@@ -1478,8 +1870,8 @@ def average_plot_ondatetime(FEDs, groups, dependent, average_bins, average_error
                 elif dependent == 'right pokes':
                     y = left_right_noncumulative(df,average_bins,side='r',version='ondatetime')
                 else:
-                    df = df.groupby(pd.Grouper(freq=average_bins,base=0))
-                    y = df.apply(resample_get_yvals,dependent,retrieval_threshold)
+                    y = binned_yvals(file, average_bins, dependent, retrieval_threshold,
+                                     kwargs.get('date_filter'))
                 y = y[(y.index > latest_start) &
                         (y.index < earliest_end)].copy()
                 avg.append(y)
@@ -1521,7 +1913,7 @@ def average_plot_ondatetime(FEDs, groups, dependent, average_bins, average_error
                        lights_on=lights_on,
                        lights_off=lights_off)
     ax.legend(bbox_to_anchor=(1,1), loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -1573,6 +1965,7 @@ def average_plot_ontime(FEDs, groups, dependent, average_bins, average_align_sta
     -------
     fig : matplotlib.figure.Figure
     """
+    from scipy import stats
     retrieval_threshold=None
     if 'retrieval_threshold' in kwargs:
         retrieval_threshold = kwargs['retrieval_threshold']
@@ -1583,10 +1976,11 @@ def average_plot_ontime(FEDs, groups, dependent, average_bins, average_align_sta
     for file in FEDs:
         assert isinstance(file, FED3_File),'Non FED3_File passed to pellet_plot_average_cumulative()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=150)
+        fig = Figure(figsize=(7,3.5), dpi=150)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
-    colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    colors = mpl.rcParams['axes.prop_cycle'].by_key()['color']
     start_datetime = datetime.datetime(year=1970,
                                  month=1,
                                  day=1,
@@ -1667,7 +2061,7 @@ def average_plot_ontime(FEDs, groups, dependent, average_bins, average_align_sta
         ax.axhline(y=50, linestyle='--', color='gray', zorder=2)
     ax.set_title('Average Plot of ' + dependent.capitalize())
     ax.legend(bbox_to_anchor=(1,1), loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -1707,6 +2101,7 @@ def average_plot_onstart(FEDs, groups, dependent, average_bins, average_error, *
     -------
     fig : matplotlib.figure.Figure
     """
+    from scipy import stats
     retrieval_threshold=None
     if 'retrieval_threshold' in kwargs:
         retrieval_threshold = kwargs['retrieval_threshold']
@@ -1730,10 +2125,11 @@ def average_plot_onstart(FEDs, groups, dependent, average_bins, average_error, *
         elif len(resampled.index) > len(longest_index):
             longest_index = resampled.index
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=150)
+        fig = Figure(figsize=(7,3.5), dpi=150)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
-    colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    colors = mpl.rcParams['axes.prop_cycle'].by_key()['color']
     maxy=0
     maxx=0
     for i, group in enumerate(groups):
@@ -1806,7 +2202,7 @@ def average_plot_onstart(FEDs, groups, dependent, average_bins, average_error, *
     title = ('Average Plot of ' + dependent.capitalize())
     ax.set_title(title)
     ax.legend(bbox_to_anchor=(1,1), loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -1855,7 +2251,8 @@ def poke_plot(FED, poke_bins, poke_show_correct, poke_show_error, poke_show_left
     """
     assert isinstance(FED, FED3_File), 'Non FED3_File passed to poke_plot()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=150)
+        fig = Figure(figsize=(7,3.5), dpi=150)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
     df = FED.data
@@ -1881,7 +2278,7 @@ def poke_plot(FED, poke_bins, poke_show_correct, poke_show_error, poke_show_left
             if not pd.isna(offset_correct):
                 y += offset_correct
             x = y.index
-            ax.plot(x, y, color='mediumseagreen', label = 'correct pokes')
+            plot_decimated(ax, x, y, color='mediumseagreen', label = 'correct pokes')
         if poke_show_error:
             y = pd.Series([1 if i==False else np.nan for i in correct_pokes]).cumsum()
             y.index = df.index
@@ -1889,21 +2286,21 @@ def poke_plot(FED, poke_bins, poke_show_correct, poke_show_error, poke_show_left
             if not pd.isna(offset_wrong):
                 y += offset_wrong
             x = y.index
-            ax.plot(x, y, color='indianred', label = 'error pokes')
+            plot_decimated(ax, x, y, color='indianred', label = 'error pokes')
         if poke_show_left:
             try:
                 y = df[df['Event'] == 'Poke']['Left_Poke_Count']
             except:
                 y = df['Left_Poke_Count']
             x = y.index
-            ax.plot(x, y, color='cornflowerblue', label = 'left pokes')
+            plot_decimated(ax, x, y, color='cornflowerblue', label = 'left pokes')
         if poke_show_right:
             try:
                 y = df[df['Event'] == 'Poke']['Right_Poke_Count']
             except:
                 y = df['Right_Poke_Count']
             x = y.index
-            ax.plot(x, y, color='gold', label = 'right pokes')
+            plot_decimated(ax, x, y, color='gold', label = 'right pokes')
     else:
         if 'date_filter' in kwargs:
             s, e = kwargs['date_filter']
@@ -1911,13 +2308,18 @@ def poke_plot(FED, poke_bins, poke_show_correct, poke_show_error, poke_show_left
                     (df.index <= e)].copy()
             df['Left_Poke_Count'] -= df['Left_Poke_Count'][0]
             df['Right_Poke_Count'] -= df['Right_Poke_Count'][0]
-        resampled_correct = df['Correct_Poke'].dropna().resample(poke_bins)
+        s, e = kwargs.get('date_filter', (None, None))
+        agg = FED.binned(poke_bins, s, e, trim='Pokes')
+        if agg is None:
+            resampled_correct = df['Correct_Poke'].dropna().resample(poke_bins)
+            agg = pd.DataFrame({'Correct':resampled_correct.apply(lambda binn: (binn==True).sum()),
+                                'Errors':resampled_correct.apply(lambda binn: (binn==False).sum())})
         if poke_show_correct:
-            y = resampled_correct.apply(lambda binn: (binn==True).sum())
+            y = agg['Correct']
             x = y.index
             ax.plot(x, y, color='mediumseagreen', label = 'correct pokes')
         if poke_show_error:
-            y = resampled_correct.apply(lambda binn: (binn==False).sum())
+            y = agg['Errors']
             x = y.index
             ax.plot(x, y, color='indianred', label = 'error pokes')
         if poke_show_left:
@@ -1942,7 +2344,7 @@ def poke_plot(FED, poke_bins, poke_show_correct, poke_show_error, poke_show_left
                        lights_on=lights_on,
                        lights_off=lights_off)
     ax.legend(bbox_to_anchor=(1,1), loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -1987,7 +2389,8 @@ def poke_bias(FED, poke_bins, bias_style, shade_dark, lights_on,
     DENSITY = 10000
     assert isinstance(FED, FED3_File), 'Non FED3_File passed to poke_plot()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=150)
+        fig = Figure(figsize=(7,3.5), dpi=150)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
     df = FED.data
@@ -1996,8 +2399,8 @@ def poke_bias(FED, poke_bins, bias_style, shade_dark, lights_on,
         df = df[(df.index >= s) &
                 (df.index <= e)].copy()
     if bias_style == 'correct (%)':
-        resampled = df.groupby((pd.Grouper(freq=poke_bins)))
-        y = resampled.apply(resample_get_yvals, 'poke bias (correct %)')
+        y = binned_yvals(FED, poke_bins, 'poke bias (correct %)',
+                         date_filter=kwargs.get('date_filter'))
     elif bias_style == 'left (%)':
         y = left_right_bias(df, poke_bins)
     x = y.index
@@ -2022,7 +2425,7 @@ def poke_bias(FED, poke_bins, bias_style, shade_dark, lights_on,
                        lights_on=lights_on,
                        lights_off=lights_off)
         ax.legend(bbox_to_anchor=(1,1), loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -2069,7 +2472,8 @@ def poketime_plot(FED, poke_show_correct, poke_show_error, poke_show_left,
     """
     assert isinstance(FED, FED3_File), 'Non FED3_File passed to poke_plot()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=150)
+        fig = Figure(figsize=(7,3.5), dpi=150)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
     df = FED.data
@@ -2123,7 +2527,7 @@ def poketime_plot(FED, poke_show_correct, poke_show_error, poke_show_left,
                        lights_on=lights_on,
                        lights_off=lights_off)
     ax.legend(bbox_to_anchor=(1,1), loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -2202,7 +2606,8 @@ def pr_plot(FEDs, break_hours, break_mins, break_style, **kwargs):
         ys.append(out)
     fig_len = min([max([len(FEDs), 4]), 8])
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(fig_len, 5), dpi=125)
+        fig = Figure(figsize=(fig_len, 5), dpi=125)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
     xs = range(len(FEDs))
@@ -2214,7 +2619,7 @@ def pr_plot(FEDs, break_hours, break_mins, break_style, **kwargs):
     labels = {'pellets':'Pellets', 'pokes':'Correct Pokes',}
     ax.set_ylabel(labels[break_style])
     ax.set_title("Breakpoint")
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -2255,15 +2660,17 @@ def group_pr_plot(FEDs, groups, break_hours, break_mins, break_style,
     -------
     fig : matplotlib.figure.Figure
     """
+    from scipy import stats
     if not isinstance(FEDs, list):
         FEDs = [FEDs]
     for FED in FEDs:
         assert isinstance(FED, FED3_File), 'Non FED3_File passed to group_pr_plot()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(3.5,5), dpi=125)
+        fig = Figure(figsize=(3.5,5), dpi=125)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
-    colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    colors = mpl.rcParams['axes.prop_cycle'].by_key()['color']
     xs = range(len(groups))
     delta = datetime.timedelta(hours=break_hours, minutes=break_mins)
     title = 'Breakpoint'
@@ -2325,7 +2732,7 @@ def group_pr_plot(FEDs, groups, break_hours, break_mins, break_style,
     labels = {'pellets':'Pellets', 'pokes':'Correct Pokes',}
     ax.set_ylabel(labels[break_style])
     ax.set_title(title)
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -2369,6 +2776,7 @@ def daynight_plot(FEDs, groups, circ_value, lights_on, lights_off, circ_error,
     -------
     fig : matplotlib.figure.Figure
     """
+    from scipy import stats
     retrieval_threshold=None
     if 'retrieval_threshold' in kwargs:
         retrieval_threshold = kwargs['retrieval_threshold']
@@ -2377,10 +2785,11 @@ def daynight_plot(FEDs, groups, circ_value, lights_on, lights_off, circ_error,
     for FED in FEDs:
         assert isinstance(FED, FED3_File),'Non FED3_File passed to daynight_plot()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(5,5), dpi=125)
+        fig = Figure(figsize=(5,5), dpi=125)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
-    colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    colors = mpl.rcParams['axes.prop_cycle'].by_key()['color']
     bar_width = (.7/len(groups))
     bar_offsets = np.array([bar_width*i for i in range(len(groups))])
     for i, group in enumerate(groups):
@@ -2461,7 +2870,7 @@ def daynight_plot(FEDs, groups, circ_value, lights_on, lights_off, circ_error,
         handles.append(handles.pop(labels.index(circ_error)))
         labels.append(labels.pop(labels.index(circ_error)))
     ax.legend(handles, labels, bbox_to_anchor=(1,1),loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -2506,6 +2915,7 @@ def line_chronogram(FEDs, groups, circ_value, circ_error, circ_show_indvl, shade
     -------
     fig : matplotlib.figure.Figure
     """
+    from scipy import stats
     retrieval_threshold=None
     if 'retrieval_threshold' in kwargs:
         retrieval_threshold = kwargs['retrieval_threshold']
@@ -2516,24 +2926,18 @@ def line_chronogram(FEDs, groups, circ_value, circ_error, circ_show_indvl, shade
     if circ_show_indvl:
         circ_error = "None"
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=150)
+        fig = Figure(figsize=(7,3.5), dpi=150)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
-    colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    colors = mpl.rcParams['axes.prop_cycle'].by_key()['color']
     for i, group in enumerate(groups):
         group_vals = []
+        indvl_xs = []
         for FED in FEDs:
             if group in FED.group:
-                df = FED.data
-                if 'date_filter' in kwargs:
-                    s, e = kwargs['date_filter']
-                    df = df[(df.index >= s) &
-                            (df.index <= e)].copy()
-                byhour = df.groupby([df.index.hour])
-                byhour = byhour.apply(resample_get_yvals,circ_value,retrieval_threshold)
-                byhourday = df.groupby([df.index.hour,df.index.date])
-                num_days_by_hour = byhourday.sum().index.get_level_values(0).value_counts()
-                byhour = byhour.divide(num_days_by_hour, axis=0)
+                byhour = hourly_yvals(FED, circ_value, retrieval_threshold,
+                                      kwargs.get('date_filter'))
                 new_index = list(range(lights_on, 24)) + list(range(0,lights_on))
                 reindexed = byhour.reindex(new_index)
                 reindexed.index.name = 'hour'
@@ -2542,8 +2946,11 @@ def line_chronogram(FEDs, groups, circ_value, circ_error, circ_show_indvl, shade
                 y = reindexed
                 x = range(0,24)
                 if circ_show_indvl:
-                    ax.plot(x,y,color=colors[i],alpha=.3,linewidth=.8)
+                    indvl_xs.append(x)
                 group_vals.append(y)
+        if circ_show_indvl:
+            plot_collection(ax, indvl_xs, group_vals, colors=colors[i],
+                            alpha=.3, lw=.8)
         group_mean = np.nanmean(group_vals, axis=0)
         label = group
         error_shade = np.nan
@@ -2570,7 +2977,7 @@ def line_chronogram(FEDs, groups, circ_value, circ_error, circ_show_indvl, shade
         off = new_index.index(lights_off)
         ax.axvspan(off,24,color='gray',alpha=.2,zorder=0,label='lights off')
     ax.legend(bbox_to_anchor=(1,1),loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -2610,22 +3017,15 @@ def heatmap_chronogram(FEDs, circ_value, lights_on, **kwargs):
     if 'retrieval_threshold' in kwargs:
         retrieval_threshold = kwargs['retrieval_threshold']
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=125)
+        fig = Figure(figsize=(7,3.5), dpi=125)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
     matrix = []
     index = []
     for FED in FEDs:
-        df = FED.data
-        if 'date_filter' in kwargs:
-            s, e = kwargs['date_filter']
-            df = df[(df.index >= s) &
-                    (df.index <= e)].copy()
-        byhour = df.groupby([df.index.hour])
-        byhour = byhour.apply(resample_get_yvals,circ_value,retrieval_threshold)
-        byhourday = df.groupby([df.index.hour,df.index.date])
-        num_days_by_hour = byhourday.sum().index.get_level_values(0).value_counts()
-        byhour = byhour.divide(num_days_by_hour, axis=0)
+        byhour = hourly_yvals(FED, circ_value, retrieval_threshold,
+                              kwargs.get('date_filter'))
         new_index = list(range(lights_on, 24)) + list(range(0,lights_on))
         reindexed = byhour.reindex(new_index)
         if circ_value in ['pellets', 'correct pokes','errors']:
@@ -2648,8 +3048,8 @@ def heatmap_chronogram(FEDs, circ_value, lights_on, **kwargs):
     ax.get_yticklabels()[-1].set_weight('bold')
     ax.set_xlabel('Hours (since start of light cycle)')
     ax.set_xticks([0,6,12,18,])
-    cb = plt.colorbar(im, ax=ax)
-    plt.tight_layout()
+    cb = ax.figure.colorbar(im, ax=ax)
+    ax.figure.tight_layout()
     if 'return_cb' in kwargs:
         if 'return_cb':
             return cb
@@ -2697,6 +3097,7 @@ def circle_chronogram(FEDs, groups, circ_value, circ_error, circ_show_indvl, sha
     -------
     fig : matplotlib.figure.Figure
     """
+    from scipy import stats
     retrieval_threshold=None
     if 'retrieval_threshold' in kwargs:
         retrieval_threshold = kwargs['retrieval_threshold']
@@ -2707,27 +3108,20 @@ def circle_chronogram(FEDs, groups, circ_value, circ_error, circ_show_indvl, sha
     if circ_show_indvl:
         circ_error = "None"
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(5,5), dpi=150,
-                               subplot_kw=dict(polar=True))
+        fig = Figure(figsize=(5,5), dpi=150)
+        ax = fig.add_subplot(polar=True)
     else:
         ax = kwargs['ax'] # should be a polar axes
     ax.set_theta_zero_location("N")
     ax.set_theta_direction(-1)
-    colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    colors = mpl.rcParams['axes.prop_cycle'].by_key()['color']
     for i, group in enumerate(groups):
         group_vals = []
+        indvl_xs = []
         for FED in FEDs:
             if group in FED.group:
-                df = FED.data
-                if 'date_filter' in kwargs:
-                    s, e = kwargs['date_filter']
-                    df = df[(df.index >= s) &
-                            (df.index <= e)].copy()
-                byhour = df.groupby([df.index.hour])
-                byhour = byhour.apply(resample_get_yvals,circ_value,retrieval_threshold)
-                byhourday = df.groupby([df.index.hour,df.index.date])
-                num_days_by_hour = byhourday.sum().index.get_level_values(0).value_counts()
-                byhour = byhour.divide(num_days_by_hour, axis=0)
+                byhour = hourly_yvals(FED, circ_value, retrieval_threshold,
+                                      kwargs.get('date_filter'))
                 new_index = list(range(lights_on, 24)) + list(range(0,lights_on))
                 reindexed = byhour.reindex(new_index)
                 reindexed.index.name = 'hour'
@@ -2735,10 +3129,12 @@ def circle_chronogram(FEDs, groups, circ_value, circ_error, circ_show_indvl, sha
                     reindexed = reindexed.fillna(0)
                 y = reindexed
                 if circ_show_indvl:
-                    x = np.linspace(0, 2*np.pi, 25)
-                    wrapped = np.append(y, y[0])
-                    ax.plot(x,wrapped,color=colors[i],alpha=.3,linewidth=.8)
+                    indvl_xs.append(np.linspace(0, 2*np.pi, 25))
                 group_vals.append(y)
+        if circ_show_indvl:
+            wrapped = [np.append(y, y[0]) for y in group_vals]
+            plot_collection(ax, indvl_xs, wrapped, colors=colors[i],
+                            alpha=.3, lw=.8)
         group_mean = np.nanmean(group_vals, axis=0)
         label = group
         error_shade = np.nan
@@ -2769,7 +3165,7 @@ def circle_chronogram(FEDs, groups, circ_value, circ_error, circ_show_indvl, sha
         ax.fill_between(np.linspace(theta, 2*np.pi, 100), 0, ax.get_rmax(),
                         color='gray',alpha=.2,zorder=0,label='lights off')
     ax.legend(bbox_to_anchor=(1,1),loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -2829,8 +3225,8 @@ def spiny_chronogram(FEDs, circ_value, resolution, shade_dark, lights_on, lights
     for FED in FEDs:
         assert isinstance(FED, FED3_File),'Non FED3_File passed to daynight_plot()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(5,5), dpi=150,
-                               subplot_kw=dict(polar=True))
+        fig = Figure(figsize=(5,5), dpi=150)
+        ax = fig.add_subplot(polar=True)
     else:
         ax = kwargs['ax']
     ax.set_theta_zero_location("N")
@@ -2862,8 +3258,9 @@ def spiny_chronogram(FEDs, circ_value, resolution, shade_dark, lights_on, lights
     if "%" in circ_value:
         ax.set_ylim(0,100)
     x = np.linspace(0, 2*np.pi, len(group_mean)+1)
-    for n, val in enumerate(group_mean):
-        ax.plot([0, x[n]], [0, val], color='crimson', lw=1)
+    spines_x = [[x[n], x[n]] for n in range(len(group_mean))]
+    spines_y = [[0, val] for val in group_mean]
+    plot_collection(ax, spines_x, spines_y, colors='crimson', lw=1)
     ax.set_xlabel('Hours (since start of light cycle)')
     ax.set_xticks(np.linspace(0, 2*np.pi, 5))
     ax.set_xticklabels([0, 6, 12, 18, None])
@@ -2874,7 +3271,7 @@ def spiny_chronogram(FEDs, circ_value, resolution, shade_dark, lights_on, lights
         ax.fill_between(np.linspace(theta, 2*np.pi, 100), 0, ax.get_rmax(),
                         color='gray',alpha=.2,zorder=0,label='lights off')
         ax.legend(bbox_to_anchor=(1,1),loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -2909,12 +3306,14 @@ def day_night_ipi_plot(FEDs, kde, logx, lights_on, lights_off, **kwargs):
     -------
     fig : matplotlib.figure.Figure
     '''
+    import seaborn as sns
     if not isinstance(FEDs, list):
         FEDs = [FEDs]
     for FED in FEDs:
         assert isinstance(FED, FED3_File),'Non FED3_File passed to interpellet_interval_plot()'
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(4,5), dpi=125)
+        fig = Figure(figsize=(4,5), dpi=125)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
     bins = []
@@ -2970,7 +3369,7 @@ def day_night_ipi_plot(FEDs, kde, logx, lights_on, lights_off, **kwargs):
     ax.set_ylabel(ylabel)
     ax.set_xlabel('minutes between pellets')
     ax.set_title('Day Night Interpellet Interval Plot')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 #---Diagnostic
@@ -3007,12 +3406,13 @@ def battery_plot(FED, shade_dark, lights_on, lights_off, **kwargs):
         df = df[(df.index >= s) &
                 (df.index <= e)].copy()
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=125)
+        fig = Figure(figsize=(7,3.5), dpi=125)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
     x = df.index
     y = df['Battery_Voltage']
-    ax.plot(x,y,c='orange')
+    plot_decimated(ax, x, y, c='orange')
     title = ('Battery Life for ' + FED.filename)
     ax.set_title(title)
     ax.set_ylabel('Battery (V)')
@@ -3024,7 +3424,7 @@ def battery_plot(FED, shade_dark, lights_on, lights_off, **kwargs):
                    lights_on=lights_on,
                    lights_off=lights_off)
         ax.legend(bbox_to_anchor=(1,1), loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -3061,12 +3461,13 @@ def motor_plot(FED, shade_dark, lights_on, lights_off, **kwargs):
         df = df[(df.index >= s) &
                 (df.index <= e)].copy()
     if 'ax' not in kwargs:
-        fig, ax = plt.subplots(figsize=(7,3.5), dpi=125)
+        fig = Figure(figsize=(7,3.5), dpi=125)
+        ax = fig.add_subplot()
     else:
         ax = kwargs['ax']
     x = df.index
     y = df['Motor_Turns']
-    ax.scatter(x,y,s=3,c=y,cmap='cool',vmax=100)
+    plot_decimated(ax, x, y, scatter=True, s=3, c=y, cmap='cool', vmax=100)
     title = ('Motor Turns for ' + FED.filename)
     ax.set_title(title)
     ax.set_ylabel('Motor Turns')
@@ -3079,139 +3480,209 @@ def motor_plot(FED, shade_dark, lights_on, lights_off, **kwargs):
                    lights_on=lights_on,
                    lights_off=lights_off)
         ax.legend(bbox_to_anchor=(1,1), loc='upper left')
-    plt.tight_layout()
+    ax.figure.tight_layout()
+
+    return fig if 'ax' not in kwargs else None
 
 #---Stats
-def fed_summary(FEDs, meal_pellet_minimum=1, meal_duration=1,
-                motor_turns_thresh=10, lights_on=7, lights_off=19):
+def period_rows(index, at_period):
     """
-    FED3 Viz: generate a DataFrame of summary stats for multiple feds
+    Rows of each run of a light period, as fed_summary() has always sliced
+    them: from the first row of the run to the first row after it (or the
+    last row), including every row timestamped within those bounds.
 
     Parameters
     ----------
-    FEDs : list of FED3_File objects
-        FED3 files (loaded by load.FED3_File)
-    meal_pellet_minimum : int
-        minimum pellets to constitute a meal
-    meal_duration : int
-        amount of time to allow before a new meal is assigned
-    motor_turns_thresh : int, optional
-        Threshold of motor turns to count how many have surpassed. The default is 10.
-    lights_on : int
-        Integer between 0 and 23 denoting the start of the light cycle.
-    lights_off : int
-        Integer between 0 and 23 denoting the end of the light cycle.
+    index : pandas.DatetimeIndex
+        Index of a FED3_File's data
+    at_period : numpy.ndarray
+        Boolean array, True for rows in the period
 
     Returns
     -------
-    output : pandas.DataFrame
-        table of summary statistics for each file, with average and
-        standard deviation for all files
+    list
+        Arrays of row positions, one for each run
+    """
+    previous = np.concatenate([[False], at_period[:-1]])
+    starts = np.flatnonzero(at_period & ~previous)
+    ends = np.flatnonzero(~at_period & previous)
+    if at_period[-1]:
+        ends = np.append(ends, len(at_period) - 1)
+    values = index.values
+    if index.is_monotonic_increasing:
+        lo = np.searchsorted(values, values[starts], side='left')
+        hi = np.searchsorted(values, values[ends], side='right')
+        return [np.arange(l, h) for l, h in zip(lo, hi)]
+    return [np.flatnonzero((values >= values[s]) & (values <= values[e]))
+            for s, e in zip(starts, ends)]
+
+def fed_metrics(fed, meal_pellet_minimum=1, meal_duration=1,
+                motor_turns_thresh=10, lights_on=7, lights_off=19):
     """
-    if not isinstance(FEDs, list):
-        FEDs = [FEDs]
-    output_list = []
-    for fed in FEDs:
-        df = fed.data
-        v = fed.basename
-        results = pd.DataFrame(columns=[v])
-        results.index.name = 'Variable'
-        nights = night_intervals(df.index, lights_on, lights_off)
-        days = night_intervals(df.index, lights_on, lights_off,
-                                              instead_days=True)
-
-        #vars
-        starttime = df.index[0]
-        endtime = df.index[-1]
-        duration = endtime-starttime
-        hours = duration/pd.Timedelta(hours=1)
-
-        #pellets
-        results.loc['Pellets Taken', v] = df['Pellet_Count'].max()
-        results.loc['Pellets per Hour', v] = df['Pellet_Count'].max()/hours
-
-        #ipi
-        if 'Interpellet_Intervals' in df.columns:
-            meals = label_meals(df['Interpellet_Intervals'].dropna(),
-                                meal_pellet_minimum=meal_pellet_minimum,
-                                meal_duration=meal_duration)
-            results.loc['Number of Meals',v] =  meals.max()
-            results.loc['Average Pellets per Meal',v] =  meals.value_counts().mean()
-            d = len(meals) if len(meals) > 0 else 1
-            results.loc['% Pellets within Meals',v] =  (len(meals.dropna())/
-                                                        d) * 100
-
-        #pokes
-        total_pokes = df['Left_Poke_Count'].max()+df['Right_Poke_Count'].max()
-        d = total_pokes * 100 if total_pokes else 1
-        results.loc['Total Pokes',v] = total_pokes
-        if all(pd.isna(df['Correct_Poke'])):
-            results.loc['Left Pokes (%)',v] = df['Left_Poke_Count'].max()/d
-        else:
-            results.loc['Correct Pokes (%)',v] = df['Correct_Poke'].sum()/d
-
-
-        #other
-        results.loc['Recording Duration (Hours)', v] = hours
-        battery_use = (df['Battery_Voltage'][-1] - df['Battery_Voltage'][0])
-        results.loc['Battery Change (V)', v] = battery_use
-        results.loc['Battery Rate (V/hour)', v] = battery_use / hours
-        motor_turns = df['Motor_Turns'][df['Motor_Turns'] > 0]
-        results.loc['Motor Turns (Mean)', v] = motor_turns.mean()
-        results.loc['Motor Turns (Median)', v] = motor_turns.median()
-        motor_col = 'Motor Turns Above ' + str(motor_turns_thresh)
-        results.loc[motor_col, v] = (motor_turns[motor_turns >= motor_turns_thresh]).size
-
-        #circadian
-        night_slices = []
-        day_slices = []
-        night_hours = []
-        day_hours = []
+    FED3 Viz: the summary stats of one FED3_File (one column of
+    fed_summary()).
 
-        for start, end in nights:
-            portion = df[(df.index>=start) & (df.index<=end)].copy()
-            night_slices.append(portion)
-            night_hours.append((portion.index[-1] - portion.index[0])/pd.Timedelta(hours=1))
-
-        for start, end in days:
-            portion = df[(df.index>=start) & (df.index<=end)].copy()
-            day_slices.append(portion)
-            day_hours.append((portion.index[-1] - portion.index[0])/pd.Timedelta(hours=1))
-
-        night_hours = np.sum(night_hours)
-        day_hours = np.sum(day_hours)
+    Parameters
+    ----------
+    fed : FED3_File
+        FED3 file (loaded by load.FED3_File)
+    meal_pellet_minimum, meal_duration, motor_turns_thresh, lights_on, lights_off :
+        See fed_summary()
 
-        for name, portions, hourz in zip([' (Night)', ' (Day)'], [night_slices, day_slices],
-                                         [night_hours, day_hours]):
+    Returns
+    -------
+    results : pandas.Series
+        Value of each variable, named by the basename of the file
+    """
+    df = fed.data
+    results = {}
+
+    #vars
+    starttime = df.index[0]
+    endtime = df.index[-1]
+    duration = endtime-starttime
+    hours = duration/pd.Timedelta(hours=1)
+
+    #pellets
+    results['Pellets Taken'] = df['Pellet_Count'].max()
+    results['Pellets per Hour'] = df['Pellet_Count'].max()/hours
+
+    #ipi
+    def meal_stats(meals, name=''):
+        d = len(meals) if len(meals) > 0 else 1
+        results['Number of Meals' + name] = meals.max()
+        results['Average Pellets per Meal' + name] = meals.value_counts().mean()
+        results['% Pellets within Meals' + name] = (len(meals.dropna())/d) * 100
+
+    if 'Interpellet_Intervals' in df.columns:
+        meal_stats(label_meals(df['Interpellet_Intervals'].dropna(),
+                               meal_pellet_minimum=meal_pellet_minimum,
+                               meal_duration=meal_duration))
+
+    #pokes
+    no_correct = df['Correct_Poke'].isna().all()
+    total_pokes = df['Left_Poke_Count'].max()+df['Right_Poke_Count'].max()
+    d = total_pokes * 100 if total_pokes else 1
+    results['Total Pokes'] = total_pokes
+    if no_correct:
+        results['Left Pokes (%)'] = df['Left_Poke_Count'].max()/d
+    else:
+        results['Correct Pokes (%)'] = df['Correct_Poke'].sum()/d
+
+    #other
+    results['Recording Duration (Hours)'] = hours
+    battery_use = (df['Battery_Voltage'].iloc[-1] - df['Battery_Voltage'].iloc[0])
+    results['Battery Change (V)'] = battery_use
+    results['Battery Rate (V/hour)'] = battery_use / hours
+    motor_turns = df['Motor_Turns'][df['Motor_Turns'] > 0]
+    results['Motor Turns (Mean)'] = motor_turns.mean()
+    results['Motor Turns (Median)'] = motor_turns.median()
+    motor_col = 'Motor Turns Above ' + str(motor_turns_thresh)
+    results[motor_col] = (motor_turns[motor_turns >= motor_turns_thresh]).size
+
+    #circadian
+    if lights_on != lights_off:
+        hour = df.index.hour
+        if lights_off > lights_on:
+            at_night = np.asarray((hour >= lights_off) | (hour < lights_on))
+        else:
+            at_night = np.asarray((hour >= lights_off) & (hour < lights_on))
+        times = df.index.values
+        columns = {col : np.asarray(df[col], dtype=float) for col in
+                   ['Pellet_Count', 'Left_Poke_Count', 'Right_Poke_Count',
+                    'Interpellet_Intervals', 'Correct_Poke']}
+
+        def change(col, portions):
+            values = columns[col]
+            return np.sum([np.fmax.reduce(values[r]) - np.fmin.reduce(values[r])
+                           for r in portions])
+
+        for name, at_period in [(' (Night)', at_night), (' (Day)', ~at_night)]:
+            portions = period_rows(df.index, at_period)
             if len(portions) == 0:
                 continue
-            results.loc['Pellets Taken' + name, v] = np.sum([d['Pellet_Count'].max()-d['Pellet_Count'].min()
-                                                             for d in portions])
-            results.loc['Pellets per Hour' + name, v] = np.sum([d['Pellet_Count'].max()-d['Pellet_Count'].min()
-                                                             for d in portions])/hourz
-            concat_meals = pd.concat([d['Interpellet_Intervals'] for d in portions])
-            concat_meals = label_meals(concat_meals.dropna(),
-                                       meal_pellet_minimum=meal_pellet_minimum,
-                                       meal_duration=meal_duration)
-            d = len(concat_meals) if len(concat_meals) > 0 else 1
-            results.loc['Number of Meals' + name, v] = concat_meals.max()
-            results.loc['Average Pellets per Meal' + name, v] = concat_meals.value_counts().mean()
-            results.loc['% Pellets within Meals' + name, v] = (len(concat_meals.dropna())/
-                                                               d)*100
-            left_pokes = np.sum([d['Left_Poke_Count'].max() - d['Left_Poke_Count'].min()
-                                 for d in portions])
-            right_pokes = np.sum([d['Right_Poke_Count'].max() - d['Right_Poke_Count'].min()
-                                 for d in portions])
+            hourz = np.sum([(times[r[-1]] - times[r[0]])/np.timedelta64(1, 'h')
+                            for r in portions])
+            pellets = change('Pellet_Count', portions)
+            results['Pellets Taken' + name] = pellets
+            results['Pellets per Hour' + name] = pellets/hourz
+            ipi = np.concatenate([columns['Interpellet_Intervals'][r] for r in portions])
+            meal_stats(label_meals(ipi[~np.isnan(ipi)],
+                                   meal_pellet_minimum=meal_pellet_minimum,
+                                   meal_duration=meal_duration), name)
+            left_pokes = change('Left_Poke_Count', portions)
+            right_pokes = change('Right_Poke_Count', portions)
             total_pokes = left_pokes + right_pokes
-            results.loc['Total Pokes' + name,v] = total_pokes
+            results['Total Pokes' + name] = total_pokes
             d = total_pokes if total_pokes > 0 else 1
-            if all(pd.isna(df['Correct_Poke'])):
-                results.loc['Left Pokes (%)'+name,v] = left_pokes / d *100
+            if no_correct:
+                results['Left Pokes (%)'+name] = left_pokes / d *100
             else:
-                correct_pokes = np.sum([d['Correct_Poke'].sum() for d in portions])
-                results.loc['Correct Pokes (%)'+name,v] = correct_pokes / d * 100
-        output_list.append(results.astype(float))
-    output = pd.concat(output_list, axis=1)
+                correct_pokes = np.sum([np.nansum(columns['Correct_Poke'][r])
+                                        for r in portions])
+                results['Correct Pokes (%)'+name] = correct_pokes / d * 100
+    results = pd.Series(results, name=fed.basename, dtype=float)
+    results.index.name = 'Variable'
+    return results
+
+def summary_metrics(FEDs, meal_pellet_minimum=1, meal_duration=1,
+                    motor_turns_thresh=10, lights_on=7, lights_off=19,
+                    workers=None):
+    """
+    FED3 Viz: fed_metrics() of many FED3_Files, computed in worker
+    processes when there is enough data for it to pay off.  If a pool
+    of processes cannot be used, the files are summarized here instead.
+
+    Parameters
+    ----------
+    FEDs : list of FED3_File objects
+        FED3 files (loaded by load.FED3_File)
+    meal_pellet_minimum, meal_duration, motor_turns_thresh, lights_on, lights_off :
+        See fed_summary()
+    workers : int, optional
+        Number of worker processes; 0 or 1 computes everything in this
+        process. The default is None: one per CPU when the files have
+        SUMMARY_POOL_ROWS rows or more in total, otherwise none.
+
+    Returns
+    -------
+    list
+        pandas.Series of each file (see fed_metrics())
+    """
+    settings = [meal_pellet_minimum, meal_duration, motor_turns_thresh,
+                lights_on, lights_off]
+    if workers is None:
+        rows = sum(len(fed.data) for fed in FEDs)
+        workers = (os.cpu_count() or 1) if rows >= SUMMARY_POOL_ROWS else 1
+    workers = min(workers, len(FEDs))
+    if workers > 1:
+        columns = [[setting] * len(FEDs) for setting in settings]
+        chunksize = -(-len(FEDs) // (workers * 4))
+        try:
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                return list(pool.map(fed_metrics, FEDs, *columns,
+                                     chunksize=chunksize))
+        except (BrokenProcessPool, OSError, pickle.PicklingError):
+            pass
+    return [fed_metrics(fed, *settings) for fed in FEDs]
+
+def summary_table(metrics):
+    """
+    FED3 Viz: join the summary stats of files into the fed_summary() table.
+
+    Parameters
+    ----------
+    metrics : list
+        pandas.Series of each file (see fed_metrics())
+
+    Returns
+    -------
+    output : pandas.DataFrame
+        table of summary statistics for each file, with average and
+        standard deviation for all files
+    """
+    output = pd.concat(metrics, axis=1)
     avg = output.mean(axis=1)
     std = output.std(axis=1)
     order = []
@@ -3231,6 +3702,196 @@ def fed_summary(FEDs, meal_pellet_minimum=1, meal_duration=1,
     output = output.reindex(order)
     return output
 
+def fed_summary(FEDs, meal_pellet_minimum=1, meal_duration=1,
+                motor_turns_thresh=10, lights_on=7, lights_off=19,
+                workers=None):
+    """
+    FED3 Viz: generate a DataFrame of summary stats for multiple feds
+
+    Parameters
+    ----------
+    FEDs : list of FED3_File objects
+        FED3 files (loaded by load.FED3_File)
+    meal_pellet_minimum : int
+        minimum pellets to constitute a meal
+    meal_duration : int
+        amount of time to allow before a new meal is assigned
+    motor_turns_thresh : int, optional
+        Threshold of motor turns to count how many have surpassed. The default is 10.
+    lights_on : int
+        Integer between 0 and 23 denoting the start of the light cycle.
+    lights_off : int
+        Integer between 0 and 23 denoting the end of the light cycle.
+    workers : int, optional
+        Worker processes summarizing the files (see summary_metrics()).
+        The default is None.
+
+    Returns
+    -------
+    output : pandas.DataFrame
+        table of summary statistics for each file, with average and
+        standard deviation for all files
+    """
+    if not isinstance(FEDs, list):
+        FEDs = [FEDs]
+    metrics = summary_metrics(FEDs, meal_pellet_minimum=meal_pellet_minimum,
+                              meal_duration=meal_duration,
+                              motor_turns_thresh=motor_turns_thresh,
+                              lights_on=lights_on, lights_off=lights_off,
+                              workers=workers)
+    return summary_table(metrics)
+
+#---Queries
+def fed_query(FEDs, sql, lights_on=7, lights_off=19):
+    """
+    Runs a SQL query over FED3 data (see fedquery.FedDatabase).
+
+    Parameters
+    ----------
+    FEDs : list of FED3_File objects
+        FED3 files (loaded by load.FED3_File)
+    sql : str
+        SQLite query
+    lights_on : int, optional
+        Integer between 0 and 23 denoting the start of the light cycle.
+        The default is 7.
+    lights_off : int, optional
+        Integer between 0 and 23 denoting the end of the light cycle.
+        The default is 19.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The result
+    """
+    database = FedDatabase(FEDs, lights_on=lights_on, lights_off=lights_off)
+    try:
+        return database.query(sql)
+    finally:
+        database.close()
+
+def query_table(FEDs, sql, lights_on, lights_off, **kwargs):
+    """
+    FED3 Viz: Show the result of a SQL query over FED3 data as a table
+    (the first 20 rows).
+
+    Parameters
+    ----------
+    FEDs : list of FED3_File objects
+        FED3 files (loaded by load.FED3_File)
+    sql : str
+        SQLite query (see fedquery.SCHEMA_HELP for the tables)
+    lights_on : int
+        Integer between 0 and 23 denoting the start of the light cycle.
+    lights_off : int
+        Integer between 0 and 23 denoting the end of the light cycle.
+    **kwargs :
+        ax : matplotlib.axes.Axes
+            Axes to plot on, a new Figure and Axes are
+            created if not passed
+        result : pandas.DataFrame
+            Result of the query when it has already been run, so that
+            the database isn't built again
+        **kwargs also allows FED3 Viz to pass all settings to all functions.
+
+    Returns
+    -------
+    fig : matplotlib.figure.Figure
+    """
+    result = kwargs.get('result')
+    if result is None:
+        result = fed_query(FEDs, sql, lights_on, lights_off)
+    if 'ax' not in kwargs:
+        fig = Figure(figsize=(7,3.5), dpi=150)
+        ax = fig.add_subplot()
+    else:
+        ax = kwargs['ax']
+    shown = result.head(20)
+    ax.axis('off')
+    if not shown.empty:
+        cells = [['{:.4g}'.format(value) if isinstance(value, float) else str(value)
+                  for value in row] for row in shown.itertuples(index=False)]
+        table = ax.table(cellText=cells,
+                         colLabels=[str(column) for column in shown.columns],
+                         loc='upper center')
+        table.auto_set_font_size(False)
+        table.set_fontsize(6)
+    title = str(len(result)) + ' rows'
+    if len(result) > len(shown):
+        title += ' (showing the first ' + str(len(shown)) + ')'
+    ax.set_title(title)
+
+    return fig if 'ax' not in kwargs else None
+
+#---Exporting
+def export_plot(plotfunc, arguments, save_path, x=7, y=3.5, dpi=300):
+    """
+    FED3 Viz: render a plot into its own offscreen (Agg) figure and save it.
+    Used to export plots in worker processes without redrawing the figure
+    shown in the GUI.
+
+    Parameters
+    ----------
+    plotfunc : function
+        Plotting function from this module
+    arguments : dict
+        Keyword arguments for plotfunc, without an "ax"
+    save_path : str
+        Path of the image to write; the format is taken from the extension
+    x : float, optional
+        Figure width in inches. The default is 7.
+    y : float, optional
+        Figure height in inches. The default is 3.5.
+    dpi : int, optional
+        Resolution of the saved image. The default is 300.
+
+    Returns
+    -------
+    save_path : str
+    """
+    fig = Figure(figsize=(x,y), dpi=150)
+    FigureCanvasAgg(fig)
+    polar = plotfunc.__name__ in ['circle_chronogram', 'spiny_chronogram']
+    ax = fig.add_subplot(polar=polar)
+    plotfunc(ax=ax, **arguments)
+    with perf.span('savefig', 'render'):
+        fig.savefig(save_path, dpi=dpi)
+    return save_path
+
+def render_plot(plotfunc, arguments, width, height, dpi=150):
+    """
+    FED3 Viz: render a plot into its own offscreen (Agg) figure and return
+    the pixels.  Used to build plots in worker threads, so that the GUI
+    only has to copy the finished image onto its canvas.
+
+    Parameters
+    ----------
+    plotfunc : function
+        Plotting function from this module
+    arguments : dict
+        Keyword arguments for plotfunc, without an "ax"
+    width, height : int
+        Size of the canvas in pixels (the figure is sized as a Tk canvas
+        of this size would size it)
+    dpi : float, optional
+        Resolution of the figure. The default is 150.
+
+    Returns
+    -------
+    numpy.ndarray or None
+        RGBA image (height x width x 4), or None when plotfunc made no
+        plot (e.g. averaging files with no shared dates)
+    """
+    fig = Figure(figsize=(width/dpi, height/dpi), dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    polar = plotfunc.__name__ in ['circle_chronogram', 'spiny_chronogram']
+    ax = fig.add_subplot(polar=polar)
+    if isinstance(plotfunc(ax=ax, **arguments), str):
+        return None
+    with perf.span('draw', 'render'):
+        canvas.draw()
+    return np.array(canvas.buffer_rgba())
+
 #---Unused by FED3 Viz
 
 def old_diagnostic_plot(FED, shade_dark, lights_on, lights_off, **kwargs):
@@ -3260,9 +3921,10 @@ def old_diagnostic_plot(FED, shade_dark, lights_on, lights_off, **kwargs):
     """
     assert isinstance(FED, FED3_File),'Non FED3_File passed to diagnostic_plot()'
     df = FED.data
-    fig, (ax1,ax2,ax3) = plt.subplots(3,1,sharex=True, figsize=(7,5),dpi=125)
+    fig = Figure(figsize=(7,5),dpi=125)
+    ax1, ax2, ax3 = fig.subplots(3,1,sharex=True)
     ax1.tick_params(axis='x', which='both', bottom=False, top=False, labelbottom=False)
-    plt.subplots_adjust(hspace=.1)
+    fig.subplots_adjust(hspace=.1)
     y = df['Pellet_Count'].drop_duplicates()
     x = y.index
     ax1.scatter(x,y,s=1,c='green')
@@ -3283,7 +3945,7 @@ def old_diagnostic_plot(FED, shade_dark, lights_on, lights_off, **kwargs):
     ax3.set_ylim(0,4.5)
     date_format_x(ax3, x[0], x[-1])
     ax3.set_xlabel('Date')
-    plt.suptitle('Pellets Received, Motor Turns, and Battery Life\n' +
+    fig.suptitle('Pellets Received, Motor Turns, and Battery Life\n' +
                  'for ' + FED.filename, y=.96)
     if shade_dark:
         for i,ax in enumerate((ax1,ax2,ax3)):